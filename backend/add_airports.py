@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+"""
+Migration: add the airport dimension and the flight airport foreign keys,
+then backfill them from the existing origin/destination labels.
+Run this before add_search_indexes.py on existing databases.
+"""
+
+import sys
+import os
+
+# Add the backend directory to the path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app import create_app, db
+from app.models import Airport, Flight
+from app.airports import backfill_airports
+
+NEW_COLUMNS = ['origin_airport_id', 'destination_airport_id']
+
+def add_airports():
+    """Create the airport table, add flight columns and backfill them"""
+    Airport.__table__.create(bind=db.engine, checkfirst=True)
+
+    columns = [column['name'] for column in db.inspect(db.engine).get_columns('flight')]
+    with db.engine.begin() as conn:
+        for column in NEW_COLUMNS:
+            if column in columns:
+                print(f"✓ flight.{column} already exists")
+                continue
+            conn.exec_driver_sql(f'ALTER TABLE flight ADD COLUMN {column} INTEGER REFERENCES airport(id)')
+            print(f"✓ flight.{column} added")
+
+    for index in Flight.__table__.indexes:
+        if any(column.name in NEW_COLUMNS for column in index.columns):
+            index.create(bind=db.engine, checkfirst=True)
+            print(f"✓ {index.name}")
+
+    created, labels = backfill_airports()
+    print(f"✅ Mapped {labels} airport labels ({created} new airports)")
+
+if __name__ == '__main__':
+    app = create_app()
+    with app.app_context():
+        add_airports()
@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+"""
+Migration: recurring flight schedules.
+The flight_schedule table is created by db.create_all(); this adds
+flight.schedule_id and its index for existing databases.
+"""
+
+import sys
+import os
+
+# Add the backend directory to the path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app import create_app, db
+from app.models import Flight
+
+def add_flight_schedules():
+    """Add flight.schedule_id and ix_flight_schedule_depart"""
+    columns = [column['name'] for column in db.inspect(db.engine).get_columns('flight')]
+
+    with db.engine.begin() as conn:
+        if 'schedule_id' in columns:
+            print("✓ flight.schedule_id already exists")
+        else:
+            conn.exec_driver_sql('ALTER TABLE flight ADD COLUMN schedule_id INTEGER REFERENCES flight_schedule (id)')
+            print("✓ flight.schedule_id added")
+
+    for index in Flight.__table__.indexes:
+        if index.name == 'ix_flight_schedule_depart':
+            index.create(bind=db.engine, checkfirst=True)
+            print(f"✓ {index.name}")
+    print("✅ Flight schedules are ready; schedule `flask materialize-schedules` to run daily")
+
+if __name__ == '__main__':
+    app = create_app()
+    with app.app_context():
+        add_flight_schedules()
@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+"""
+Migration: per-company hold lifetime and the index the expire-holds sweeper scans.
+Works on SQLite and PostgreSQL; steps that were already applied are skipped.
+"""
+
+import sys
+import os
+
+# Add the backend directory to the path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app import create_app, db
+from app.models import Ticket
+
+def add_hold_expiry():
+    """Add company.hold_ttl_hours and replace ix_ticket_status with (status, created_at)"""
+    inspector = db.inspect(db.engine)
+    columns = [column['name'] for column in inspector.get_columns('company')]
+    ticket_indexes = [index['name'] for index in inspector.get_indexes('ticket')]
+
+    with db.engine.begin() as conn:
+        if 'hold_ttl_hours' in columns:
+            print("✓ company.hold_ttl_hours already exists")
+        else:
+            conn.exec_driver_sql('ALTER TABLE company ADD COLUMN hold_ttl_hours INTEGER')
+            print("✓ company.hold_ttl_hours added")
+
+        # The composite index serves every status-only lookup as well
+        if 'ix_ticket_status' in ticket_indexes:
+            conn.exec_driver_sql('DROP INDEX ix_ticket_status')
+            print("✓ ix_ticket_status dropped")
+
+    for index in Ticket.__table__.indexes:
+        if index.name == 'ix_ticket_status_created':
+            index.create(bind=db.engine, checkfirst=True)
+            print(f"✓ {index.name}")
+    print("✅ Hold expiry is ready; schedule `flask expire-holds` or run it with --loop")
+
+if __name__ == '__main__':
+    app = create_app()
+    with app.app_context():
+        add_hold_expiry()
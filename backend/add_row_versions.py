@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+"""
+Migration: row versions for the API's ETag / Last-Modified validators.
+Adds flight.updated_at and ticket.updated_at (backfilled from created_at)
+and seeds the collection_version counter rows; the table itself is created
+by db.create_all().
+"""
+
+import sys
+import os
+
+# Add the backend directory to the path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app import create_app, db, versions
+
+def add_row_versions():
+    """Add and backfill updated_at on flight and ticket"""
+    inspector = db.inspect(db.engine)
+    datetime_type = db.DateTime().compile(dialect=db.engine.dialect)
+
+    with db.engine.begin() as conn:
+        for table in ('flight', 'ticket'):
+            columns = [column['name'] for column in inspector.get_columns(table)]
+            if 'updated_at' in columns:
+                print(f"✓ {table}.updated_at already exists")
+                continue
+            conn.exec_driver_sql(f'ALTER TABLE {table} ADD COLUMN updated_at {datetime_type}')
+            conn.exec_driver_sql(f'UPDATE {table} SET updated_at = created_at')
+            print(f"✓ {table}.updated_at added")
+
+    versions.seed()
+    print(f"✓ collection_version rows seeded: {', '.join(versions.COLLECTIONS)}")
+    print("✅ Row versions are ready")
+
+if __name__ == '__main__':
+    app = create_app()
+    with app.app_context():
+        add_row_versions()
@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+"""
+Migration: add the per-flight seat map columns.
+Existing flights start without a map; it is built from their tickets' seat
+numbers the first time a seat is booked or the seat picker is opened.
+"""
+
+import sys
+import os
+
+# Add the backend directory to the path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app import create_app, db
+
+def add_seat_maps():
+    """Add flight.seat_map and flight.seat_map_version"""
+    columns = [column['name'] for column in db.inspect(db.engine).get_columns('flight')]
+    binary = db.LargeBinary().compile(dialect=db.engine.dialect)
+    new_columns = {
+        'seat_map': binary,
+        'seat_map_version': 'INTEGER NOT NULL DEFAULT 0',
+    }
+
+    with db.engine.begin() as conn:
+        for column, ddl in new_columns.items():
+            if column in columns:
+                print(f"✓ flight.{column} already exists")
+                continue
+            conn.exec_driver_sql(f'ALTER TABLE flight ADD COLUMN {column} {ddl}')
+            print(f"✓ flight.{column} added")
+    print("✅ Seat maps are ready")
+
+if __name__ == '__main__':
+    app = create_app()
+    with app.app_context():
+        add_seat_maps()
@@ -62,9 +62,37 @@ def create_app(config_name=None):
     from . import cli
     cli.init_app(app)
 
+    # Read-through cache for rarely changing data
+    from . import cache
+    cache.init_app(app)
+    
+    # Boarding-pass QR codes rendered once and kept on disk
+    from . import boarding
+    boarding.init_app(app)
+    
+    # Uploaded images resized in a worker pool and stored by content hash
+    from . import images
+    images.init_app(app)
+    
+    # Fingerprinted static assets from `flask build-assets`
+    from . import assets
+    assets.init_app(app)
+    
+    # {% cache %} blocks keyed on collection version counters
+    from . import fragments
+    fragments.init_app(app)
+    
+    # current_user from a cached identity instead of a User query per request
+    from . import identity
+    identity.init_app(app)
+
+    # Collection version counters behind the API's ETags and fragment keys
+    from . import versions
+
     with app.app_context():
         # Create database tables
         db.create_all()
+        versions.seed()
         
         # Initialize sample data if database is empty
         # Temporarily disabled to avoid database issues during development
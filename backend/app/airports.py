@@ -0,0 +1,127 @@
+from . import db
+from .models import Airport, Flight
+from sqlalchemy import event, or_
+from sqlalchemy.orm import Session
+import re
+
+# "New York (JFK)" -> ("New York", "JFK")
+AIRPORT_LABEL_RE = re.compile(r'^\s*(?P<city>.*?)\s*\((?P<code>[A-Za-z]{3})\)\s*$')
+
+def parse_airport_label(label):
+    """Split a free-text airport label into (city, IATA code or None)"""
+    label = (label or '').strip()
+    match = AIRPORT_LABEL_RE.match(label)
+    if match:
+        return match.group('city') or match.group('code').upper(), match.group('code').upper()
+    return label, None
+
+def _find_airport(label):
+    """Look up the airport a flight label refers to, without creating it"""
+    city, code = parse_airport_label(label)
+    if code:
+        return Airport.query.filter_by(code=code).first()
+
+    airport = Airport.query.filter(db.func.lower(Airport.city) == city.lower()).first()
+    if airport:
+        return airport
+    for candidate in Airport.query.filter(Airport.aliases.ilike(f'%{label}%')):
+        if label.lower() in [alias.lower() for alias in candidate.aliases.split(',')]:
+            return candidate
+    return None
+
+def get_or_create_airport(label, cache=None):
+    """Return the Airport for a flight label, adding a new row if it is unknown.
+
+    `cache` maps IATA codes (or lowercased labels) to airports that may still be
+    pending in the session.
+    """
+    label = (label or '').strip()
+    city, code = parse_airport_label(label)
+    key = code or label.lower()
+    if cache is not None and key in cache:
+        return cache[key]
+
+    airport = _find_airport(label)
+    if airport is None:
+        airport = Airport(code=code, city=city, aliases=label)
+        db.session.add(airport)
+
+    if cache is not None:
+        cache[key] = airport
+    return airport
+
+def resolve_airport_ids(text):
+    """Resolve what a user typed ("Chicago", "ORD", "Chicago (ORD)") to airport IDs.
+
+    The airport table is tiny compared to flights, so matching here is cheap and
+    the flight query itself becomes an indexed IN (...) lookup.
+    """
+    text = (text or '').strip()
+    if not text:
+        return []
+
+    city, code = parse_airport_label(text)
+    if code:
+        criteria = Airport.code == code
+    else:
+        pattern = f'%{text}%'
+        criteria = or_(Airport.code == text.upper(),
+                       Airport.city.ilike(pattern),
+                       Airport.name.ilike(pattern),
+                       Airport.aliases.ilike(pattern))
+    return [row[0] for row in db.session.query(Airport.id).filter(criteria).all()]
+
+def filter_by_route(query, origin=None, destination=None):
+    """Narrow a Flight query to the airports matching the origin/destination text"""
+    if origin:
+        query = query.filter(Flight.origin_airport_id.in_(resolve_airport_ids(origin)))
+    if destination:
+        query = query.filter(Flight.destination_airport_id.in_(resolve_airport_ids(destination)))
+    return query
+
+@event.listens_for(Session, 'before_flush')
+def assign_flight_airports(session, flush_context, instances):
+    """Keep Flight airport foreign keys in sync with the origin/destination labels"""
+    cache = {}
+    for obj in list(session.new) + list(session.dirty):
+        if not isinstance(obj, Flight):
+            continue
+        with session.no_autoflush:
+            for label_attr, airport_attr in (('origin', 'origin_airport'),
+                                             ('destination', 'destination_airport')):
+                label_changed = db.inspect(obj).attrs[label_attr].history.has_changes()
+                missing = getattr(obj, airport_attr + '_id') is None and airport_attr not in obj.__dict__
+                if getattr(obj, label_attr) and (label_changed or missing):
+                    setattr(obj, airport_attr, get_or_create_airport(getattr(obj, label_attr), cache))
+
+def backfill_airports():
+    """Create airports for every distinct flight label and fill the foreign keys.
+
+    Uses one UPDATE per distinct label rather than touching Flight rows one by one.
+    Returns (airports created, labels mapped).
+    """
+    labels = {row[0] for row in db.session.query(Flight.origin).distinct()}
+    labels |= {row[0] for row in db.session.query(Flight.destination).distinct()}
+
+    airports_before = Airport.query.count()
+    cache = {}
+    label_airports = {}
+    for label in sorted(labels):
+        airport = get_or_create_airport(label, cache)
+        aliases = [a for a in (airport.aliases or '').split(',') if a]
+        if label not in aliases:
+            airport.aliases = ','.join(aliases + [label])
+        label_airports[label] = airport
+    db.session.flush()
+
+    for label, airport in label_airports.items():
+        db.session.execute(
+            db.update(Flight).where(Flight.origin == label).values(origin_airport_id=airport.id)
+            .execution_options(synchronize_session=False)
+        )
+        db.session.execute(
+            db.update(Flight).where(Flight.destination == label).values(destination_airport_id=airport.id)
+            .execution_options(synchronize_session=False)
+        )
+    db.session.commit()
+    return Airport.query.count() - airports_before, len(label_airports)
@@ -1,8 +1,12 @@
 from flask import Blueprint, jsonify, request, current_app
 from flask_login import login_required, current_user
 from . import db
-from .models import Flight, Ticket, Company, User
-from datetime import datetime
+from .models import Flight, Ticket, Company, User, filter_flights
+from . import rollups, airports, suggestions, connections, inventory, seatmaps, cache, versions, listings, fragments
+from .utils import paginate_query
+from .pagination import FLIGHT_SORTS, InvalidCursor, keyset_page, approximate_count
+from sqlalchemy.orm import joinedload
+from datetime import datetime, timedelta
 import json
 
 api = Blueprint('api', __name__, url_prefix='/api')
@@ -59,79 +63,177 @@ def get_flights():
         airline_id = request.args.get('airline_id', type=int)
         max_stops = request.args.get('max_stops', type=int)
         sort_by = request.args.get('sort_by', 'price_asc')
-        limit = min(int(request.args.get('limit', 50)), 100)  # Max 100 results
+        limit = max(1, min(request.args.get('limit', 50, type=int), 100))  # 1 to 100 results per page
+        cursor = request.args.get('cursor')
+        total_mode = request.args.get('total', 'approx')  # 'exact', 'approx' or 'none'
+        
+        if sort_by not in FLIGHT_SORTS:
+            sort_by = 'price_asc'
+        
+        # With both counters unchanged the result only moves when a flight departs
+        now = datetime.utcnow()
+        (flights_version, flights_updated), (airlines_version, airlines_updated) = \
+            versions.current('flights', 'airlines')
+        departed = versions.last_departure(now)
+        etag = versions.make_etag('flights', flights_version, airlines_version, departed,
+                                  sorted(request.args.items(multi=True)))
+        last_modified = versions.latest(flights_updated, airlines_updated, departed)
+        if versions.is_fresh(etag, last_modified):
+            return versions.not_modified(etag, last_modified)
         
         # Base query for future flights with available seats
         query = Flight.query.filter(
-            Flight.depart_time > datetime.utcnow(),
+            Flight.depart_time > now,
             Flight.seats_available >= passengers
         )
         
-        # Apply filters
-        if origin:
-            query = query.filter(Flight.origin.ilike(f'%{origin}%'))
-        
-        if destination:
-            query = query.filter(Flight.destination.ilike(f'%{destination}%'))
+        # Apply filters (origin/destination resolved to airport IDs)
+        query = airports.filter_by_route(query, origin, destination)
         
         if depart_date:
             try:
-                date_obj = datetime.strptime(depart_date, '%Y-%m-%d').date()
-                query = query.filter(db.func.date(Flight.depart_time) == date_obj)
+                day_start = datetime.strptime(depart_date, '%Y-%m-%d')
+                query = query.filter(Flight.depart_time >= day_start,
+                                     Flight.depart_time < day_start + timedelta(days=1))
             except ValueError:
                 return jsonify({'error': 'Invalid date format. Use YYYY-MM-DD'}), 400
         
-        if min_price is not None:
-            query = query.filter(Flight.price >= min_price)
-        
-        if max_price is not None:
-            query = query.filter(Flight.price <= max_price)
+        query = filter_flights(query, min_price, max_price, airline_id, max_stops)
         
-        if airline_id is not None:
-            query = query.filter(Flight.company_id == airline_id)
+        # Keyset pagination on the active sort with an id tiebreaker; rows are
+        # read-only projections joined with their company in the same statement
+        try:
+            flights, next_cursor = keyset_page(listings.project(query), sort_by, cursor, limit,
+                                               row_factory=listings.FlightRow)
+        except InvalidCursor as e:
+            return jsonify({'error': str(e)}), 400
         
-        if max_stops is not None:
-            query = query.filter(Flight.stops <= max_stops)
-        
-        # Apply sorting
-        if sort_by == 'price_asc':
-            query = query.order_by(Flight.price.asc())
-        elif sort_by == 'price_desc':
-            query = query.order_by(Flight.price.desc())
-        elif sort_by == 'depart_time':
-            query = query.order_by(Flight.depart_time.asc())
-        elif sort_by == 'duration':
-            query = query.order_by((Flight.arrive_time - Flight.depart_time).asc())
+        response = {
+            'flights': [flight.to_dict(now) for flight in flights],
+            'count': len(flights),
+            'next_cursor': next_cursor
+        }
         
-        # Apply limit
-        flights = query.limit(limit).all()
+        if total_mode == 'exact':
+            response['total_available'] = query.count()
+        elif total_mode != 'none':
+            filters_key = (origin, destination, depart_date, passengers, min_price,
+                           max_price, airline_id, max_stops)
+            response['total_available'] = approximate_count(query, filters_key)
+            response['total_is_approximate'] = True
         
-        return jsonify({
-            'flights': [serialize_flight(flight) for flight in flights],
-            'count': len(flights),
-            'total_available': query.count()
-        })
+        return versions.tag(listings.json_response(response), etag, last_modified)
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def serialize_leg(leg):
+    """Serialize an itinerary leg from the connection index"""
+    return {
+        'flight_id': leg.id,
+        'flight_number': leg.flight_number,
+        'company': {'id': leg.company_id, 'name': leg.company_name},
+        'origin': leg.origin,
+        'destination': leg.destination,
+        'depart_time': leg.depart_time.isoformat(),
+        'arrive_time': leg.arrive_time.isoformat(),
+        'price': leg.price,
+        'seats_available': leg.seats_available
+    }
+
+@api.route('/itineraries')
+def get_itineraries():
+    """Find direct, one- and two-stop itineraries between two cities/airports"""
+    origin = request.args.get('origin', '').strip()
+    destination = request.args.get('destination', '').strip()
+    depart_date = request.args.get('depart_date', '').strip()
+    passengers = request.args.get('passengers', 1, type=int)
+    max_stops = min(request.args.get('max_stops', 2, type=int), 2)
+    min_layover = request.args.get('min_layover', current_app.config['CONNECTION_MIN_LAYOVER'], type=int)
+    max_layover = request.args.get('max_layover', current_app.config['CONNECTION_MAX_LAYOVER'], type=int)
+    sort_by = request.args.get('sort_by', 'price')  # 'price' or 'duration'
+    limit = max(1, min(request.args.get('limit', 20, type=int), 100))
+    
+    if not origin or not destination:
+        return jsonify({'error': 'origin and destination are required'}), 400
+    if min_layover < 0 or max_layover < min_layover:
+        return jsonify({'error': 'Invalid layover bounds'}), 400
+    
+    now = datetime.utcnow()
+    if depart_date:
+        try:
+            start = datetime.strptime(depart_date, '%Y-%m-%d')
+        except ValueError:
+            return jsonify({'error': 'Invalid date format. Use YYYY-MM-DD'}), 400
+        start, end = max(start, now), start + timedelta(days=1)
+    else:
+        start, end = now, now + timedelta(days=1)
+    
+    itineraries = connections.get_index().search(
+        airports.resolve_airport_ids(origin),
+        airports.resolve_airport_ids(destination),
+        start, end,
+        passengers=passengers,
+        max_stops=max_stops,
+        min_layover=timedelta(minutes=min_layover),
+        max_layover=timedelta(minutes=max_layover),
+        sort_by=sort_by,
+        limit=limit
+    )
+    
+    return jsonify({
+        'itineraries': [{
+            'legs': [serialize_leg(leg) for leg in legs],
+            'stops': len(legs) - 1,
+            'total_price': sum(leg.price for leg in legs),
+            'depart_time': legs[0].depart_time.isoformat(),
+            'arrive_time': legs[-1].arrive_time.isoformat(),
+            'total_duration_minutes': int((legs[-1].arrive_time - legs[0].depart_time).total_seconds() // 60),
+            'layover_minutes': [int((nxt.depart_time - prev.arrive_time).total_seconds() // 60)
+                                for prev, nxt in zip(legs, legs[1:])]
+        } for legs in itineraries],
+        'count': len(itineraries)
+    })
+
 @api.route('/flights/<int:flight_id>')
 def get_flight(flight_id):
     """Get detailed information about a specific flight"""
+    row = db.session.query(Flight.updated_at, Flight.depart_time).filter(Flight.id == flight_id).first_or_404()
+    [(airlines_version, airlines_updated)] = versions.current('airlines')
+    is_upcoming = row.depart_time > datetime.utcnow()
+    etag = versions.make_etag('flight', flight_id, row.updated_at, airlines_version, is_upcoming)
+    last_modified = versions.latest(row.updated_at, airlines_updated, None if is_upcoming else row.depart_time)
+    if versions.is_fresh(etag, last_modified):
+        return versions.not_modified(etag, last_modified)
+    
+    payload = cache.cached('flight', flight_id, lambda: serialize_flight(Flight.query.get_or_404(flight_id)))
+    # Computed per request: the cached copy may outlive the departure time
+    response = jsonify({'flight': dict(payload, is_upcoming=is_upcoming)})
+    return versions.tag(response, etag, last_modified)
+
+@api.route('/flights/<int:flight_id>/seats')
+def get_flight_seats(flight_id):
+    """Seat map for the seat picker: layout plus a base64 bitmap of taken seats"""
     flight = Flight.query.get_or_404(flight_id)
-    return jsonify({'flight': serialize_flight(flight)})
+    return jsonify({'seats': seatmaps.seat_map_payload(flight)})
 
 @api.route('/airlines')
 def get_airlines():
     """Get list of all airlines"""
-    companies = Company.query.filter_by(is_active=True).all()
-    return jsonify({
-        'airlines': [{
+    def load_airlines():
+        companies = Company.query.filter_by(is_active=True).all()
+        return [{
             'id': company.id,
             'name': company.name,
             'code': company.code
         } for company in companies]
-    })
+    
+    [(airlines_version, airlines_updated)] = versions.current('airlines')
+    etag = versions.make_etag('airlines', airlines_version)
+    if versions.is_fresh(etag, airlines_updated):
+        return versions.not_modified(etag, airlines_updated)
+    response = jsonify({'airlines': cache.cached('airlines', 'active', load_airlines)})
+    return versions.tag(response, etag, airlines_updated)
 
 @api.route('/tickets', methods=['GET'])
 @login_required
@@ -140,22 +242,100 @@ def get_user_tickets():
     if not current_user.is_regular_user():
         return jsonify({'error': 'Access denied'}), 403
     
-    tickets = Ticket.query.filter_by(user_id=current_user.id).order_by(Ticket.created_at.desc()).all()
+    page = request.args.get('page', 1, type=int)
+    per_page = min(request.args.get('per_page', 50, type=int), 100)
+    
+    # One aggregate over the user's tickets decides whether the client's copy is current
+    now = datetime.utcnow()
+    row_versions = versions.ticket_list_version(current_user.id, now)
+    [(airlines_version, airlines_updated)] = versions.current('airlines')
+    etag = versions.make_etag('tickets', current_user.id, row_versions, airlines_version, page, per_page)
+    last_modified = versions.latest(airlines_updated, *row_versions[1:])
+    if versions.is_fresh(etag, last_modified):
+        return versions.not_modified(etag, last_modified, private=True)
+    
+    # Flight and company are loaded with the tickets instead of once per ticket
+    pagination = paginate_query(
+        Ticket.query.options(joinedload(Ticket.flight).joinedload(Flight.company))
+        .filter_by(user_id=current_user.id)
+        .order_by(Ticket.created_at.desc(), Ticket.id.desc()),
+        page, per_page
+    )
+    tickets = pagination.items
+    
+    response = jsonify({
+        'tickets': [serialize_ticket(ticket) for ticket in tickets],
+        'count': len(tickets),
+        'total': pagination.total,
+        'page': pagination.page,
+        'pages': pagination.pages
+    })
+    return versions.tag(response, etag, last_modified, private=True)
+
+@api.route('/tickets', methods=['POST'])
+@login_required
+def book_tickets():
+    """Book seats on a flight for one or more passengers in a single transaction"""
+    if not current_user.is_regular_user():
+        return jsonify({'error': 'Access denied'}), 403
+    
+    data = request.get_json(silent=True) or {}
+    flight = Flight.query.get_or_404(data.get('flight_id', 0))
+    passengers = [str(name).strip() for name in data.get('passengers') or [] if str(name).strip()]
+    seats = [str(seat).strip().upper() if seat else None for seat in data.get('seats') or []]
+    
+    if not passengers:
+        return jsonify({'error': 'At least one passenger name is required'}), 400
+    if len(passengers) > current_app.config['MAX_SEATS_PER_BOOKING']:
+        return jsonify({'error': f"At most {current_app.config['MAX_SEATS_PER_BOOKING']} passengers per booking"}), 400
+    if len(seats) > len(passengers):
+        return jsonify({'error': 'More seats than passengers'}), 400
+    if not flight.is_upcoming:
+        return jsonify({'error': 'Cannot book past flights'}), 400
+    
+    try:
+        tickets = inventory.book_seats(flight, current_user.id, passengers, seat_numbers=seats)
+    except inventory.NotEnoughSeats:
+        db.session.rollback()
+        return jsonify({'error': 'Not enough seats available'}), 409
+    except seatmaps.SeatUnavailable as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 409
+    
+    for ticket in tickets:
+        rollups.record_ticket_status_change(ticket, None)
+    db.session.commit()
     
     return jsonify({
         'tickets': [serialize_ticket(ticket) for ticket in tickets],
         'count': len(tickets)
-    })
+    }), 201
 
 @api.route('/tickets/<confirmation_id>')
 def get_ticket_by_confirmation(confirmation_id):
     """Get ticket details by confirmation ID"""
-    ticket = Ticket.query.filter_by(confirmation_id=confirmation_id.upper()).first()
+    row = db.session.query(
+        Ticket.id, Ticket.updated_at, Ticket.status, Flight.updated_at.label('flight_updated_at'), Flight.depart_time
+    ).join(Flight, Ticket.flight_id == Flight.id).filter(Ticket.confirmation_id == confirmation_id.upper()).first()
     
-    if not ticket:
+    if not row:
         return jsonify({'error': 'Ticket not found'}), 404
     
-    return jsonify({'ticket': serialize_ticket(ticket)})
+    # is_upcoming and can_be_refunded flip with time, so they are part of the version
+    now = datetime.utcnow()
+    is_upcoming = row.depart_time > now
+    refundable = row.status == 'paid' and row.depart_time - now > timedelta(hours=24)
+    [(airlines_version, airlines_updated)] = versions.current('airlines')
+    etag = versions.make_etag('ticket', row.id, row.updated_at, row.flight_updated_at,
+                              airlines_version, is_upcoming, refundable)
+    refund_closed = row.depart_time - timedelta(hours=24) if row.status == 'paid' and not refundable else None
+    last_modified = versions.latest(row.updated_at, row.flight_updated_at, airlines_updated,
+                                    None if is_upcoming else row.depart_time, refund_closed)
+    if versions.is_fresh(etag, last_modified):
+        return versions.not_modified(etag, last_modified)
+    
+    ticket = Ticket.query.options(joinedload(Ticket.flight).joinedload(Flight.company)).get(row.id)
+    return versions.tag(jsonify({'ticket': serialize_ticket(ticket)}), etag, last_modified)
 
 @api.route('/tickets/<int:ticket_id>/cancel', methods=['POST'])
 @login_required
@@ -171,17 +351,21 @@ def cancel_ticket_api(ticket_id):
         return jsonify({'error': 'Ticket is already canceled or refunded'}), 400
     
     # Check 24-hour rule
-    if ticket.can_be_refunded:
-        ticket.status = 'refunded'
-        ticket.flight.seats_available += 1
+    refunded = ticket.can_be_refunded
+    if not inventory.change_ticket_status(ticket, 'paid', 'refunded' if refunded else 'canceled',
+                                          canceled_at=datetime.utcnow()):
+        # A concurrent cancel got there first and already released the seat
+        return jsonify({'error': 'Ticket is already canceled or refunded'}), 400
+    
+    if refunded:
+        inventory.release_tickets(ticket.flight, [ticket])
         refund_amount = ticket.price
         message = f'Ticket refunded successfully. Amount: ${refund_amount:.2f}'
     else:
-        ticket.status = 'canceled'
         refund_amount = 0
         message = 'Ticket canceled. No refund available (less than 24 hours before departure).'
     
-    ticket.canceled_at = datetime.utcnow()
+    rollups.record_ticket_status_change(ticket, 'paid')
     db.session.commit()
     
     return jsonify({
@@ -199,37 +383,33 @@ def get_search_suggestions():
     if len(query) < 2:
         return jsonify({'suggestions': []})
     
-    # Get unique origins and destinations
-    suggestions = set()
-    
-    if type_filter in ['origin', 'all']:
-        origins = db.session.query(Flight.origin).filter(
-            Flight.origin.ilike(f'%{query}%')
-        ).distinct().limit(10).all()
-        suggestions.update([origin[0] for origin in origins])
-    
-    if type_filter in ['destination', 'all']:
-        destinations = db.session.query(Flight.destination).filter(
-            Flight.destination.ilike(f'%{query}%')
-        ).distinct().limit(10).all()
-        suggestions.update([dest[0] for dest in destinations])
-    
+    # Served from the in-memory n-gram index, ranked by popularity
     return jsonify({
-        'suggestions': sorted(list(suggestions))[:10]
+        'suggestions': suggestions.suggest(query, type_filter)
     })
 
 @api.route('/stats')
 def get_public_stats():
     """Get public statistics"""
-    total_flights = Flight.query.count()
-    active_flights = Flight.query.filter(Flight.depart_time > datetime.utcnow()).count()
-    total_airlines = Company.query.filter_by(is_active=True).count()
+    def load_stats():
+        return {
+            'total_flights': Flight.query.count(),
+            'active_flights': Flight.query.filter(Flight.depart_time > datetime.utcnow()).count(),
+            'total_airlines': Company.query.filter_by(is_active=True).count()
+        }
     
-    return jsonify({
-        'total_flights': total_flights,
-        'active_flights': active_flights,
-        'total_airlines': total_airlines
-    })
+    # active_flights may lag departures by up to CACHE_TTL
+    return jsonify(cache.cached('stats', 'public', load_stats))
+
+@api.route('/cache/stats')
+@login_required
+def get_cache_stats():
+    """Cache hit/miss counters and template fragment render savings for this worker (admin only)"""
+    if not current_user.is_admin():
+        return jsonify({'error': 'Access denied'}), 403
+    stats = cache.get_cache().stats()
+    stats['fragments'] = fragments.stats()
+    return jsonify(stats)
 
 # Error handlers for API
 @api.errorhandler(404)
@@ -0,0 +1,101 @@
+from flask import current_app, url_for
+import gzip
+import hashlib
+import json
+import os
+import tempfile
+
+try:
+    import brotli
+except ImportError:  # Optional: only .gz siblings are built without it
+    brotli = None
+
+BUILD_DIR = 'dist'  # Under the static folder; generated, not committed
+MANIFEST = 'manifest.json'
+ASSET_EXTENSIONS = {'.css', '.js', '.svg', '.png', '.jpg', '.jpeg', '.gif', '.webp', '.ico', '.woff2'}
+# Already-compressed formats gain nothing from gzip or brotli
+COMPRESSIBLE = {'.css', '.js', '.svg', '.ico'}
+SKIP_DIRS = {BUILD_DIR, 'uploads', '__pycache__'}
+# Content-Encoding -> file suffix, in order of preference
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+def build_dir(app):
+    return os.path.join(app.static_folder, BUILD_DIR)
+
+def _sources(static_folder):
+    """Paths of the assets under the static folder, relative and with forward slashes"""
+    for root, dirs, files in os.walk(static_folder):
+        dirs[:] = sorted(d for d in dirs if d not in SKIP_DIRS)
+        for name in sorted(files):
+            if os.path.splitext(name)[1].lower() in ASSET_EXTENSIONS:
+                yield os.path.relpath(os.path.join(root, name), static_folder).replace(os.sep, '/')
+
+def _write(path, data):
+    """Write via a temporary file and rename, so a running app never serves a partial file"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except OSError:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+def _compressed(data):
+    """(suffix, bytes) of each precompressed sibling that is smaller than the original"""
+    variants = [('.gz', gzip.compress(data, compresslevel=9, mtime=0))]
+    if brotli is not None:
+        variants.append(('.br', brotli.compress(data, quality=11)))
+    return [(suffix, packed) for suffix, packed in variants if len(packed) < len(data)]
+
+def build(static_folder):
+    """Copy every asset to BUILD_DIR under a content-hashed name and write the manifest.
+
+    Text assets also get .gz (and .br with the brotli package) siblings.
+    Files from earlier builds are left in place, so pages rendered before a
+    deploy keep loading their assets. Returns (source, hashed name, sizes by
+    suffix) per asset.
+    """
+    out = os.path.join(static_folder, BUILD_DIR)
+    manifest, report = {}, []
+    for source in _sources(static_folder):
+        with open(os.path.join(static_folder, source), 'rb') as f:
+            data = f.read()
+        stem, ext = os.path.splitext(source)
+        hashed = f'{stem}.{hashlib.sha256(data).hexdigest()[:12]}{ext}'
+        target = os.path.join(out, hashed)
+        files = [('', data)]
+        if ext.lower() in COMPRESSIBLE:
+            files += _compressed(data)
+        for suffix, content in files:
+            if not os.path.exists(target + suffix):
+                _write(target + suffix, content)
+        manifest[source] = hashed
+        report.append((source, hashed, {suffix or 'raw': len(content) for suffix, content in files}))
+    _write(os.path.join(out, MANIFEST), json.dumps(manifest, indent=2, sort_keys=True).encode())
+    return report
+
+def load_manifest(app):
+    """Source path -> hashed path from the last build, or {} when assets were never built"""
+    try:
+        with open(os.path.join(build_dir(app), MANIFEST), encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+def asset_url(filename):
+    """Fingerprinted URL of a static asset; the plain static URL if it is not in the build"""
+    hashed = current_app.extensions['assets'].get(filename)
+    if hashed is None:
+        return url_for('static', filename=filename)
+    return url_for('main.asset', filename=hashed)
+
+def init_app(app):
+    """Load the build manifest and register the template helper.
+
+    The manifest is read once, so restart the app after `flask build-assets`.
+    """
+    app.extensions['assets'] = load_manifest(app) if app.config.get('ASSET_FINGERPRINTS', True) else {}
+    app.add_template_global(asset_url, 'asset_url')
@@ -0,0 +1,96 @@
+from .cache import LRUCache
+from flask import current_app, url_for
+import hashlib
+import io
+import os
+import tempfile
+import qrcode
+import qrcode.image.svg
+
+# Bumped when the payload layout or the rendering changes, so old files are not reused
+PAYLOAD_VERSION = 'BP1'
+FORMATS = {'png': 'image/png', 'svg': 'image/svg+xml'}
+# Boarding passes never change under the same digest; LRUCache wants a TTL anyway
+MEMORY_TTL = 24 * 60 * 60
+
+def payload(ticket):
+    """Text encoded in a ticket's QR code: confirmation ID, flight, departure, seat and passenger"""
+    flight = ticket.flight
+    return '|'.join((
+        PAYLOAD_VERSION,
+        ticket.confirmation_id,
+        flight.flight_number,
+        flight.depart_time.strftime('%Y%m%d%H%M'),
+        ticket.seat_number or '',
+        (ticket.passenger_name or '').upper(),
+    ))
+
+def digest(ticket, fmt='svg'):
+    """Content hash of a ticket's boarding pass; it changes exactly when the encoded data does"""
+    return hashlib.sha256(f'{fmt}:{payload(ticket)}'.encode()).hexdigest()[:32]
+
+def url(ticket, fmt='svg'):
+    """Immutable URL of the ticket's current boarding pass image"""
+    return url_for('main.boarding_pass', ticket_id=ticket.id, digest=digest(ticket, fmt), fmt=fmt)
+
+def render(data, fmt):
+    """QR code image bytes for `data`"""
+    qr = qrcode.QRCode(error_correction=qrcode.constants.ERROR_CORRECT_M, box_size=8, border=2)
+    qr.add_data(data)
+    qr.make(fit=True)
+    buffer = io.BytesIO()
+    if fmt == 'svg':
+        qr.make_image(image_factory=qrcode.image.svg.SvgPathImage).save(buffer)
+    else:
+        qr.make_image().save(buffer, format='PNG')
+    return buffer.getvalue()
+
+def _path(key, fmt):
+    directory = current_app.config.get('QR_CACHE_DIR') or os.path.join(current_app.instance_path, 'qr')
+    return os.path.join(directory, key[:2], f'{key}.{fmt}')
+
+def _read(path):
+    try:
+        with open(path, 'rb') as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+
+def _write(path, image):
+    """Write via a temporary file and rename, so readers never see a partial image"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(image)
+        os.replace(tmp, path)
+    except OSError:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+def image(ticket, fmt='svg'):
+    """(digest, image bytes) of a ticket's boarding pass.
+
+    Looked up in the in-process LRU, then on disk under the content hash, and
+    rendered only when neither has it. An edited ticket (seat, passenger,
+    flight time) gets a new digest, so nothing needs to be deleted.
+    """
+    key = digest(ticket, fmt)
+    memory = current_app.extensions['boarding_passes']
+    found, data = memory.get(fmt, key)
+    if found:
+        return key, data
+
+    path = _path(key, fmt)
+    data = _read(path)
+    if data is None:
+        data = render(payload(ticket), fmt)
+        _write(path, data)
+    memory.set(fmt, key, data, MEMORY_TTL)
+    return key, data
+
+def init_app(app):
+    """In-process LRU for rendered boarding passes and the template helper"""
+    app.extensions['boarding_passes'] = LRUCache(app.config.get('QR_CACHE_ENTRIES', 512))
+    app.add_template_global(url, 'boarding_pass_url')
@@ -0,0 +1,264 @@
+from . import db
+from .models import User, Company, Flight, Banner, Offer
+from flask import current_app, has_app_context
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from collections import OrderedDict
+import os
+import pickle
+import sqlite3
+import threading
+import time
+
+class LRUCache:
+    """In-process LRU cache with a per-entry TTL"""
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()  # (namespace, key) -> (value, expires_at)
+        self.lock = threading.Lock()
+
+    def get(self, namespace, key):
+        """Return (found, value)"""
+        with self.lock:
+            entry = self.entries.get((namespace, key))
+            if entry is None:
+                return False, None
+            if entry[1] <= time.monotonic():
+                del self.entries[(namespace, key)]
+                return False, None
+            self.entries.move_to_end((namespace, key))
+            return True, entry[0]
+
+    def set(self, namespace, key, value, ttl):
+        with self.lock:
+            self.entries[(namespace, key)] = (value, time.monotonic() + ttl)
+            self.entries.move_to_end((namespace, key))
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def delete(self, namespace, key=None):
+        """Drop one key, or the whole namespace when key is None"""
+        with self.lock:
+            if key is not None:
+                self.entries.pop((namespace, key), None)
+                return
+            for entry_key in [k for k in self.entries if k[0] == namespace]:
+                del self.entries[entry_key]
+
+class SQLiteCache:
+    """Shared cache tier in a local SQLite file, visible to every worker on the host.
+
+    Besides the entries it keeps a generation counter per namespace, bumped on
+    every invalidation, so workers know when to drop their in-process copies.
+    Expired entries are deleted by the writers, at most once per
+    purge_interval seconds each, so keys that are never read or invalidated
+    again (e.g. fragments keyed on an old version) do not pile up in the file.
+    """
+
+    def __init__(self, path, purge_interval=60.0):
+        self.path = path
+        self.local = threading.local()
+        self.purge_interval = purge_interval
+        self.purged_at = time.monotonic()
+        with self._connect() as conn:
+            conn.execute('CREATE TABLE IF NOT EXISTS cache_entry ('
+                         'namespace TEXT, key TEXT, value BLOB, expires_at REAL, PRIMARY KEY (namespace, key))')
+            conn.execute('CREATE INDEX IF NOT EXISTS ix_cache_entry_expires_at ON cache_entry (expires_at)')
+            conn.execute('CREATE TABLE IF NOT EXISTS cache_generation (namespace TEXT PRIMARY KEY, generation INTEGER)')
+
+    def _connect(self):
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute('PRAGMA journal_mode=WAL')
+            self.local.conn = conn
+        return conn
+
+    def get(self, namespace, key):
+        row = self._connect().execute(
+            'SELECT value FROM cache_entry WHERE namespace = ? AND key = ? AND expires_at > ?',
+            (namespace, key, time.time())
+        ).fetchone()
+        if row is None:
+            return False, None
+        return True, pickle.loads(row[0])
+
+    def set(self, namespace, key, value, ttl):
+        with self._connect() as conn:
+            conn.execute('INSERT OR REPLACE INTO cache_entry VALUES (?, ?, ?, ?)',
+                         (namespace, key, pickle.dumps(value), time.time() + ttl))
+        if time.monotonic() - self.purged_at >= self.purge_interval:
+            self.purge()
+
+    def set_if_unchanged(self, namespace, key, value, ttl, generation):
+        """set() unless the namespace was invalidated since generations() returned `generation`.
+
+        The check and the write are one statement, and delete() bumps the
+        generation in the same transaction as the delete, so a value read
+        before an invalidation can never be stored after it. Returns whether
+        the value was stored.
+        """
+        with self._connect() as conn:
+            stored = conn.execute(
+                'INSERT OR REPLACE INTO cache_entry SELECT ?, ?, ?, ? '
+                'WHERE COALESCE((SELECT generation FROM cache_generation WHERE namespace = ?), 0) = ?',
+                (namespace, key, pickle.dumps(value), time.time() + ttl, namespace, generation or 0)
+            ).rowcount == 1
+        if time.monotonic() - self.purged_at >= self.purge_interval:
+            self.purge()
+        return stored
+
+    def purge(self):
+        """Delete every expired entry; returns how many were removed"""
+        self.purged_at = time.monotonic()
+        with self._connect() as conn:
+            return conn.execute('DELETE FROM cache_entry WHERE expires_at <= ?', (time.time(),)).rowcount
+
+    def delete(self, namespace, key=None):
+        with self._connect() as conn:
+            if key is None:
+                conn.execute('DELETE FROM cache_entry WHERE namespace = ?', (namespace,))
+            else:
+                conn.execute('DELETE FROM cache_entry WHERE namespace = ? AND key = ?', (namespace, key))
+            conn.execute('INSERT INTO cache_generation VALUES (?, 1) ON CONFLICT(namespace) '
+                         'DO UPDATE SET generation = generation + 1', (namespace,))
+
+    def generations(self):
+        return dict(self._connect().execute('SELECT namespace, generation FROM cache_generation'))
+
+class Cache:
+    """Read-through cache: in-process LRU first, then the optional shared tier.
+
+    Keys live in namespaces ('airlines', 'flight', ...) so a change can drop
+    everything derived from one table at once. Counters per namespace show
+    how often each tier answered.
+    """
+
+    def __init__(self, ttl=300, max_entries=1024, shared=None, sync_interval=1.0):
+        self.ttl = ttl
+        self.local = LRUCache(max_entries)
+        self.shared = shared
+        self.sync_interval = sync_interval
+        self.generations = shared.generations() if shared else {}
+        self.synced_at = time.monotonic()
+        self.counters = {}
+        self.lock = threading.Lock()
+
+    def _count(self, namespace, counter):
+        with self.lock:
+            counts = self.counters.setdefault(namespace, {'hits': 0, 'shared_hits': 0, 'misses': 0, 'invalidations': 0})
+            counts[counter] += 1
+
+    def _sync(self):
+        """Drop local entries for namespaces another worker invalidated"""
+        if self.shared is None or time.monotonic() - self.synced_at < self.sync_interval:
+            return
+        self.synced_at = time.monotonic()
+        generations = self.shared.generations()
+        for namespace, generation in generations.items():
+            if self.generations.get(namespace) != generation:
+                self.local.delete(namespace)
+        self.generations = generations
+
+    def get_or_set(self, namespace, key, factory, ttl=None):
+        """Return the cached value for (namespace, key), computing and storing it on a miss"""
+        ttl = ttl or self.ttl
+        key = str(key)
+        self._sync()
+
+        found, value = self.local.get(namespace, key)
+        if found:
+            self._count(namespace, 'hits')
+            return value
+
+        if self.shared is not None:
+            found, value = self.shared.get(namespace, key)
+            if found:
+                self._count(namespace, 'shared_hits')
+                self.local.set(namespace, key, value, ttl)
+                return value
+
+        self._count(namespace, 'misses')
+        value = factory()
+        self.local.set(namespace, key, value, ttl)
+        if self.shared is not None:
+            self.shared.set(namespace, key, value, ttl)
+        return value
+
+    def invalidate(self, namespace, key=None):
+        """Drop one key (or a whole namespace) from both tiers"""
+        key = None if key is None else str(key)
+        self._count(namespace, 'invalidations')
+        self.local.delete(namespace, key)
+        if self.shared is not None:
+            self.shared.delete(namespace, key)
+
+    def stats(self):
+        with self.lock:
+            return {
+                'namespaces': {namespace: dict(counts) for namespace, counts in self.counters.items()},
+                'entries': len(self.local.entries),
+                'shared': self.shared is not None
+            }
+
+def init_app(app):
+    """Create the app's cache from CACHE_* settings"""
+    shared = None
+    if app.config.get('CACHE_SHARED_PATH'):
+        shared = SQLiteCache(app.config['CACHE_SHARED_PATH'], app.config.get('CACHE_PURGE_INTERVAL', 60))
+    app.extensions['cache'] = Cache(
+        ttl=app.config.get('CACHE_TTL', 300),
+        max_entries=app.config.get('CACHE_MAX_ENTRIES', 1024),
+        shared=shared
+    )
+
+def get_cache():
+    return current_app.extensions['cache']
+
+def cached(namespace, key, factory, ttl=None):
+    """Read-through lookup in the current app's cache"""
+    return get_cache().get_or_set(namespace, key, factory, ttl)
+
+def invalidate(namespace, key=None):
+    """Drop cached data now, e.g. after a Core UPDATE that model events do not see"""
+    if has_app_context() and 'cache' in current_app.extensions:
+        get_cache().invalidate(namespace, key)
+
+def invalidate_after_commit(namespace, key=None):
+    """Drop cached data once the current transaction commits"""
+    db.session.info.setdefault('cache_invalidations', set()).add((namespace, key))
+
+def _namespaces_for(obj):
+    """Cache entries derived from a changed model instance"""
+    if isinstance(obj, User):
+        # Identity behind current_user (see identity.load_user)
+        return [('users', obj.id)]
+    if isinstance(obj, Company):
+        # Airline names are embedded in every cached flight
+        return [('airlines', None), ('stats', None), ('flight', None)]
+    if isinstance(obj, Flight):
+        return [('flight', obj.id), ('stats', None)]
+    if isinstance(obj, Banner):
+        return [('banners', None)]
+    if isinstance(obj, Offer):
+        return [('offers', None)]
+    return []
+
+@event.listens_for(Session, 'after_flush')
+def collect_invalidations(session, flush_context):
+    """Remember which cache entries the flushed changes affect"""
+    pending = session.info.setdefault('cache_invalidations', set())
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        pending.update(_namespaces_for(obj))
+
+@event.listens_for(Session, 'after_commit')
+def apply_invalidations(session):
+    """Invalidate only after commit so no request re-caches the old rows in between"""
+    for namespace, key in session.info.pop('cache_invalidations', ()):
+        invalidate(namespace, key)
+
+@event.listens_for(Session, 'after_rollback')
+def discard_invalidations(session):
+    session.info.pop('cache_invalidations', None)
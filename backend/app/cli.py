@@ -132,6 +132,131 @@ def stats():
     click.echo(f'Flights: {flights} (Active: {active_flights})')
     click.echo(f'Tickets: {tickets} (Paid: {paid_tickets})')
 
+@click.command('rebuild-rollups')
+@with_appcontext
+def rebuild_rollups():
+    """Rebuild the admin KPI rollup table from scratch."""
+    from .rollups import rebuild_rollups as rebuild
+    count = rebuild()
+    click.echo(f'Rebuilt {count} rollup rows.')
+
+@click.command('backfill-airports')
+@with_appcontext
+def backfill_airports():
+    """Create airports from flight labels and fill flight airport IDs."""
+    from .airports import backfill_airports as backfill
+    created, labels = backfill()
+    click.echo(f'Mapped {labels} airport labels ({created} new airports).')
+
+@click.command('expire-holds')
+@click.option('--batch-size', default=1000, show_default=True, help='Tickets expired per transaction')
+@click.option('--loop', is_flag=True, help='Keep running and sweep every --interval seconds')
+@click.option('--interval', default=60, show_default=True, help='Seconds between sweeps with --loop')
+@with_appcontext
+def expire_holds(batch_size, loop, interval):
+    """Expire unpaid bookings past their hold time and release the seats."""
+    import time
+    from sqlalchemy.exc import SQLAlchemyError
+    from .holds import expire_holds as expire
+    
+    while True:
+        try:
+            count = expire(batch_size=batch_size)
+            if count or not loop:
+                click.echo(f'{datetime.utcnow():%Y-%m-%d %H:%M:%S} Expired {count} unpaid bookings.')
+        except SQLAlchemyError as e:
+            db.session.rollback()
+            if not loop:
+                raise
+            click.echo(f'Sweep failed, retrying in {interval}s: {e}', err=True)
+        if not loop:
+            break
+        time.sleep(interval)
+
+@click.command('import-flights')
+@click.argument('company_code')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--batch-size', default=5000, show_default=True, help='Rows inserted per transaction')
+@click.option('--dry-run', is_flag=True, help='Validate the file without writing anything')
+@click.option('--max-errors', default=50, show_default=True, help='Rejected rows to list')
+@with_appcontext
+def import_flights(company_code, path, batch_size, dry_run, max_errors):
+    """Bulk-import a flight schedule (CSV, JSON or JSON Lines) for a company."""
+    import time
+    from .importer import import_flights as run_import, iter_records
+    
+    company = Company.query.filter_by(code=company_code.upper()).first()
+    if not company:
+        click.echo(f'Company with code {company_code} not found.')
+        return
+    
+    started = time.perf_counter()
+    with open(path, encoding='utf-8-sig', newline='') as stream:
+        try:
+            records = iter_records(stream, path)
+        except ValueError as e:
+            raise click.ClickException(str(e))
+        report = run_import(company, records, batch_size=batch_size, dry_run=dry_run)
+    
+    for number, message in report.errors[:max_errors]:
+        click.echo(f'Row {number}: {message}' if number else message, err=True)
+    if len(report.errors) > max_errors:
+        click.echo(f'... and {len(report.errors) - max_errors} more rejected rows', err=True)
+    verb = 'Would import' if dry_run else 'Imported'
+    click.echo(f'{verb} {report.imported} of {report.rows} rows for {company.name} '
+               f'({len(report.errors)} rejected) in {time.perf_counter() - started:.1f}s.')
+
+@click.command('materialize-schedules')
+@click.option('--horizon', type=int, help='Days ahead to generate (default SCHEDULE_HORIZON_DAYS)')
+@with_appcontext
+def materialize_schedules(horizon):
+    """Create the missing flights of every active recurring schedule."""
+    from .schedules import materialize
+    count = materialize(horizon_days=horizon)
+    click.echo(f'Created {count} flights from schedules.')
+
+class Count(click.ParamType):
+    """Row count that also accepts scientific notation, e.g. 1e6"""
+    name = 'count'
+
+    def convert(self, value, param, ctx):
+        try:
+            count = float(value)
+        except (TypeError, ValueError):
+            self.fail(f'{value!r} is not a number', param, ctx)
+        if count < 0 or count != int(count):
+            self.fail(f'{value!r} is not a whole non-negative number', param, ctx)
+        return int(count)
+
+@click.command('gen-data')
+@click.option('--users', type=Count(), default='10000', show_default=True)
+@click.option('--flights', type=Count(), default='50000', show_default=True)
+@click.option('--tickets', type=Count(), default='1e6', show_default=True, help='Approximate; spread over flights by demand')
+@click.option('--companies', type=click.IntRange(1, 676), default=50, show_default=True)
+@click.option('--seed', type=int, default=42, show_default=True)
+@click.option('--password', default='password', show_default=True, help='Shared password of the generated users')
+@with_appcontext
+def gen_data(users, flights, tickets, companies, seed, password):
+    """Add a reproducible synthetic load/benchmark dataset."""
+    import time
+    from .datagen import generate
+    
+    started = time.perf_counter()
+    counts = generate(users, flights, tickets, companies=companies, seed=seed, password=password, log=click.echo)
+    click.echo('Generated ' + ', '.join(f'{count} {table}' for table, count in counts.items())
+               + f' in {time.perf_counter() - started:.1f}s.')
+
+@click.command('build-assets')
+@with_appcontext
+def build_assets():
+    """Fingerprint and precompress static assets for asset_url()."""
+    from .assets import build, brotli
+    
+    for source, hashed, sizes in build(current_app.static_folder):
+        click.echo(f'{source} -> {hashed} (' + ', '.join(f'{suffix} {size}' for suffix, size in sizes.items()) + ')')
+    if brotli is None:
+        click.echo('brotli is not installed; only .gz files were built.')
+
 def init_app(app):
     """Register CLI commands with the Flask application."""
     app.cli.add_command(init_db)
@@ -141,4 +266,11 @@ def init_app(app):
     app.cli.add_command(create_admin)
     app.cli.add_command(create_company)
     app.cli.add_command(cleanup_past_flights)
-    app.cli.add_command(stats)
\ No newline at end of file
+    app.cli.add_command(stats)
+    app.cli.add_command(rebuild_rollups)
+    app.cli.add_command(backfill_airports)
+    app.cli.add_command(expire_holds)
+    app.cli.add_command(import_flights)
+    app.cli.add_command(materialize_schedules)
+    app.cli.add_command(gen_data)
+    app.cli.add_command(build_assets)
\ No newline at end of file
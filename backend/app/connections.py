@@ -0,0 +1,186 @@
+from . import db
+from .models import Flight, Company
+from flask import current_app
+from bisect import bisect_left, bisect_right
+from collections import namedtuple
+from datetime import datetime, timedelta
+import heapq
+import threading
+import time
+
+# Lightweight, immutable copy of the flight fields the route finder needs
+Leg = namedtuple('Leg', [
+    'id', 'flight_number', 'company_id', 'company_name', 'origin_id', 'destination_id',
+    'origin', 'destination', 'depart_time', 'arrive_time', 'price', 'seats_available'
+])
+
+LEG_COLUMNS = [
+    Flight.id, Flight.flight_number, Flight.company_id, Company.name,
+    Flight.origin_airport_id, Flight.destination_airport_id, Flight.origin, Flight.destination,
+    Flight.depart_time, Flight.arrive_time, Flight.price, Flight.seats_available
+]
+
+class ConnectionIndex:
+    """Time-expanded adjacency index of upcoming flights.
+
+    Flights are kept in per-airport and per-route lists sorted by departure
+    time, so the flights leaving a hub inside a layover window are found with
+    two bisects. Single flights can be added or removed without a rebuild.
+    Searches run without the lock, so add() and remove() never change a list
+    a search may be reading: they build new (times, legs) pairs and swap them
+    in with a single dict assignment.
+    """
+
+    def __init__(self, legs=()):
+        self.legs = {}
+        self.departures = {}  # origin airport id -> ([depart_time], [Leg])
+        self.routes = {}      # (origin id, destination id) -> ([depart_time], [Leg])
+        self.feeders = {}     # destination airport id -> origin airport ids with a direct flight
+        # Nobody can search the index before it is built, so the lists are filled in place
+        for leg in sorted(legs, key=lambda leg: leg.depart_time):
+            self.legs[leg.id] = leg
+            for table, key in ((self.departures, leg.origin_id), (self.routes, (leg.origin_id, leg.destination_id))):
+                times, items = table.setdefault(key, ([], []))
+                times.append(leg.depart_time)
+                items.append(leg)
+            self.feeders.setdefault(leg.destination_id, set()).add(leg.origin_id)
+        self.built_at = time.monotonic()
+
+    @staticmethod
+    def _insert(table, key, leg):
+        times, items = table.get(key, ([], []))
+        position = bisect_right(times, leg.depart_time)
+        table[key] = (times[:position] + [leg.depart_time] + times[position:],
+                      items[:position] + [leg] + items[position:])
+
+    @staticmethod
+    def _delete(table, key, leg):
+        times, items = table.get(key, ([], []))
+        position = bisect_left(times, leg.depart_time)
+        while position < len(items) and times[position] == leg.depart_time:
+            if items[position].id == leg.id:
+                table[key] = (times[:position] + times[position + 1:], items[:position] + items[position + 1:])
+                return
+            position += 1
+
+    def add(self, leg):
+        if leg.id in self.legs:
+            self.remove(leg.id)
+        self.legs[leg.id] = leg
+        self._insert(self.departures, leg.origin_id, leg)
+        self._insert(self.routes, (leg.origin_id, leg.destination_id), leg)
+        self.feeders[leg.destination_id] = self.feeders.get(leg.destination_id, frozenset()) | {leg.origin_id}
+
+    def remove(self, leg_id):
+        leg = self.legs.pop(leg_id, None)
+        if leg is not None:
+            self._delete(self.departures, leg.origin_id, leg)
+            self._delete(self.routes, (leg.origin_id, leg.destination_id), leg)
+
+    @staticmethod
+    def _window(table, key, start, end):
+        """Legs in `table[key]` departing within [start, end]"""
+        entry = table.get(key)
+        if not entry:
+            return ()
+        times, items = entry
+        return items[bisect_left(times, start):bisect_right(times, end)]
+
+    def search(self, origin_ids, destination_ids, start, end, passengers=1, max_stops=2,
+               min_layover=timedelta(minutes=45), max_layover=timedelta(hours=6),
+               sort_by='price', limit=20):
+        """Itineraries (tuples of legs) from any origin to any destination airport.
+
+        The first leg departs within [start, end); every connection respects
+        the layover bounds and never revisits an airport.
+        """
+        destinations = set(destination_ids)
+        itineraries = []
+
+        for origin_id in set(origin_ids):
+            for first in self._window(self.departures, origin_id, start, end):
+                if first.depart_time >= end or first.seats_available < passengers:
+                    continue
+                hub = first.destination_id
+                if hub in destinations:
+                    itineraries.append((first,))
+                    continue
+                if max_stops < 1 or hub == origin_id:
+                    continue
+
+                earliest, latest = first.arrive_time + min_layover, first.arrive_time + max_layover
+                for destination_id in destinations:
+                    for second in self._window(self.routes, (hub, destination_id), earliest, latest):
+                        if second.seats_available >= passengers:
+                            itineraries.append((first, second))
+
+                if max_stops < 2:
+                    continue
+                for second in self._window(self.departures, hub, earliest, latest):
+                    hub2 = second.destination_id
+                    if (hub2 in destinations or hub2 == origin_id
+                            or second.seats_available < passengers
+                            or not any(hub2 in self.feeders.get(d, ()) for d in destinations)):
+                        continue
+                    earliest2, latest2 = second.arrive_time + min_layover, second.arrive_time + max_layover
+                    for destination_id in destinations:
+                        for third in self._window(self.routes, (hub2, destination_id), earliest2, latest2):
+                            if third.seats_available >= passengers:
+                                itineraries.append((first, second, third))
+
+        if sort_by == 'duration':
+            key = lambda legs: (legs[-1].arrive_time - legs[0].depart_time, sum(leg.price for leg in legs))
+        else:
+            key = lambda legs: (sum(leg.price for leg in legs), legs[-1].arrive_time - legs[0].depart_time)
+        return heapq.nsmallest(limit, itineraries, key=key)
+
+def load_legs(flight_ids=None):
+    """Upcoming flights with airport IDs as Legs, in one column query"""
+    query = db.session.query(*LEG_COLUMNS).join(Company, Flight.company_id == Company.id).filter(
+        Flight.depart_time > datetime.utcnow(),
+        Flight.origin_airport_id.isnot(None),
+        Flight.destination_airport_id.isnot(None)
+    )
+    if flight_ids is not None:
+        query = query.filter(Flight.id.in_(flight_ids))
+    return [Leg(*row) for row in query.all()]
+
+_index = None
+_stale = True
+_lock = threading.Lock()
+
+def get_index():
+    """Return the worker's index, rebuilding it when stale or older than CONNECTIONS_TTL"""
+    global _index, _stale
+    ttl = current_app.config.get('CONNECTIONS_TTL', 300)
+    index = _index
+    if index is not None and not _stale and time.monotonic() - index.built_at < ttl:
+        return index
+
+    with _lock:
+        if _index is None or _stale or time.monotonic() - _index.built_at >= ttl:
+            _stale = False
+            _index = ConnectionIndex(load_legs())
+        return _index
+
+def flight_changed(flight_id):
+    """Refresh one flight in the index after it was created or edited"""
+    if _index is None or _stale:
+        return
+    legs = load_legs([flight_id])
+    with _lock:
+        _index.remove(flight_id)
+        for leg in legs:
+            _index.add(leg)
+
+def flight_removed(flight_id):
+    """Drop a deleted flight from the index"""
+    if _index is None or _stale:
+        return
+    with _lock:
+        _index.remove(flight_id)
+
+def invalidate():
+    """Force a full rebuild on next use"""
+    global _stale
+    _stale = True
@@ -0,0 +1,323 @@
+from . import db, airports, rollups, versions, cache
+from .models import User, Company, Flight, Ticket
+from .seatmaps import layout_for
+from werkzeug.security import generate_password_hash
+from datetime import datetime, timedelta
+import itertools
+import math
+import random
+
+# (label, relative traffic): route demand follows a gravity model, origin weight x destination weight
+AIRPORTS = [
+    ('New York (JFK)', 62), ('Los Angeles (LAX)', 59), ('Chicago (ORD)', 54), ('Atlanta (ATL)', 75),
+    ('Dallas (DFW)', 57), ('Denver (DEN)', 52), ('San Francisco (SFO)', 42), ('Seattle (SEA)', 37),
+    ('Las Vegas (LAS)', 40), ('Miami (MIA)', 36), ('Boston (BOS)', 30), ('Phoenix (PHX)', 35),
+    ('London (LHR)', 61), ('Paris (CDG)', 57), ('Frankfurt (FRA)', 48), ('Istanbul (IST)', 64),
+    ('Dubai (DXB)', 66), ('Moscow (SVO)', 45), ('Almaty (ALA)', 18), ('Tashkent (TAS)', 12),
+    ('Bishkek (FRU)', 9), ('Osh (OSS)', 4), ('Novosibirsk (OVB)', 8), ('Delhi (DEL)', 55),
+    ('Beijing (PEK)', 58), ('Tokyo (HND)', 60), ('Seoul (ICN)', 40), ('Singapore (SIN)', 44),
+]
+
+# (aircraft type, seats, relative fleet share)
+FLEET = [
+    ('Airbus A320', 180, 34), ('Boeing 737-800', 160, 30), ('Airbus A321', 220, 12),
+    ('Embraer E190', 100, 8), ('CRJ-900', 76, 5), ('Boeing 787-9', 290, 5),
+    ('Airbus A330-300', 300, 3), ('Boeing 777-300ER', 360, 3),
+]
+
+# Departures per hour of the day: morning and evening banks, almost nothing at night
+HOUR_WEIGHTS = [1, 1, 1, 1, 2, 6, 10, 12, 11, 9, 8, 7, 7, 7, 8, 9, 10, 11, 12, 10, 7, 5, 3, 2]
+
+FIRST_NAMES = ['Aibek', 'Aigerim', 'Alice', 'Bob', 'Carlos', 'Dana', 'Elena', 'Farid', 'Gulnara', 'Hiro',
+               'Ivan', 'Jamila', 'Kanat', 'Laura', 'Marat', 'Nurlan', 'Olga', 'Priya', 'Timur', 'Zarina']
+LAST_NAMES = ['Abdyldaev', 'Brown', 'Chen', 'Dzhaparov', 'Garcia', 'Ivanova', 'Kim', 'Kuznetsov', 'Lee',
+              'Mamytov', 'Nazarova', 'Omurbekov', 'Patel', 'Sadykov', 'Smith', 'Tanaka', 'Usenov', 'Wilson']
+FULL_NAMES = [f'{first} {last}' for first in FIRST_NAMES for last in LAST_NAMES]
+
+PAST_DAYS = 60      # Departures are spread from PAST_DAYS ago...
+FUTURE_DAYS = 120   # ...to FUTURE_DAYS ahead
+DRAW_BATCH = 4096   # Flights drawn per rng.choices() call; fixed so the data does not depend on chunk_size
+CHUNK_SIZE = 20000  # Rows per executemany / transaction
+
+class _Model:
+    """Routes, fleet and fares derived from the seed; shared by both flight passes"""
+
+    def __init__(self, seed, companies):
+        rng = random.Random(f'{seed}:model')
+        self.routes = [(origin, destination) for origin, destination in itertools.permutations(range(len(AIRPORTS)), 2)]
+        self.route_weights = list(itertools.accumulate(
+            AIRPORTS[origin][1] * AIRPORTS[destination][1] for origin, destination in self.routes
+        ))
+        # Block time and base fare per route; the fare grows with distance and shrinks with demand
+        self.minutes = [rng.randint(55, 720) for _ in self.routes]
+        self.fares = [round(40 + minutes * rng.uniform(0.35, 0.8)) for minutes in self.minutes]
+        self.fleet_weights = list(itertools.accumulate(share for _, _, share in FLEET))
+        self.hour_weights = list(itertools.accumulate(HOUR_WEIGHTS))
+        # Market share falls off with rank (Zipf), so a few carriers fly most of the flights
+        self.company_weights = list(itertools.accumulate(1 / rank for rank in range(1, companies + 1)))
+
+def _draw_flights(model, seed, count, now):
+    """Deterministic stream of (route, company index, depart_time, aircraft, price, seats_total, demand).
+
+    `demand` is the expected number of tickets before scaling to the
+    requested total: seats x load factor x share already booked by `now`.
+    """
+    rng = random.Random(f'{seed}:flights')
+    span = (PAST_DAYS + FUTURE_DAYS) * 24 * 60
+    start = now - timedelta(days=PAST_DAYS)
+    for offset in range(0, count, DRAW_BATCH):
+        size = min(DRAW_BATCH, count - offset)
+        routes = rng.choices(range(len(model.routes)), cum_weights=model.route_weights, k=size)
+        companies = rng.choices(range(len(model.company_weights)), cum_weights=model.company_weights, k=size)
+        aircraft = rng.choices(FLEET, cum_weights=model.fleet_weights, k=size)
+        hours = rng.choices(range(24), cum_weights=model.hour_weights, k=size)
+        for route, company, (aircraft_type, seats_total, _), hour in zip(routes, companies, aircraft, hours):
+            day = int(rng.random() * span) // (24 * 60)
+            depart_time = start + timedelta(days=day, hours=hour, minutes=5 * int(rng.random() * 12))
+            # Long-haul routes get the widebodies
+            if model.minutes[route] > 360 and seats_total < 250:
+                aircraft_type, seats_total = 'Boeing 787-9', 290
+            load = rng.betavariate(9, 2.5)
+            days_out = (depart_time - now).total_seconds() / 86400
+            booked = 1.0 if days_out <= 0 else math.exp(-days_out / 35)
+            price = round(model.fares[route] * rng.lognormvariate(0, 0.25) * (0.8 + 0.4 * load), 2)
+            yield route, company, depart_time, aircraft_type, price, seats_total, seats_total * load * booked
+
+_seat_labels_cache = {}
+
+def _seat_labels(aircraft_type, seats_total):
+    """Seat labels in row-major order, as seatmaps.SeatMap numbers them"""
+    key = (aircraft_type, seats_total)
+    if key not in _seat_labels_cache:
+        letters = layout_for(aircraft_type).replace(' ', '')
+        _seat_labels_cache[key] = [f'{index // len(letters) + 1}{letters[index % len(letters)]}'
+                                   for index in range(seats_total)]
+    return _seat_labels_cache[key]
+
+def company_code(company_id):
+    """Three-letter code (GAA, GAB, ...) so flight numbers pass validate_flight_number"""
+    high, low = divmod((company_id - 1) % 676, 26)
+    return f'G{chr(65 + high)}{chr(65 + low)}'
+
+def _next_id(model):
+    return (db.session.query(db.func.max(model.id)).scalar() or 0) + 1
+
+def _insert(table, rows):
+    """One executemany per chunk, each in its own transaction.
+
+    On SQLite the rows go straight to the driver as tuples, with datetimes
+    rendered the way SQLAlchemy stores them. SQLAlchemy's per-value bind
+    processing would otherwise cost more than the insert itself. Other
+    databases keep the Core path and its batched multi-row VALUES.
+    """
+    if not rows:
+        return
+    if db.engine.dialect.name != 'sqlite':
+        for offset in range(0, len(rows), CHUNK_SIZE):
+            db.session.execute(table.insert(), rows[offset:offset + CHUNK_SIZE])
+            db.session.commit()
+        return
+
+    columns = list(rows[0])
+    datetimes = [index for index, name in enumerate(columns) if isinstance(table.c[name].type, db.DateTime)]
+    sql = f'INSERT INTO "{table.name}" ({", ".join(columns)}) VALUES ({", ".join("?" * len(columns))})'
+    for offset in range(0, len(rows), CHUNK_SIZE):
+        params = []
+        for row in rows[offset:offset + CHUNK_SIZE]:
+            values = list(row.values())
+            for index in datetimes:
+                if values[index] is not None:
+                    values[index] = values[index].isoformat(' ', 'microseconds')
+            params.append(tuple(values))
+        db.session.connection().exec_driver_sql(sql, params)
+        db.session.commit()
+
+def _sync_sequences(*models):
+    """Move PostgreSQL id sequences past the explicitly inserted ids"""
+    if db.engine.dialect.name != 'postgresql':
+        return
+    for model in models:
+        table = model.__tablename__
+        db.session.execute(db.text(
+            f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), COALESCE(MAX(id), 1)) FROM \"{table}\""
+        ))
+    db.session.commit()
+
+def generate_users(count, seed, now, password='password', log=print):
+    """Insert `count` regular users sharing one precomputed password hash. Returns (first id, count)"""
+    rng = random.Random(f'{seed}:users')
+    password_hash = generate_password_hash(password)
+    first_id = _next_id(User)
+    for offset in range(0, count, CHUNK_SIZE):
+        rows = []
+        for user_id in range(first_id + offset, first_id + min(count, offset + CHUNK_SIZE)):
+            created_at = now - timedelta(minutes=int(rng.random() * 3 * 365 * 24 * 60))
+            rows.append({
+                'id': user_id,
+                'name': rng.choice(FULL_NAMES),
+                'email': f'user{user_id}@gen.example.com',
+                'password_hash': password_hash,
+                'role': 'user',
+                'is_active': True,
+                'created_at': created_at,
+                'updated_at': created_at,
+            })
+        _insert(User.__table__, rows)
+        log(f'  users {offset + len(rows)}/{count}')
+    return first_id, count
+
+def generate_companies(count, now):
+    """Insert `count` airlines. Returns their ids, largest carrier first"""
+    first_id = _next_id(Company)
+    _insert(Company.__table__, [{
+        'id': company_id, 'name': f'Generated Airline {company_id}', 'code': company_code(company_id),
+        'is_active': True, 'created_at': now
+    } for company_id in range(first_id, first_id + count)])
+    return list(range(first_id, first_id + count))
+
+def _ticket_rows(rng, ticket_id, flight_id, flight, count, users, now):
+    """`count` tickets for one flight; returns (rows, seated tickets)
+
+    Bookings build up ahead of departure. About one in nine is cancelled
+    later, and it is refunded if that happened 24+ hours before departure.
+    Unpaid holds only exist for recent bookings on upcoming flights.
+    """
+    depart_time, aircraft_type, price, seats_total = flight
+    first_user, user_count = users
+    seats = iter(rng.sample(_seat_labels(aircraft_type, seats_total), min(count, seats_total)))
+    rows, seated = [], 0
+    upcoming = depart_time > now
+    last_cancel = min(depart_time, now)
+    refund_cutoff = depart_time - timedelta(hours=24)
+    draw, lead_time = rng.random, rng.expovariate
+    for _ in range(count):
+        created_at = depart_time - timedelta(days=lead_time(1 / 30), hours=1)
+        if created_at > now:
+            created_at = now - timedelta(days=7 * draw())
+        roll = draw()
+        canceled_at = seat_number = None
+        if roll < 0.11:
+            canceled_at = created_at + (last_cancel - created_at) * draw()
+            status = 'refunded' if canceled_at <= refund_cutoff else 'canceled'
+        elif roll < 0.13:
+            status = 'expired'
+        else:
+            status = 'paid'
+            if upcoming and roll > 0.96:
+                status, created_at = 'pending_payment', now - timedelta(hours=draw())
+            seat_number = next(seats, None)
+            if seat_number is None:
+                status, canceled_at = 'canceled', created_at  # Oversold: the booking never got a seat
+            else:
+                seated += 1
+        rows.append({
+            'id': ticket_id,
+            # Power-law draw: a small share of users are frequent flyers
+            'user_id': first_user + int(user_count * draw() ** 3),
+            'flight_id': flight_id,
+            'status': status,
+            'confirmation_id': f'G{ticket_id:07X}',
+            'price': price,
+            'passenger_name': FULL_NAMES[int(draw() * len(FULL_NAMES))],
+            'seat_number': seat_number,
+            'created_at': created_at,
+            'canceled_at': canceled_at,
+            'updated_at': canceled_at or created_at,
+        })
+        ticket_id += 1
+    return rows, seated
+
+def generate_flights(count, tickets, company_ids, users, seed, now, log=print):
+    """Insert `count` flights and about `tickets` tickets spread over them by demand.
+
+    The flights are drawn twice from the same seed: first to total the
+    demand so it can be scaled to `tickets`, then for real. That way every
+    flight's seats_available already matches its tickets when it is inserted.
+    Returns (flights, tickets) inserted.
+    """
+    model = _Model(seed, len(company_ids))
+    total_demand = sum(draw[-1] for draw in _draw_flights(model, seed, count, now)) or 1.0
+    scale = tickets / total_demand
+
+    airport_cache = {}
+    created = {label: airports.get_or_create_airport(label, airport_cache) for label, _ in AIRPORTS}
+    db.session.flush()
+    airport_ids = {label: airport.id for label, airport in created.items()}
+    db.session.commit()
+
+    rng = random.Random(f'{seed}:tickets')
+    flight_id, ticket_id = _next_id(Flight), _next_id(Ticket)
+    flight_rows, ticket_rows, made_flights, made_tickets = [], [], 0, 0
+
+    def flush():
+        _insert(Flight.__table__, flight_rows)
+        _insert(Ticket.__table__, ticket_rows)
+        log(f'  flights {made_flights}/{count}, tickets {made_tickets}')
+        flight_rows.clear()
+        ticket_rows.clear()
+
+    for route, company, depart_time, aircraft_type, price, seats_total, demand in _draw_flights(model, seed, count, now):
+        origin, destination = (AIRPORTS[index][0] for index in model.routes[route])
+        wanted = demand * scale
+        booked = int(wanted) + (rng.random() < wanted % 1)
+        rows, seated = _ticket_rows(rng, ticket_id, flight_id, (depart_time, aircraft_type, price, seats_total),
+                                    booked, users, now)
+        company_id = company_ids[company]
+        flight_rows.append({
+            'id': flight_id,
+            'flight_number': f'{company_code(company_id)}{route % 9000 + 1}',
+            'company_id': company_id,
+            'origin': origin,
+            'destination': destination,
+            'origin_airport_id': airport_ids[origin],
+            'destination_airport_id': airport_ids[destination],
+            'depart_time': depart_time,
+            'arrive_time': depart_time + timedelta(minutes=model.minutes[route]),
+            'price': price,
+            'seats_total': seats_total,
+            'seats_available': seats_total - seated,
+            'stops': 0 if model.minutes[route] < 480 or rng.random() < 0.6 else 1,
+            'aircraft_type': aircraft_type,
+            'created_at': min(now, depart_time - timedelta(days=180)),
+            'updated_at': now,
+        })
+        ticket_rows.extend(rows)
+        flight_id += 1
+        ticket_id += len(rows)
+        made_flights += 1
+        made_tickets += len(rows)
+        if len(flight_rows) >= CHUNK_SIZE or len(ticket_rows) >= CHUNK_SIZE:
+            flush()
+    if flight_rows:
+        flush()
+    return made_flights, made_tickets
+
+def generate(users, flights, tickets, companies=50, seed=42, now=None, password='password', log=print):
+    """Fill the database with a reproducible synthetic dataset.
+
+    The same seed, counts and `now` (default: today's midnight UTC) give the
+    same rows on SQLite and PostgreSQL. Rows are written with Core
+    executemany in CHUNK_SIZE batches with explicit ids. Every user gets the
+    same password, so only one hash is computed. The KPI rollups are rebuilt
+    at the end. Returns {table: rows inserted}.
+    """
+    if tickets and not users:
+        raise ValueError('Tickets need at least one user')
+    if not 1 <= companies <= 676:
+        raise ValueError('companies must be between 1 and 676')
+    now = now or datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    user_range = generate_users(users, seed, now, password, log)
+    company_ids = generate_companies(companies, now)
+    log(f'  companies {companies}')
+    made_flights, made_tickets = generate_flights(flights, tickets, company_ids, user_range, seed, now, log)
+    _sync_sequences(User, Company, Flight, Ticket)
+
+    log('  rebuilding KPI rollups')
+    rollups.rebuild_rollups()
+    # Core inserts bypass the model events that bump versions and drop caches
+    versions.touch('flights')
+    versions.touch('airlines')
+    cache.invalidate_after_commit('stats')
+    cache.invalidate_after_commit('airlines')
+    db.session.commit()
+    return {'users': users, 'companies': companies, 'flights': made_flights, 'tickets': made_tickets}
@@ -1,9 +1,12 @@
 from flask_wtf import FlaskForm
-from flask_wtf.file import FileField, FileAllowed
-from wtforms import StringField, PasswordField, SubmitField, IntegerField, FloatField, DateTimeField, SelectField, TextAreaField, BooleanField, HiddenField, DateField
+from flask_wtf.file import FileField, FileAllowed, FileRequired
+from wtforms import StringField, PasswordField, SubmitField, IntegerField, FloatField, DateTimeField, SelectField, TextAreaField, BooleanField, HiddenField, DateField, TimeField, SelectMultipleField
+from wtforms.widgets import ListWidget, CheckboxInput
 from wtforms.validators import DataRequired, Email, Length, NumberRange, Optional, ValidationError
 from .models import User, Company
+from .utils import validate_flight_number
 from datetime import datetime
+from zoneinfo import ZoneInfo
 
 class LoginForm(FlaskForm):
     email = StringField('Email', validators=[DataRequired(), Email()])
@@ -39,8 +42,55 @@ class FlightForm(FlaskForm):
     aircraft_type = StringField('Тип самолета', validators=[Optional(), Length(max=50)])
     submit = SubmitField('Сохранить рейс')
 
+class FlightScheduleForm(FlaskForm):
+    flight_number = StringField('Номер рейса', validators=[DataRequired(), Length(min=2, max=20)])
+    origin = StringField('Место отправления', validators=[DataRequired(), Length(max=80)])
+    destination = StringField('Место назначения', validators=[DataRequired(), Length(max=80)])
+    days_of_week = SelectMultipleField('Дни недели', choices=[
+        ('1', 'Пн'), ('2', 'Вт'), ('3', 'Ср'), ('4', 'Чт'), ('5', 'Пт'), ('6', 'Сб'), ('7', 'Вс')
+    ], default=['1', '2', '3', '4', '5', '6', '7'], validators=[DataRequired()],
+        option_widget=CheckboxInput(), widget=ListWidget(prefix_label=False))
+    depart_local = TimeField('Время отправления (местное)', validators=[DataRequired()])
+    arrive_local = TimeField('Время прибытия (местное)', validators=[DataRequired()])
+    arrive_day_offset = IntegerField('Прибытие через (дней)', default=0, validators=[NumberRange(min=0, max=2)])
+    depart_timezone = StringField('Часовой пояс отправления', default='Asia/Bishkek', validators=[DataRequired(), Length(max=64)])
+    arrive_timezone = StringField('Часовой пояс прибытия', default='Asia/Bishkek', validators=[DataRequired(), Length(max=64)])
+    valid_from = DateField('Действует с', validators=[DataRequired()])
+    valid_to = DateField('Действует до', validators=[Optional()])
+    price = FloatField('Цена', validators=[DataRequired(), NumberRange(min=0)])
+    seats_total = IntegerField('Всего мест', validators=[DataRequired(), NumberRange(min=1, max=1000)])
+    stops = IntegerField('Количество пересадок', default=0, validators=[NumberRange(min=0, max=5)])
+    aircraft_type = StringField('Тип самолета', validators=[Optional(), Length(max=50)])
+    is_active = BooleanField('Активно', default=True)
+    submit = SubmitField('Сохранить расписание')
+    
+    def validate_flight_number(self, field):
+        if not validate_flight_number(field.data):
+            raise ValidationError('Формат номера рейса: 2-3 буквы и 1-4 цифры, например KG101.')
+    
+    def validate_depart_timezone(self, field):
+        try:
+            ZoneInfo(field.data)
+        except (ValueError, KeyError):
+            raise ValidationError('Неизвестный часовой пояс (пример: Asia/Bishkek).')
+    
+    validate_arrive_timezone = validate_depart_timezone
+    
+    def validate_valid_to(self, field):
+        if field.data and self.valid_from.data and field.data < self.valid_from.data:
+            raise ValidationError('Дата окончания должна быть не раньше даты начала.')
+
+class FlightImportForm(FlaskForm):
+    schedule = FileField('Файл расписания', validators=[
+        FileRequired(),
+        FileAllowed(['csv', 'json', 'jsonl', 'ndjson'], 'Только CSV, JSON или JSON Lines!')
+    ])
+    dry_run = BooleanField('Только проверить, без сохранения')
+    submit = SubmitField('Импортировать')
+
 class TicketPurchaseForm(FlaskForm):
     passenger_name = StringField('Имя пассажира', validators=[DataRequired(), Length(min=2, max=120)])
+    seat_number = HiddenField('Место', validators=[Optional(), Length(max=10)])
     submit = SubmitField('Купить билет')
 
 class CompanyForm(FlaskForm):
@@ -48,6 +98,7 @@ class CompanyForm(FlaskForm):
     code = StringField('Код авиакомпании', validators=[DataRequired(), Length(min=2, max=10)])
     manager_id = SelectField('Менеджер', coerce=int, validators=[Optional()])
     is_active = BooleanField('Активна', default=True)
+    hold_ttl_hours = IntegerField('Срок брони без оплаты (часы)', validators=[Optional(), NumberRange(min=1, max=168)])
     submit = SubmitField('Сохранить компанию')
     
     def __init__(self, *args, **kwargs):
@@ -99,7 +150,7 @@ class FlightFilterForm(FlaskForm):
         ('', 'Любое'),
         ('0', 'Прямой'),
         ('1', '1 пересадка'),
-        ('2', '2+ пересадки')
+        ('2', 'до 2 пересадок')
     ], validators=[Optional()])
     sort_by = SelectField('Сортировать по', choices=[
         ('price_asc', 'Цене (по возрастанию)'),
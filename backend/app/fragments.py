@@ -0,0 +1,84 @@
+from . import cache, versions
+from flask import current_app, g
+from jinja2 import nodes
+from jinja2.ext import Extension
+from markupsafe import Markup
+import threading
+import time
+
+class FragmentCacheExtension(Extension):
+    """{% cache key[, ttl] %}...{% endcache %} caches the rendered block in the app cache.
+
+    The key must change whenever the block's output would, e.g.
+    ('index-banners', data_version('banners')); ttl defaults to CACHE_TTL.
+    Blocks must not render per-user or per-request content.
+    """
+    tags = {'cache'}
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        args = [parser.parse_expression()]
+        if parser.stream.skip_if('comma'):
+            args.append(parser.parse_expression())
+        else:
+            args.append(nodes.Const(None))
+        body = parser.parse_statements(('name:endcache',), drop_needle=True)
+        return nodes.CallBlock(self.call_method('_render', args), [], [], body).set_lineno(lineno)
+
+    def _render(self, key, ttl, caller):
+        if not current_app.config.get('FRAGMENT_CACHE', True):
+            return caller()
+        return render(key, caller, ttl)
+
+class _Stats:
+    """Hits, misses and render time per fragment name, for this worker"""
+
+    def __init__(self):
+        self.counters = {}
+        self.lock = threading.Lock()
+
+    def record(self, name, hit, seconds):
+        with self.lock:
+            counts = self.counters.setdefault(name, {'hits': 0, 'misses': 0, 'render_ms': 0.0, 'saved_ms': 0.0})
+            counts['hits' if hit else 'misses'] += 1
+            counts['saved_ms' if hit else 'render_ms'] += seconds * 1000
+
+    def snapshot(self):
+        with self.lock:
+            return {name: {key: round(value, 2) if isinstance(value, float) else value for key, value in counts.items()}
+                    for name, counts in self.counters.items()}
+
+_stats = _Stats()
+
+def render(key, caller, ttl=None):
+    """Cached output of `caller` for `key`; a hit is credited with the render time it avoided"""
+    name = key[0] if isinstance(key, (tuple, list)) else key
+    rendered = []
+
+    def factory():
+        started = time.perf_counter()
+        html = str(caller())
+        rendered.append(time.perf_counter() - started)
+        return html, rendered[0]
+
+    html, seconds = cache.cached('fragments', repr(key), factory, ttl)
+    _stats.record(name, hit=not rendered, seconds=seconds)
+    return Markup(html)
+
+def data_version(*names):
+    """Version counters of the given collections, for fragment keys.
+
+    All counters are read in one query the first time a request asks.
+    """
+    if 'data_versions' not in g:
+        current = versions.current(*versions.COLLECTIONS)
+        g.data_versions = dict(zip(versions.COLLECTIONS, (version for version, _ in current)))
+    return tuple(g.data_versions[name] for name in names)
+
+def stats():
+    return _stats.snapshot()
+
+def init_app(app):
+    """Register the {% cache %} tag and the data_version() helper"""
+    app.jinja_env.add_extension(FragmentCacheExtension)
+    app.add_template_global(data_version, 'data_version')
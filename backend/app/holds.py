@@ -0,0 +1,74 @@
+from . import db, inventory, seatmaps
+from .models import Company, Flight, Ticket
+from flask import current_app
+from collections import Counter
+from datetime import datetime, timedelta
+
+def hold_ttl_hours(company):
+    """Hours an unpaid booking with this company keeps its seats"""
+    return company.hold_ttl_hours or current_app.config.get('HOLD_TTL_HOURS', 24)
+
+def ttl_groups():
+    """Company IDs grouped by their hold lifetime: {hours: [company ids]}"""
+    default = current_app.config.get('HOLD_TTL_HOURS', 24)
+    groups = {}
+    for company_id, ttl in db.session.query(Company.id, Company.hold_ttl_hours):
+        groups.setdefault(ttl or default, []).append(company_id)
+    return groups
+
+def _expire_batch(company_ids, cutoff, now, batch_size):
+    """Expire up to batch_size overdue holds and return their seats in one transaction.
+
+    The overdue tickets are found through the (status, created_at) index and
+    updated by ID; no Ticket objects are loaded. Returns the number expired.
+    """
+    overdue = db.select(Ticket.id).join(Flight, Flight.id == Ticket.flight_id).where(
+        Ticket.status == 'pending_payment',
+        Ticket.created_at < cutoff,
+        Flight.company_id.in_(company_ids)
+    ).order_by(Ticket.created_at).limit(batch_size)
+    # Concurrent sweepers on PostgreSQL take disjoint batches instead of waiting
+    overdue = overdue.with_for_update(skip_locked=True, of=Ticket)
+
+    expire = db.update(Ticket).values(status='expired', canceled_at=now).execution_options(
+        synchronize_session=False
+    )
+    if db.engine.dialect.update_returning:
+        # The status guard skips tickets paid since the SELECT; RETURNING reports only what changed
+        rows = db.session.execute(
+            expire.where(Ticket.id.in_(overdue.scalar_subquery()), Ticket.status == 'pending_payment')
+            .returning(Ticket.flight_id, Ticket.seat_number)
+        ).all()
+    else:
+        # Without RETURNING, one UPDATE per ticket tells exactly which were still
+        # pending; tickets paid or canceled since the SELECT keep their seats
+        candidates = db.session.execute(overdue.add_columns(Ticket.flight_id, Ticket.seat_number)).all()
+        rows = [(flight_id, seat_number) for ticket_id, flight_id, seat_number in candidates
+                if db.session.execute(expire.where(Ticket.id == ticket_id,
+                                                   Ticket.status == 'pending_payment')).rowcount == 1]
+
+    inventory.release_seats_by_flight(Counter(flight_id for flight_id, _ in rows))
+    seat_numbers = {}
+    for flight_id, seat_number in rows:
+        seat_numbers.setdefault(flight_id, []).append(seat_number)
+    for flight_id, labels in seat_numbers.items():
+        seatmaps.release_seats(flight_id, labels)
+    db.session.commit()
+    return len(rows)
+
+def expire_holds(now=None, batch_size=1000):
+    """Expire every unpaid booking older than its company's hold lifetime.
+
+    Works in batches of `batch_size` tickets, each committed on its own, so a
+    large backlog never holds long locks. Returns the number of tickets expired.
+    """
+    now = now or datetime.utcnow()
+    expired = 0
+    for ttl, company_ids in ttl_groups().items():
+        cutoff = now - timedelta(hours=ttl)
+        while True:
+            count = _expire_batch(company_ids, cutoff, now, batch_size)
+            expired += count
+            if count < batch_size:
+                break
+    return expired
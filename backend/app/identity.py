@@ -0,0 +1,106 @@
+from . import db, cache, login_manager
+from .models import User
+from flask import current_app
+
+class UserIdentity:
+    """current_user built from the identity cache instead of a User row.
+
+    Carries what nearly every request needs (id, name, role, is_active). Any
+    other attribute (email, profile fields, relationships, set_password)
+    loads the full row once and is read from or written to it, so profile
+    views work unchanged.
+    """
+
+    is_authenticated = True
+    is_anonymous = False
+
+    is_admin = User.is_admin
+    is_company_manager = User.is_company_manager
+    is_regular_user = User.is_regular_user
+
+    def __init__(self, id, name, role, is_active, updated_at):
+        state = self.__dict__
+        state.update(id=id, name=name, role=role, is_active=is_active, _updated_at=updated_at, _row=None)
+
+    @property
+    def row(self):
+        """The full User row, loaded on first use.
+
+        If it changed behind the cache's back (e.g. a Core UPDATE), the
+        cached identity is dropped so the next request rebuilds it.
+        """
+        if self._row is None:
+            row = db.session.get(User, self.id)
+            self.__dict__.update(_row=row, name=row.name, role=row.role, is_active=row.is_active)
+            if row.updated_at != self._updated_at:
+                cache.invalidate('users', self.id)
+        return self._row
+
+    def get_id(self):
+        return str(self.id)
+
+    def __getattr__(self, attr):
+        # Only called for attributes the identity does not carry
+        if attr.startswith('_'):
+            raise AttributeError(attr)
+        return getattr(self.row, attr)
+
+    def __setattr__(self, attr, value):
+        setattr(self.row, attr, value)
+        if attr in ('name', 'role', 'is_active'):
+            self.__dict__[attr] = value
+
+    def __eq__(self, other):
+        if isinstance(other, (UserIdentity, User)):
+            return self.id == other.id
+        return NotImplemented
+
+    def __hash__(self):
+        return hash(self.id)
+
+def _load_identity(user_id):
+    row = db.session.query(User.id, User.name, User.role, User.is_active, User.updated_at) \
+        .filter(User.id == user_id).first()
+    return tuple(row) if row else None
+
+def load_user(user_id):
+    """Flask-Login user loader backed by the shared cache tier.
+
+    With USER_CACHE_TTL set, the identity is read from the CACHE_SHARED_PATH
+    file on every request, never from a per-worker copy. Committing a User
+    row deletes that entry for every worker at once, so a deactivation or a
+    role change applies to the user's very next request wherever it lands.
+    Deactivated users are logged out. Without USER_CACHE_TTL the full row
+    is queried as before.
+    """
+    try:
+        user_id = int(user_id)
+    except (TypeError, ValueError):
+        return None
+    ttl = current_app.config.get('USER_CACHE_TTL')
+    if not ttl:
+        user = db.session.get(User, user_id)
+        return user if user is not None and user.is_active else None
+    
+    shared = cache.get_cache().shared
+    found, identity = shared.get('users', str(user_id))
+    if not found:
+        # A user commit landing between our read and the set would have its
+        # invalidation undone by the older row; the 'users' generation moves
+        # with every invalidation, so the row is stored only if it stood still
+        generation = shared.generations().get('users')
+        identity = _load_identity(user_id)
+        shared.set_if_unchanged('users', str(user_id), identity, ttl, generation)
+    if identity is None or not identity[3]:
+        return None
+    return UserIdentity(*identity)
+
+def init_app(app):
+    """Serve current_user from the identity cache.
+
+    A per-worker identity cache would keep deactivated users and old roles
+    alive in the other workers, so USER_CACHE_TTL requires the shared tier.
+    """
+    if app.config.get('USER_CACHE_TTL') and app.extensions['cache'].shared is None:
+        raise RuntimeError('USER_CACHE_TTL needs CACHE_SHARED_PATH: the identity cache must be shared by all workers')
+    login_manager.user_loader(load_user)
@@ -0,0 +1,225 @@
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app, url_for
+from PIL import Image, ImageOps
+import hashlib
+import io
+import os
+import re
+import tempfile
+import threading
+
+# name -> max width in pixels; smaller images are never upscaled
+VARIANTS = {'thumb': 160, 'card': 480, 'hero': 1600}
+FORMATS = {'webp': 'image/webp', 'jpg': 'image/jpeg'}
+ALLOWED_FORMATS = {'JPEG', 'PNG', 'GIF', 'WEBP'}
+# Larger uploads are refused before Pillow allocates their pixels
+MAX_PIXELS = 40_000_000
+_DIGEST = re.compile(r'[0-9a-f]{32}')
+_MEDIA_URL = re.compile(r'/media/([0-9a-f]{32})/[a-z]+\.(?:webp|jpg)$')
+
+class InvalidImage(ValueError):
+    """Raised when an upload is not an image in one of ALLOWED_FORMATS"""
+
+class LocalStorage:
+    """Files under a directory on this machine, keyed by relative path"""
+
+    def __init__(self, root):
+        self.root = root
+
+    def path(self, key):
+        return os.path.join(self.root, *key.split('/'))
+
+    def exists(self, key):
+        return os.path.exists(self.path(key))
+
+    def read(self, key):
+        try:
+            with open(self.path(key), 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def save(self, key, data):
+        """Write via a temporary file and rename, so readers never see a partial file"""
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+                self._sync(f)
+            os.replace(tmp, path)
+        except OSError:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+
+    def _sync(self, f):
+        pass
+
+class SharedStorage(LocalStorage):
+    """A directory mounted on every node (NFS, SMB, a shared volume).
+
+    Keys are content hashes, so two nodes writing the same key write the same
+    bytes and the last rename wins harmlessly. Files are fsynced before the
+    rename so other nodes never see a renamed but still empty file.
+    """
+
+    def _sync(self, f):
+        f.flush()
+        os.fsync(f.fileno())
+
+STORAGES = {'local': LocalStorage, 'shared': SharedStorage}
+
+def _key(digest, name):
+    return f'{digest[:2]}/{digest}/{name}'
+
+def _variant_key(digest, variant, fmt):
+    return _key(digest, f'{variant}.{fmt}')
+
+def _open(data):
+    """Decoded, upright image from upload bytes; InvalidImage for anything else"""
+    try:
+        image = Image.open(io.BytesIO(data))
+        if image.format not in ALLOWED_FORMATS:
+            raise InvalidImage(f'Unsupported image format: {image.format}')
+        if image.width * image.height > MAX_PIXELS:
+            raise InvalidImage('Image is too large')
+        image.load()
+    except InvalidImage:
+        raise
+    except (OSError, ValueError, Image.DecompressionBombError):
+        raise InvalidImage('Not a valid image')
+    return ImageOps.exif_transpose(image)
+
+def encode(image, variant, fmt):
+    """Bytes of one variant: scaled down to the variant's width and encoded as WebP or JPEG"""
+    width = VARIANTS[variant]
+    if image.width > width:
+        image = image.resize((width, max(1, round(image.height * width / image.width))), Image.LANCZOS)
+    has_alpha = image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info)
+    buffer = io.BytesIO()
+    if fmt == 'webp':
+        image.convert('RGBA' if has_alpha else 'RGB').save(buffer, 'WEBP', quality=80, method=4)
+    else:
+        if has_alpha:
+            # JPEG has no alpha channel: flatten transparent areas onto white
+            rgba = image.convert('RGBA')
+            image = Image.new('RGB', rgba.size, 'white')
+            image.paste(rgba, mask=rgba.getchannel('A'))
+        image.convert('RGB').save(buffer, 'JPEG', quality=82, optimize=True, progressive=True)
+    return buffer.getvalue()
+
+def render_variants(storage, digest):
+    """Encode every missing variant of a stored original; runs in the worker pool"""
+    missing = [(variant, fmt) for variant in VARIANTS for fmt in FORMATS
+               if not storage.exists(_variant_key(digest, variant, fmt))]
+    if not missing:
+        return
+    image = _open(storage.read(_key(digest, 'original')))
+    for variant, fmt in missing:
+        storage.save(_variant_key(digest, variant, fmt), encode(image, variant, fmt))
+
+class _Pipeline:
+    """Storage backend, worker pool and the renders still in flight, per app"""
+
+    def __init__(self, storage, workers):
+        self.storage = storage
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='images')
+        self.pending = {}
+        self.lock = threading.Lock()
+
+    def submit(self, digest):
+        with self.lock:
+            future = self.pending.get(digest)
+            if future is None:
+                future = self.executor.submit(render_variants, self.storage, digest)
+                self.pending[digest] = future
+                future.add_done_callback(lambda _: self._done(digest))
+            return future
+
+    def _done(self, digest):
+        with self.lock:
+            self.pending.pop(digest, None)
+
+    def wait(self, digest):
+        with self.lock:
+            future = self.pending.get(digest)
+        if future is not None:
+            future.result()
+
+def _pipeline():
+    return current_app.extensions['images']
+
+def store(upload):
+    """Store an uploaded image and queue its variants; returns the content digest.
+
+    The digest is a hash of the file's bytes, so uploading the same picture
+    again reuses the stored original and variants instead of adding a copy.
+    Raises InvalidImage if the upload is not an image.
+    """
+    data = upload.read()
+    _open(data)
+    digest = hashlib.sha256(data).hexdigest()[:32]
+    pipeline = _pipeline()
+    if not pipeline.storage.exists(_key(digest, 'original')):
+        pipeline.storage.save(_key(digest, 'original'), data)
+    if not all(pipeline.storage.exists(_variant_key(digest, variant, fmt)) for variant in VARIANTS for fmt in FORMATS):
+        pipeline.submit(digest)
+    return digest
+
+def variant(digest, name, fmt):
+    """Bytes of a stored variant, or None for an unknown digest.
+
+    A request that arrives before the worker pool has finished waits for it;
+    a variant that is still missing (e.g. the pool was restarted) is rendered
+    on the spot.
+    """
+    storage = _pipeline().storage
+    key = _variant_key(digest, name, fmt)
+    data = storage.read(key)
+    if data is None:
+        _pipeline().wait(digest)
+        data = storage.read(key)
+    if data is None:
+        original = storage.read(_key(digest, 'original'))
+        if original is None:
+            return None
+        data = encode(_open(original), name, fmt)
+        storage.save(key, data)
+    return data
+
+def is_digest(value):
+    return bool(value) and _DIGEST.fullmatch(value) is not None
+
+def url(digest, variant='hero', fmt='jpg'):
+    """Immutable URL of one variant of a stored image"""
+    return url_for('main.media', digest=digest, variant=variant, fmt=fmt)
+
+def srcset(src):
+    """{'webp': srcset, 'jpg': srcset} for an uploaded image URL, None for any other URL"""
+    match = _MEDIA_URL.search(src or '')
+    if not match:
+        return None
+    digest = match.group(1)
+    return {fmt: ', '.join(f'{url(digest, variant, fmt)} {width}w' for variant, width in VARIANTS.items())
+            for fmt in FORMATS}
+
+def avatar_url(user):
+    """URL of a user's avatar: stored images by digest, older uploads from static/uploads/avatars"""
+    if is_digest(user.avatar_filename):
+        return url(user.avatar_filename, 'card')
+    return url_for('static', filename='uploads/avatars/' + user.avatar_filename)
+
+def init_app(app):
+    """Storage backend and worker pool for uploaded images, plus the template helpers"""
+    backend = app.config.get('IMAGE_STORAGE', 'local')
+    if backend not in STORAGES:
+        raise ValueError(f'Unknown IMAGE_STORAGE {backend!r}; expected one of {", ".join(STORAGES)}')
+    root = app.config.get('IMAGE_STORAGE_DIR')
+    if backend == 'shared' and not root:
+        raise ValueError('IMAGE_STORAGE = "shared" needs IMAGE_STORAGE_DIR, the directory every node mounts')
+    root = root or os.path.join(app.instance_path, 'media')
+    app.extensions['images'] = _Pipeline(STORAGES[backend](root), app.config.get('IMAGE_WORKERS', 2))
+    app.add_template_global(srcset, 'image_srcset')
+    app.add_template_global(avatar_url, 'avatar_url')
@@ -0,0 +1,237 @@
+from . import db, airports, rollups, suggestions, connections, cache, versions
+from .models import Flight
+from .utils import validate_flight_number
+from sqlalchemy.exc import SQLAlchemyError
+from datetime import datetime, timezone
+import csv
+import json
+import os
+import re
+
+BATCH_SIZE = 5000
+REQUIRED_FIELDS = ('flight_number', 'origin', 'destination', 'depart_time', 'arrive_time', 'price', 'seats_total')
+FORMATS = {'.csv': 'csv', '.json': 'json', '.jsonl': 'json', '.ndjson': 'json'}
+
+# Whitespace, commas and brackets between the objects of a JSON array or JSON Lines file
+_JSON_SEPARATORS = re.compile(r'[\s,\[\]]*')
+
+class ImportReport:
+    """Outcome of an import: row counts and (row number, message) for each rejected row"""
+
+    def __init__(self, dry_run=False):
+        self.dry_run = dry_run
+        self.rows = 0
+        self.imported = 0
+        self.errors = []
+
+    def reject(self, number, message):
+        self.errors.append((number, message))
+
+def iter_csv(stream):
+    """(line number, row dict) from a CSV file with a header row; column names are case-insensitive"""
+    reader = csv.DictReader(stream)
+    if reader.fieldnames:
+        reader.fieldnames = [name.strip().lower() for name in reader.fieldnames]
+    for row in reader:
+        yield reader.line_num, row
+
+def iter_json(stream, chunk_size=64 * 1024):
+    """(record number, object) from a JSON array or JSON Lines file, decoded chunk by chunk.
+
+    Only the current chunk is held in memory, so large schedules never need
+    the whole document parsed up front.
+    """
+    decoder = json.JSONDecoder()
+    buffer, pos, number, eof = '', 0, 0, False
+    while True:
+        pos = _JSON_SEPARATORS.match(buffer, pos).end()
+        if pos < len(buffer):
+            try:
+                record, pos = decoder.raw_decode(buffer, pos)
+            except ValueError:
+                # Usually an object cut off at the end of the chunk
+                if eof:
+                    raise ValueError(f'Invalid JSON after record {number}')
+            else:
+                number += 1
+                yield number, record
+                continue
+        elif eof:
+            return
+        chunk = stream.read(chunk_size)
+        eof = not chunk
+        buffer, pos = buffer[pos:] + chunk, 0
+
+def iter_records(stream, filename):
+    """Pick the parser for an uploaded or local file by its extension"""
+    fmt = FORMATS.get(os.path.splitext(filename or '')[1].lower())
+    if fmt is None:
+        raise ValueError('Unsupported file type; use .csv, .json, .jsonl or .ndjson')
+    return iter_csv(stream) if fmt == 'csv' else iter_json(stream)
+
+def _parse_time(value):
+    """ISO date-time ('2025-06-01T08:30' or '2025-06-01 08:30') as naive UTC"""
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+def parse_record(record, now):
+    """Validate one schedule row. Returns (column values, list of problems)"""
+    if not isinstance(record, dict):
+        return None, ['Row is not an object']
+
+    def get(field):
+        value = record.get(field)
+        return '' if value is None else str(value).strip()
+
+    problems = [f'{field} is required' for field in REQUIRED_FIELDS if not get(field)]
+    if problems:
+        return None, problems
+
+    values = {
+        'flight_number': get('flight_number').upper(),
+        'origin': get('origin'),
+        'destination': get('destination'),
+        'aircraft_type': get('aircraft_type') or None,
+    }
+    if not validate_flight_number(values['flight_number']):
+        problems.append(f"Invalid flight number '{values['flight_number']}' (expected e.g. AA123)")
+    for field in ('origin', 'destination'):
+        if len(values[field]) > 80:
+            problems.append(f'{field} is longer than 80 characters')
+    if values['origin'].lower() == values['destination'].lower():
+        problems.append('origin and destination are the same')
+    if values['aircraft_type'] and len(values['aircraft_type']) > 50:
+        problems.append('aircraft_type is longer than 50 characters')
+
+    try:
+        values['depart_time'] = _parse_time(get('depart_time'))
+        values['arrive_time'] = _parse_time(get('arrive_time'))
+        if values['depart_time'] <= now:
+            problems.append('depart_time must be in the future')
+        if values['arrive_time'] <= values['depart_time']:
+            problems.append('arrive_time must be after depart_time')
+    except ValueError:
+        problems.append('Invalid date/time format (use YYYY-MM-DDTHH:MM)')
+
+    try:
+        values['price'] = float(get('price'))
+        if values['price'] < 0:
+            problems.append('price must not be negative')
+    except ValueError:
+        problems.append('price must be a number')
+    for field, low, high, default in (('seats_total', 1, 1000, None), ('stops', 0, 5, 0)):
+        try:
+            values[field] = int(get(field) or default)
+            if not low <= values[field] <= high:
+                problems.append(f'{field} must be between {low} and {high}')
+        except (TypeError, ValueError):
+            problems.append(f'{field} must be a whole number')
+    return values, problems
+
+def _airport_ids(labels, airport_ids):
+    """Fill airport_ids ({label: id}) for labels seen for the first time, creating unknown airports"""
+    airport_cache = {}
+    new = {label: airports.get_or_create_airport(label, airport_cache) for label in labels if label not in airport_ids}
+    if new:
+        db.session.flush()
+        airport_ids.update((label, airport.id) for label, airport in new.items())
+
+def insert_flights(company_id, rows, now, airport_ids=None):
+    """Insert flights given as column dicts with one executemany, in the current transaction.
+
+    Fills seats_available and the airport IDs (creating unknown airports),
+    counts the flights in the KPI rollups and queues the version bump and
+    cache invalidation that a Core insert does not trigger. `airport_ids`
+    ({label: id}) can be shared between calls to resolve each label once.
+    The caller commits.
+    """
+    airport_ids = {} if airport_ids is None else airport_ids
+    _airport_ids({row[field] for row in rows for field in ('origin', 'destination')}, airport_ids)
+    db.session.execute(Flight.__table__.insert(), [dict(
+        row,
+        company_id=company_id,
+        seats_available=row['seats_total'],
+        origin_airport_id=airport_ids[row['origin']],
+        destination_airport_id=airport_ids[row['destination']],
+        created_at=now,
+        updated_at=now
+    ) for row in rows])
+    rollups.record_flights_added(company_id, [row['depart_time'] for row in rows])
+    versions.touch('flights')
+    cache.invalidate_after_commit('stats')
+
+def _insert_batch(company, batch, report, now, airport_ids):
+    """Drop rows that already exist, then insert the rest with one executemany and commit"""
+    depart_times = [values['depart_time'] for _, values in batch]
+    existing = set(db.session.query(Flight.flight_number, Flight.depart_time).filter(
+        Flight.company_id == company.id,
+        Flight.depart_time.between(min(depart_times), max(depart_times))
+    ))
+    rows = []
+    for number, values in batch:
+        if (values['flight_number'], values['depart_time']) in existing:
+            report.reject(number, f"Flight {values['flight_number']} at {values['depart_time']:%Y-%m-%d %H:%M} already exists")
+        else:
+            rows.append((number, values))
+    if not rows:
+        return
+    if report.dry_run:
+        report.imported += len(rows)
+        return
+
+    try:
+        insert_flights(company.id, [values for _, values in rows], now, airport_ids)
+        db.session.commit()
+    except SQLAlchemyError as e:
+        db.session.rollback()
+        airport_ids.clear()  # Airports created in this batch were rolled back too
+        for number, _ in rows:
+            report.reject(number, f'Database error: {e.__class__.__name__}')
+        return
+    report.imported += len(rows)
+
+def import_flights(company, records, batch_size=BATCH_SIZE, dry_run=False):
+    """Validate and insert a company's schedule from (row number, record) pairs.
+
+    Rows are checked as they stream in; valid ones are inserted in batches of
+    `batch_size`, one transaction each. Invalid rows, duplicates within the
+    file and flights the company already has (same number and departure) are
+    reported without stopping the import; a file that cannot be parsed further
+    ends it with an error whose row number is None. With dry_run nothing is
+    written.
+    Returns an ImportReport.
+    """
+    report = ImportReport(dry_run)
+    now = datetime.utcnow()
+    seen = set()
+    airport_ids = {}
+    batch = []
+    try:
+        for number, record in records:
+            report.rows += 1
+            values, problems = parse_record(record, now)
+            if problems:
+                report.reject(number, '; '.join(problems))
+                continue
+            key = (values['flight_number'], values['depart_time'])
+            if key in seen:
+                report.reject(number, 'Duplicate of an earlier row')
+                continue
+            seen.add(key)
+            batch.append((number, values))
+            if len(batch) >= batch_size:
+                _insert_batch(company, batch, report, now, airport_ids)
+                batch = []
+    except (ValueError, csv.Error) as e:
+        # A malformed file (bad JSON, encoding) ends the import; rows read so far are kept
+        report.reject(None, str(e))
+    if batch:
+        _insert_batch(company, batch, report, now, airport_ids)
+
+    if report.imported and not dry_run:
+        # Rebuilt once rather than refreshed per flight
+        suggestions.invalidate()
+        connections.invalidate()
+    return report
@@ -0,0 +1,98 @@
+from . import db, seatmaps, cache, versions
+from .models import Flight, Ticket
+from sqlalchemy.orm.attributes import set_committed_value
+
+class NotEnoughSeats(Exception):
+    """Raised when a flight cannot cover the requested number of seats"""
+
+def _adjust_seats(flight_id, flight, statement):
+    """Run a seat UPDATE and keep the loaded Flight (if any), the cache and the API versions in step with the row"""
+    result = db.session.execute(statement.execution_options(synchronize_session=False))
+    if flight is not None and flight in db.session:
+        db.session.expire(flight, ['seats_available'])
+    # Core UPDATEs are invisible to the model events that normally invalidate the cache
+    cache.invalidate_after_commit('flight', flight_id)
+    versions.touch('flights')
+    return result.rowcount
+
+def reserve_seats(flight, count=1):
+    """Take `count` seats from a flight in a single conditional UPDATE.
+
+    The availability check and the decrement happen in the same statement, so
+    two workers can never both take the last seat: the losing UPDATE matches no
+    row and NotEnoughSeats is raised. On PostgreSQL the UPDATE also row-locks the
+    flight until the transaction ends. The caller commits (or rolls back).
+    """
+    if count < 1:
+        raise ValueError('count must be positive')
+    statement = db.update(Flight).where(
+        Flight.id == flight.id,
+        Flight.seats_available >= count
+    ).values(seats_available=Flight.seats_available - count)
+    if not _adjust_seats(flight.id, flight, statement):
+        raise NotEnoughSeats(f'Flight {flight.flight_number} has fewer than {count} seats available')
+
+def release_seats(flight, count=1):
+    """Return `count` seats to a flight, never above its total"""
+    _adjust_seats(flight.id, flight, _release_statement(flight.id, count))
+
+def release_tickets(flight, tickets):
+    """Return the seats held by cancelled tickets of one flight, including their seat map entries"""
+    release_seats(flight, len(tickets))
+    seatmaps.release_seats(flight.id, [ticket.seat_number for ticket in tickets])
+
+def release_seats_by_flight(counts):
+    """Return seats to many flights, given {flight_id: seats}, without loading them.
+
+    Flights already loaded in the session are refreshed when the caller commits.
+    """
+    for flight_id, count in counts.items():
+        _adjust_seats(flight_id, None, _release_statement(flight_id, count))
+
+def _release_statement(flight_id, count):
+    return db.update(Flight).where(Flight.id == flight_id).values(
+        seats_available=db.case(
+            (Flight.seats_available + count > Flight.seats_total, Flight.seats_total),
+            else_=Flight.seats_available + count
+        )
+    )
+
+def book_seats(flight, user_id, passenger_names, status='pending_payment', seat_numbers=None):
+    """Reserve one seat per passenger and add their tickets in the current transaction.
+
+    All seats are taken with one UPDATE, so a multi-seat booking either gets
+    every seat or none. Each ticket is then given its requested seat from
+    `seat_numbers` (or the next free one) on the flight's seat map, which
+    raises seatmaps.SeatUnavailable if a requested seat is taken.
+    Returns the new (unflushed) tickets.
+    """
+    reserve_seats(flight, len(passenger_names))
+    tickets = [
+        Ticket(user_id=user_id, flight_id=flight.id, price=flight.price,
+               passenger_name=name, status=status)
+        for name in passenger_names
+    ]
+    seatmaps.assign_seats(flight, tickets, seat_numbers)
+    db.session.add_all(tickets)
+    return tickets
+
+def change_ticket_status(ticket, expected, status, **values):
+    """Move a ticket from `expected` to `status` in one conditional UPDATE.
+
+    Checking the status in Python and then assigning it would let a
+    concurrent change (the hold sweeper, a second cancel) slip in between;
+    here the losing side matches no row. Returns whether this call made the
+    change. The loaded ticket is kept in step either way; the caller commits.
+    """
+    changed = db.session.execute(
+        db.update(Ticket).where(Ticket.id == ticket.id, Ticket.status == expected)
+        .values(status=status, **values)
+        .execution_options(synchronize_session=False)
+    ).rowcount == 1
+    if changed:
+        for attr, value in dict(values, status=status).items():
+            set_committed_value(ticket, attr, value)
+        db.session.expire(ticket, ['updated_at'])
+    else:
+        db.session.expire(ticket)
+    return changed
@@ -0,0 +1,87 @@
+from .models import Flight, Company
+from flask import current_app
+from collections import namedtuple
+from datetime import datetime
+import json
+
+try:
+    import orjson
+except ImportError:  # Optional: the stdlib encoder is used without it
+    orjson = None
+
+CompanyRef = namedtuple('CompanyRef', 'id name code')
+
+# Columns a flight listing needs, in FlightRow's slot order
+FLIGHT_ROW_COLUMNS = (
+    Flight.id, Flight.flight_number, Flight.origin, Flight.destination,
+    Flight.depart_time, Flight.arrive_time, Flight.price, Flight.seats_total,
+    Flight.seats_available, Flight.stops, Flight.aircraft_type,
+    Company.id, Company.name, Company.code,
+)
+
+class FlightRow:
+    """Read-only flight for listings, built from one projected row.
+
+    Mirrors the Flight attributes the listing templates use, so it can stand in
+    for the ORM object without identity-map or lazy-loading overhead.
+    """
+    __slots__ = ('id', 'flight_number', 'origin', 'destination', 'depart_time', 'arrive_time',
+                 'price', 'seats_total', 'seats_available', 'stops', 'aircraft_type', 'company')
+
+    def __init__(self, row):
+        (self.id, self.flight_number, self.origin, self.destination, self.depart_time,
+         self.arrive_time, self.price, self.seats_total, self.seats_available, self.stops,
+         self.aircraft_type, company_id, company_name, company_code) = row[:len(FLIGHT_ROW_COLUMNS)]
+        self.company = CompanyRef(company_id, company_name, company_code) if company_id is not None else None
+
+    @property
+    def duration(self):
+        """Flight duration in hours and minutes"""
+        hours, minutes = divmod(int((self.arrive_time - self.depart_time).total_seconds()) // 60, 60)
+        return f"{hours}h {minutes}m"
+
+    @property
+    def is_upcoming(self):
+        return self.depart_time > datetime.utcnow()
+
+    def to_dict(self, now):
+        """Same shape as api.serialize_flight; `now` is taken once per listing"""
+        return {
+            'id': self.id,
+            'flight_number': self.flight_number,
+            'company': self.company._asdict() if self.company else None,
+            'origin': self.origin,
+            'destination': self.destination,
+            'depart_time': self.depart_time.isoformat(),
+            'arrive_time': self.arrive_time.isoformat(),
+            'duration': self.duration,
+            'price': self.price,
+            'seats_total': self.seats_total,
+            'seats_available': self.seats_available,
+            'stops': self.stops,
+            'aircraft_type': self.aircraft_type,
+            'is_upcoming': self.depart_time > now
+        }
+
+def project(query):
+    """Turn a Flight query (without LIMIT) into one selecting only FLIGHT_ROW_COLUMNS, joined with its company"""
+    return query.with_entities(*FLIGHT_ROW_COLUMNS).outerjoin(Company, Company.id == Flight.company_id)
+
+def flight_rows(query, limit=None):
+    """Run a filtered and ordered Flight query as FlightRows in one statement"""
+    query = project(query)
+    if limit is not None:
+        query = query.limit(limit)
+    return [FlightRow(row) for row in query]
+
+def json_response(payload, status=200):
+    """JSON response encoded with orjson when installed, else compact stdlib json.
+
+    Unlike jsonify it neither sorts keys nor pretty-prints, which is where most
+    of the encoding time goes for large listings.
+    """
+    if orjson is not None:
+        body = orjson.dumps(payload)
+    else:
+        body = json.dumps(payload, separators=(',', ':'), ensure_ascii=False)
+    return current_app.response_class(body, status=status, mimetype='application/json')
@@ -0,0 +1,218 @@
+from . import db
+from .models import Ticket, User
+from xml.sax.saxutils import escape
+import csv
+import io
+import json
+import zipfile
+
+# (key, header) of each manifest column, in file order
+COLUMNS = [
+    ('confirmation_id', 'Confirmation ID'),
+    ('passenger_name', 'Passenger Name'),
+    ('email', 'Email'),
+    ('seat_number', 'Seat'),
+    ('price', 'Ticket Price'),
+    ('status', 'Status'),
+    ('booked_at', 'Booking Date'),
+]
+FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'json': 'application/json',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+YIELD_PER = 1000  # Rows fetched from the cursor at a time
+FLUSH_ROWS = 500  # Rows encoded per chunk sent to the client
+
+def _paid(flight_id):
+    return (Ticket.flight_id == flight_id, Ticket.status == 'paid')
+
+def _passenger_name():
+    return db.func.coalesce(Ticket.passenger_name, User.name)
+
+def _seat_order():
+    # '9A' before '12A': shorter seat labels have lower row numbers; unassigned seats last
+    return (Ticket.seat_number.is_(None), db.func.length(Ticket.seat_number), Ticket.seat_number, Ticket.id)
+
+# sort -> order_by factory for the passenger list
+PASSENGER_SORTS = {
+    'seat': _seat_order,
+    'name': lambda: (db.func.lower(_passenger_name()), Ticket.id),
+}
+
+def passengers(flight_id, sort='seat', page=1, per_page=50):
+    """One page of a flight's paid tickets with their passenger's name and email.
+
+    A single join instead of loading flight.tickets and then each ticket's
+    user; items are (ticket, passenger_name, email) rows. Returns a
+    Flask-SQLAlchemy Pagination, so the total costs one extra COUNT.
+    """
+    query = db.session.query(Ticket, _passenger_name().label('passenger_name'), User.email) \
+        .join(User, Ticket.user_id == User.id).filter(*_paid(flight_id)) \
+        .order_by(*PASSENGER_SORTS[sort]())
+    return query.paginate(page=page, per_page=per_page, error_out=False)
+
+def rows(flight_id):
+    """Paid tickets of a flight joined with their buyers, streamed from one query.
+
+    yield_per keeps only YIELD_PER rows in memory; on PostgreSQL it also
+    switches to a server-side cursor. Each row is a tuple in COLUMNS order.
+    """
+    query = db.session.query(
+        Ticket.confirmation_id,
+        _passenger_name(),
+        User.email,
+        Ticket.seat_number,
+        Ticket.price,
+        Ticket.status,
+        Ticket.created_at
+    ).join(User, Ticket.user_id == User.id).filter(*_paid(flight_id)) \
+        .order_by(*_seat_order()).execution_options(yield_per=YIELD_PER)
+    for row in query:
+        yield tuple(row)
+
+def summary(flight_id):
+    """(passengers, revenue) of a flight's paid tickets in one aggregate query"""
+    count, revenue = db.session.query(
+        db.func.count(Ticket.id), db.func.coalesce(db.func.sum(Ticket.price), 0.0)
+    ).filter(*_paid(flight_id)).one()
+    return count, float(revenue)
+
+def _cell_text(value):
+    if value is None:
+        return ''
+    if hasattr(value, 'strftime'):
+        return value.strftime('%Y-%m-%d %H:%M')
+    return value
+
+# Spreadsheets run a CSV cell starting with one of these as a formula
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+def _csv_cell(value):
+    """Cell text for CSV; user-supplied text that looks like a formula is quoted with a leading '"""
+    value = _cell_text(value)
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+def csv_chunks(records):
+    """CSV with a header row; the BOM makes Excel read the Cyrillic names as UTF-8"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    buffer.write('\ufeff')
+    writer.writerow([header for _, header in COLUMNS])
+    for number, record in enumerate(records, 1):
+        writer.writerow([_csv_cell(value) for value in record])
+        if number % FLUSH_ROWS == 0:
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode()
+
+def json_chunks(records):
+    """JSON array of objects keyed like COLUMNS, written row by row"""
+    keys = [key for key, _ in COLUMNS]
+    parts = ['[']
+    for number, record in enumerate(records):
+        item = {key: value.isoformat() if hasattr(value, 'isoformat') else value for key, value in zip(keys, record)}
+        parts.append((',' if number else '') + json.dumps(item, ensure_ascii=False, separators=(',', ':')))
+        if len(parts) >= FLUSH_ROWS:
+            yield ''.join(parts).encode()
+            parts = []
+    parts.append(']')
+    yield ''.join(parts).encode()
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only, non-seekable file that collects what zipfile writes until it is drained"""
+
+    def __init__(self):
+        self.chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+_XLSX_PARTS = {
+    '[Content_Types].xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '</Types>'
+    ),
+    '_rels/.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+        'Target="xl/workbook.xml"/>'
+        '</Relationships>'
+    ),
+    'xl/workbook.xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        '<sheets><sheet name="Passengers" sheetId="1" r:id="rId1"/></sheets>'
+        '</workbook>'
+    ),
+    'xl/_rels/workbook.xml.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+        'Target="worksheets/sheet1.xml"/>'
+        '</Relationships>'
+    ),
+}
+
+def _xlsx_row(values):
+    cells = []
+    for value in values:
+        value = _cell_text(value)
+        if isinstance(value, (int, float)):
+            cells.append(f'<c><v>{value}</v></c>')
+        elif value != '':
+            cells.append(f'<c t="inlineStr"><is><t>{escape(str(value))}</t></is></c>')
+        else:
+            cells.append('<c/>')
+    return f'<row>{"".join(cells)}</row>'
+
+def xlsx_chunks(records):
+    """Minimal single-sheet XLSX written straight into a streamed zip.
+
+    Cells are inline strings and numbers, so there is no shared-strings
+    table to keep in memory. zipfile writes entries with data descriptors
+    to a non-seekable sink, so nothing is buffered beyond FLUSH_ROWS rows.
+    """
+    sink = _ChunkSink()
+    with zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for name, content in _XLSX_PARTS.items():
+            archive.writestr(name, content)
+        with archive.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True) as sheet:
+            sheet.write(b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                        b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>')
+            sheet.write(_xlsx_row([header for _, header in COLUMNS]).encode())
+            for number, record in enumerate(records, 1):
+                sheet.write(_xlsx_row(record).encode())
+                if number % FLUSH_ROWS == 0:
+                    yield sink.drain()
+            sheet.write(b'</sheetData></worksheet>')
+    yield sink.drain()
+
+WRITERS = {'csv': csv_chunks, 'json': json_chunks, 'xlsx': xlsx_chunks}
+
+def export(flight_id, fmt):
+    """Generator of file chunks for a flight's manifest in `fmt` (csv, json or xlsx)"""
+    return WRITERS[fmt](rows(flight_id))
@@ -1,4 +1,4 @@
-from . import db, login_manager
+from . import db
 from flask_login import UserMixin
 from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime, timedelta
@@ -42,16 +42,13 @@ class User(db.Model, UserMixin):
     def is_regular_user(self):
         return self.role == 'user'
 
-@login_manager.user_loader
-def load_user(user_id):
-    return User.query.get(int(user_id))
-
 class Company(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(140), nullable=False)
     code = db.Column(db.String(10), unique=True, nullable=False)  # Airline code like "AA", "UA"
     manager_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
     is_active = db.Column(db.Boolean, default=True)
+    hold_ttl_hours = db.Column(db.Integer, nullable=True)  # Unpaid booking lifetime; None = HOLD_TTL_HOURS
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     # Relationships
@@ -59,54 +56,44 @@ class Company(db.Model):
 
     def get_statistics(self, time_filter='all'):
         """Get company statistics with time filtering"""
-        from datetime import datetime, timedelta
-        
-        base_query = Flight.query.filter_by(company_id=self.id)
-        now = datetime.utcnow()
-        
-        # Apply time filter to departure time
-        if time_filter == 'today':
-            today = now.date()
-            query = base_query.filter(db.func.date(Flight.depart_time) == today)
-        elif time_filter == 'week':
-            week_ago = now - timedelta(days=7)
-            query = base_query.filter(Flight.depart_time >= week_ago)
-        elif time_filter == 'month':
-            month_ago = now - timedelta(days=30)
-            query = base_query.filter(Flight.depart_time >= month_ago)
-        else:  # 'all' time
-            query = base_query
-        
-        flights = query.all()
-        
-        # Calculate statistics
-        total_flights = len(flights)
-        active_flights = len([f for f in flights if f.depart_time > now])
-        completed_flights = len([f for f in flights if f.depart_time <= now])
-        
-        # Count passengers and revenue (only paid tickets)
-        total_passengers = 0
-        total_revenue = 0.0
-        
-        for flight in flights:
-            paid_tickets = [t for t in flight.tickets if t.status == 'paid']
-            total_passengers += len(paid_tickets)
-            total_revenue += sum(t.price for t in paid_tickets)
-        
-        return {
-            'total_flights': total_flights,
-            'active_flights': active_flights,
-            'completed_flights': completed_flights,
-            'total_passengers': total_passengers,
-            'total_revenue': total_revenue
-        }
+        return get_flight_statistics(time_filter, company_id=self.id)
+
+class Airport(db.Model):
+    """Airport dimension so searches can use indexed equality lookups"""
+    id = db.Column(db.Integer, primary_key=True)
+    code = db.Column(db.String(3), unique=True, nullable=True)  # IATA code like "JFK"
+    city = db.Column(db.String(80), nullable=False)
+    name = db.Column(db.String(140))
+    country = db.Column(db.String(80))
+    aliases = db.Column(db.Text)  # Comma-separated alternative spellings/labels
+    
+    @property
+    def label(self):
+        """Display label in the 'City (CODE)' format used by flights"""
+        return f"{self.city} ({self.code})" if self.code else self.city
 
 class Flight(db.Model):
+    # Indexes follow the search paths: upcoming flights by departure time,
+    # optionally narrowed by route or airline, ordered by time or price
+    __table_args__ = (
+        db.Index('ix_flight_depart_time', 'depart_time'),
+        db.Index('ix_flight_origin_depart', 'origin', 'depart_time'),
+        db.Index('ix_flight_destination_depart', 'destination', 'depart_time'),
+        db.Index('ix_flight_company_depart', 'company_id', 'depart_time'),
+        db.Index('ix_flight_price', 'price'),
+        db.Index('ix_flight_origin_airport_depart', 'origin_airport_id', 'depart_time'),
+        db.Index('ix_flight_destination_airport_depart', 'destination_airport_id', 'depart_time'),
+        db.Index('ix_flight_schedule_depart', 'schedule_id', 'depart_time'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     flight_number = db.Column(db.String(20), nullable=False)
     company_id = db.Column(db.Integer, db.ForeignKey('company.id'), nullable=False)
     origin = db.Column(db.String(80), nullable=False)
     destination = db.Column(db.String(80), nullable=False)
+    origin_airport_id = db.Column(db.Integer, db.ForeignKey('airport.id'), nullable=True)
+    destination_airport_id = db.Column(db.Integer, db.ForeignKey('airport.id'), nullable=True)
+    schedule_id = db.Column(db.Integer, db.ForeignKey('flight_schedule.id'), nullable=True)  # Set on materialized instances
     depart_time = db.Column(db.DateTime, nullable=False)
     arrive_time = db.Column(db.DateTime, nullable=False)
     price = db.Column(db.Float, nullable=False)
@@ -114,10 +101,15 @@ class Flight(db.Model):
     seats_available = db.Column(db.Integer, default=100)
     stops = db.Column(db.Integer, default=0)  # Number of stops/layovers
     aircraft_type = db.Column(db.String(50))
+    seat_map = db.deferred(db.Column(db.LargeBinary))  # Taken-seat bitmap, see seatmaps.SeatMap
+    seat_map_version = db.Column(db.Integer, default=0, nullable=False, server_default='0')
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)  # Row version for ETags
     
     # Relationships
     tickets = db.relationship('Ticket', backref='flight', lazy=True)
+    origin_airport = db.relationship('Airport', foreign_keys=[origin_airport_id])
+    destination_airport = db.relationship('Airport', foreign_keys=[destination_airport_id])
 
     @property
     def duration(self):
@@ -143,20 +135,59 @@ class Flight(db.Model):
         return self.depart_time > datetime.utcnow()
     
     def get_passengers(self):
-        """Get list of passengers with paid tickets"""
-        return [t.user for t in self.tickets if t.status == 'paid']
+        """Get list of passengers with paid tickets (one query; see manifest.passengers for pages)"""
+        tickets = Ticket.query.options(db.joinedload(Ticket.user)) \
+            .filter_by(flight_id=self.id, status='paid').order_by(Ticket.id)
+        return [t.user for t in tickets]
+
+class FlightSchedule(db.Model):
+    """Recurring flight; schedules.materialize() turns it into Flight rows for a rolling horizon"""
+    __tablename__ = 'flight_schedule'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    company_id = db.Column(db.Integer, db.ForeignKey('company.id'), nullable=False, index=True)
+    flight_number = db.Column(db.String(20), nullable=False)
+    origin = db.Column(db.String(80), nullable=False)
+    destination = db.Column(db.String(80), nullable=False)
+    days_of_week = db.Column(db.String(7), nullable=False, default='1234567')  # ISO weekdays, Monday = 1
+    depart_local = db.Column(db.Time, nullable=False)
+    arrive_local = db.Column(db.Time, nullable=False)
+    arrive_day_offset = db.Column(db.Integer, default=0, nullable=False)  # 1 = arrives the next day
+    depart_timezone = db.Column(db.String(64), default='UTC', nullable=False)  # IANA zone, e.g. Asia/Bishkek
+    arrive_timezone = db.Column(db.String(64), default='UTC', nullable=False)
+    valid_from = db.Column(db.Date, nullable=False)
+    valid_to = db.Column(db.Date, nullable=True)  # None = until further notice
+    price = db.Column(db.Float, nullable=False)
+    seats_total = db.Column(db.Integer, default=100, nullable=False)
+    stops = db.Column(db.Integer, default=0, nullable=False)
+    aircraft_type = db.Column(db.String(50))
+    is_active = db.Column(db.Boolean, default=True)
+    materialized_until = db.Column(db.Date, nullable=True)  # Last day Flight rows were generated for
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    # Relationships
+    company = db.relationship('Company', backref='schedules')
+    flights = db.relationship('Flight', backref='schedule', lazy='dynamic')
 
 class Ticket(db.Model):
+    __table_args__ = (
+        db.Index('ix_ticket_user_created', 'user_id', 'created_at'),
+        db.Index('ix_ticket_flight_status', 'flight_id', 'status'),
+        db.Index('ix_ticket_status_created', 'status', 'created_at'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     flight_id = db.Column(db.Integer, db.ForeignKey('flight.id'), nullable=False)
-    status = db.Column(db.String(30), default='pending_payment')  # pending_payment, paid, refunded, canceled
+    status = db.Column(db.String(30), default='pending_payment')  # pending_payment, paid, refunded, canceled, expired
     confirmation_id = db.Column(db.String(50), unique=True, default=lambda: str(uuid.uuid4())[:8].upper())
     price = db.Column(db.Float, nullable=False)
     passenger_name = db.Column(db.String(120))  # Can be different from user name
     seat_number = db.Column(db.String(10))
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     canceled_at = db.Column(db.DateTime)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)  # Row version for ETags
     
     # Relationships
     user = db.relationship('User', backref='tickets')
@@ -176,6 +207,26 @@ class Ticket(db.Model):
             return self.price
         return 0
 
+class KpiRollup(db.Model):
+    """Hourly pre-aggregated KPIs per company, bucketed by flight departure hour"""
+    __tablename__ = 'kpi_rollup'
+    __table_args__ = (db.UniqueConstraint('company_id', 'bucket', name='uq_kpi_rollup_company_bucket'),)
+    
+    id = db.Column(db.Integer, primary_key=True)
+    company_id = db.Column(db.Integer, db.ForeignKey('company.id'), nullable=False)
+    bucket = db.Column(db.DateTime, nullable=False, index=True)  # Departure hour (truncated)
+    flights = db.Column(db.Integer, default=0, nullable=False)
+    paid_tickets = db.Column(db.Integer, default=0, nullable=False)
+    revenue = db.Column(db.Float, default=0.0, nullable=False)
+
+class CollectionVersion(db.Model):
+    """Change counter per API collection ('flights', ...), bumped right after the writing transaction commits"""
+    __tablename__ = 'collection_version'
+    
+    name = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.Integer, default=0, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
 class Banner(db.Model):
     """Landing page banners for promotions"""
     id = db.Column(db.Integer, primary_key=True)
@@ -198,3 +249,71 @@ class Offer(db.Model):
     is_active = db.Column(db.Boolean, default=True)
     promo_code = db.Column(db.String(50), unique=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+def time_filter_range(time_filter, now=None):
+    """Return the (start, end) departure window for the 'today'/'week'/'month'/'all' filters"""
+    now = now or datetime.utcnow()
+    
+    if time_filter == 'today':
+        start = now.replace(hour=0, minute=0, second=0, microsecond=0)
+        return start, start + timedelta(days=1)
+    elif time_filter == 'week':
+        return now - timedelta(days=7), None
+    elif time_filter == 'month':
+        return now - timedelta(days=30), None
+    return None, None  # 'all' time
+
+def time_filter_clauses(time_filter, now=None):
+    """Build departure-time filter clauses for the 'today'/'week'/'month'/'all' filters"""
+    # Ranges instead of date(depart_time) so an index on depart_time can be used
+    start, end = time_filter_range(time_filter, now)
+    clauses = []
+    if start is not None:
+        clauses.append(Flight.depart_time >= start)
+    if end is not None:
+        clauses.append(Flight.depart_time < end)
+    return clauses
+
+def filter_flights(query, min_price=None, max_price=None, airline_id=None, max_stops=None):
+    """Apply the shared price/airline/stops filters of the flight listings"""
+    if min_price is not None:
+        query = query.filter(Flight.price >= min_price)
+    if max_price is not None:
+        query = query.filter(Flight.price <= max_price)
+    if airline_id:
+        query = query.filter(Flight.company_id == airline_id)
+    if max_stops is not None:
+        query = query.filter(Flight.stops <= max_stops)
+    return query
+
+def get_flight_statistics(time_filter='all', company_id=None):
+    """Aggregate flight, passenger and revenue statistics in SQL.
+    
+    Uses one aggregate query over flights and one over paid tickets instead of
+    loading every flight and walking its tickets in Python.
+    """
+    now = datetime.utcnow()
+    filters = time_filter_clauses(time_filter, now)
+    if company_id is not None:
+        filters.append(Flight.company_id == company_id)
+    
+    total_flights, active_flights = db.session.query(
+        db.func.count(Flight.id),
+        db.func.coalesce(db.func.sum(db.case((Flight.depart_time > now, 1), else_=0)), 0)
+    ).filter(*filters).one()
+    
+    total_passengers, total_revenue = db.session.query(
+        db.func.count(Ticket.id),
+        db.func.coalesce(db.func.sum(Ticket.price), 0.0)
+    ).join(Flight, Ticket.flight_id == Flight.id).filter(
+        Ticket.status == 'paid', *filters
+    ).one()
+    
+    return {
+        'total_flights': total_flights,
+        'active_flights': int(active_flights),
+        'completed_flights': total_flights - int(active_flights),
+        'total_passengers': total_passengers,
+        'total_revenue': float(total_revenue)
+    }
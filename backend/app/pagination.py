@@ -0,0 +1,131 @@
+from . import db
+from .models import Flight
+from sqlalchemy import and_, or_
+from datetime import datetime
+from decimal import Decimal
+import base64
+import json
+import threading
+import time
+
+class InvalidCursor(ValueError):
+    """Raised when a pagination cursor cannot be decoded or does not match the sort"""
+
+def flight_duration_expr():
+    """SQL expression for flight duration that orders correctly on SQLite and PostgreSQL"""
+    if db.engine.dialect.name == 'postgresql':
+        return db.func.extract('epoch', Flight.arrive_time - Flight.depart_time)
+    # SQLite stores datetimes as text, so subtracting them directly compares years only.
+    # Rounded to whole seconds so equal durations compare equal despite julianday float error.
+    return db.func.round((db.func.julianday(Flight.arrive_time) - db.func.julianday(Flight.depart_time)) * 86400)
+
+# sort_by -> (sort key expression factory, descending, key is a datetime)
+FLIGHT_SORTS = {
+    'price_asc': (lambda: Flight.price, False, False),
+    'price_desc': (lambda: Flight.price, True, False),
+    'depart_time': (lambda: Flight.depart_time, False, True),
+    'duration': (flight_duration_expr, False, False),
+}
+
+def order_flights(query, sort_by):
+    """Order a flight query by one of FLIGHT_SORTS with an id tiebreaker"""
+    key_factory, descending, _ = FLIGHT_SORTS[sort_by]
+    key = key_factory()
+    if descending:
+        return query.order_by(key.desc(), Flight.id.desc())
+    return query.order_by(key.asc(), Flight.id.asc())
+
+def encode_cursor(sort_by, value, row_id):
+    """Opaque cursor pointing just after the given row"""
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    elif isinstance(value, Decimal):
+        value = float(value)
+    payload = json.dumps({'s': sort_by, 'v': value, 'id': row_id}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+def decode_cursor(cursor, sort_by):
+    """Return (value, id) from a cursor produced for the same sort"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if payload['s'] != sort_by:
+            raise InvalidCursor('Cursor does not match sort_by')
+        value = payload['v']
+        if FLIGHT_SORTS[sort_by][2]:
+            value = datetime.fromisoformat(value)
+        return value, int(payload['id'])
+    except InvalidCursor:
+        raise
+    except (ValueError, KeyError, TypeError):
+        raise InvalidCursor('Invalid cursor')
+
+def keyset_page(query, sort_by, cursor=None, limit=50, row_factory=None):
+    """Fetch one page of flights ordered by sort_by with an id tiebreaker.
+
+    Instead of OFFSET the page starts right after the cursor row, so every page
+    is a bounded index range scan. Returns (flights, next_cursor or None).
+    With `row_factory` the query selects plain columns (see listings.project)
+    and each row is built with it instead of being a Flight.
+    """
+    if limit < 1:
+        raise ValueError('limit must be at least 1')
+    key_factory, descending, _ = FLIGHT_SORTS[sort_by]
+    key = key_factory()
+
+    if cursor:
+        value, last_id = decode_cursor(cursor, sort_by)
+        if descending:
+            query = query.filter(or_(key < value, and_(key == value, Flight.id < last_id)))
+        else:
+            query = query.filter(or_(key > value, and_(key == value, Flight.id > last_id)))
+
+    query = order_flights(query, sort_by)
+
+    # One extra row tells whether there is a next page
+    rows = query.add_columns(key, Flight.id).limit(limit + 1).all()
+    if row_factory is None:
+        flights = [row[0] for row in rows[:limit]]
+    else:
+        flights = [row_factory(row) for row in rows[:limit]]
+
+    next_cursor = None
+    if len(rows) > limit:
+        last_key, last_id = rows[limit - 1][-2:]
+        next_cursor = encode_cursor(sort_by, last_key, last_id)
+    return flights, next_cursor
+
+_count_cache = {}
+_count_lock = threading.Lock()
+COUNT_CACHE_SIZE = 1024
+
+def _planner_estimate(query):
+    """Row estimate from the PostgreSQL planner without executing the query"""
+    statement = query.order_by(None).statement
+    compiled = statement.compile(dialect=db.engine.dialect, compile_kwargs={'render_postcompile': True})
+    with db.engine.connect() as conn:
+        plan = conn.exec_driver_sql('EXPLAIN (FORMAT JSON) ' + str(compiled), compiled.params).scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+def approximate_count(query, cache_key, ttl=60):
+    """Approximate row count: planner statistics on PostgreSQL, else a cached exact count.
+
+    Counts are cached per filter signature for `ttl` seconds so that paging
+    through a result set does not re-count it on every request.
+    """
+    if db.engine.dialect.name == 'postgresql':
+        return _planner_estimate(query)
+
+    now = time.monotonic()
+    cached = _count_cache.get(cache_key)
+    if cached and cached[1] > now:
+        return cached[0]
+
+    count = query.order_by(None).count()
+    with _count_lock:
+        if len(_count_cache) >= COUNT_CACHE_SIZE:
+            _count_cache.clear()
+        _count_cache[cache_key] = (count, now + ttl)
+    return count
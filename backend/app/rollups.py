@@ -0,0 +1,195 @@
+from . import db
+from .models import User, Company, Flight, Ticket, KpiRollup, time_filter_range
+from .utils import upsert
+from collections import Counter
+from datetime import datetime, timedelta
+
+def hour_bucket(dt):
+    """Truncate a datetime to the start of its hour"""
+    return dt.replace(minute=0, second=0, microsecond=0)
+
+def _bump(company_id, bucket, flights=0, paid_tickets=0, revenue=0.0):
+    """Add deltas to a rollup row, creating it if it does not exist yet.
+
+    Runs inside the caller's transaction so the rollup commits (or rolls back)
+    together with the ticket/flight change that caused it.
+    """
+    if not (flights or paid_tickets or revenue):
+        return
+
+    _upsert([{'company_id': company_id, 'bucket': bucket, 'flights': flights,
+              'paid_tickets': paid_tickets, 'revenue': revenue}])
+
+def _upsert(rows):
+    """Add rollup rows to the existing ones for their bucket (see utils.upsert).
+
+    Concurrent first writers to the same bucket cannot both INSERT and trip
+    uq_kpi_rollup_company_bucket.
+    """
+    upsert(db.session, KpiRollup.__table__, ['company_id', 'bucket'], rows,
+           add=['flights', 'paid_tickets', 'revenue'])
+
+def record_ticket_status_change(ticket, old_status):
+    """Update rollups after a ticket moved from old_status to ticket.status"""
+    was_paid = old_status == 'paid'
+    is_paid = ticket.status == 'paid'
+    if was_paid == is_paid:
+        return
+
+    sign = 1 if is_paid else -1
+    flight = ticket.flight
+    _bump(flight.company_id, hour_bucket(flight.depart_time),
+          paid_tickets=sign, revenue=sign * ticket.price)
+
+def _paid_totals(flight):
+    """Paid ticket count and revenue for a single flight"""
+    count, revenue = db.session.query(
+        db.func.count(Ticket.id),
+        db.func.coalesce(db.func.sum(Ticket.price), 0.0)
+    ).filter(Ticket.flight_id == flight.id, Ticket.status == 'paid').one()
+    return count, float(revenue)
+
+def record_flight_added(flight):
+    """Count a newly created flight"""
+    _bump(flight.company_id, hour_bucket(flight.depart_time), flights=1)
+
+def record_flights_added(company_id, depart_times):
+    """Count many new flights of one company, e.g. a bulk schedule import.
+
+    All hour buckets go to the database in one executemany upsert instead
+    of a statement pair per bucket.
+    """
+    _bump_flights(company_id, depart_times, 1)
+
+def record_flights_removed(company_id, depart_times):
+    """Uncount many deleted flights of one company that had no paid tickets"""
+    _bump_flights(company_id, depart_times, -1)
+
+def _bump_flights(company_id, depart_times, sign):
+    counts = Counter(hour_bucket(depart_time) for depart_time in depart_times)
+    if not counts:
+        return
+    _upsert([
+        {'company_id': company_id, 'bucket': bucket, 'flights': sign * count, 'paid_tickets': 0, 'revenue': 0.0}
+        for bucket, count in counts.items()
+    ])
+
+def record_flight_removed(flight):
+    """Remove a deleted flight (and any paid tickets it still had) from the rollups"""
+    paid_tickets, revenue = _paid_totals(flight)
+    _bump(flight.company_id, hour_bucket(flight.depart_time),
+          flights=-1, paid_tickets=-paid_tickets, revenue=-revenue)
+
+def record_flight_moved(flight, old_depart_time):
+    """Move a flight's counters to a new bucket after its departure time changed"""
+    old_bucket = hour_bucket(old_depart_time)
+    new_bucket = hour_bucket(flight.depart_time)
+    if old_bucket == new_bucket:
+        return
+
+    paid_tickets, revenue = _paid_totals(flight)
+    _bump(flight.company_id, old_bucket, flights=-1, paid_tickets=-paid_tickets, revenue=-revenue)
+    _bump(flight.company_id, new_bucket, flights=1, paid_tickets=paid_tickets, revenue=revenue)
+
+def _hour_bucket_expr(column):
+    """SQL expression truncating a datetime column to the hour"""
+    if db.engine.dialect.name == 'postgresql':
+        return db.func.date_trunc('hour', column)
+    return db.func.strftime('%Y-%m-%d %H:00:00', column)
+
+def _as_datetime(value):
+    if isinstance(value, str):
+        return datetime.strptime(value, '%Y-%m-%d %H:%M:%S')
+    return value
+
+def rebuild_rollups():
+    """Recompute all rollup rows from the flight and ticket tables.
+
+    Returns the number of rollup rows written.
+    """
+    buckets = {}
+
+    flight_bucket = _hour_bucket_expr(Flight.depart_time)
+    flight_rows = db.session.query(
+        Flight.company_id, flight_bucket, db.func.count(Flight.id)
+    ).group_by(Flight.company_id, flight_bucket).all()
+    for company_id, bucket, count in flight_rows:
+        row = buckets.setdefault((company_id, _as_datetime(bucket)), [0, 0, 0.0])
+        row[0] += count
+
+    ticket_rows = db.session.query(
+        Flight.company_id, flight_bucket,
+        db.func.count(Ticket.id), db.func.coalesce(db.func.sum(Ticket.price), 0.0)
+    ).join(Flight, Ticket.flight_id == Flight.id).filter(
+        Ticket.status == 'paid'
+    ).group_by(Flight.company_id, flight_bucket).all()
+    for company_id, bucket, count, revenue in ticket_rows:
+        row = buckets.setdefault((company_id, _as_datetime(bucket)), [0, 0, 0.0])
+        row[1] += count
+        row[2] += float(revenue)
+
+    db.session.execute(db.delete(KpiRollup))
+    if buckets:
+        db.session.execute(db.insert(KpiRollup), [
+            {'company_id': company_id, 'bucket': bucket, 'flights': flights,
+             'paid_tickets': paid_tickets, 'revenue': revenue}
+            for (company_id, bucket), (flights, paid_tickets, revenue) in buckets.items()
+        ])
+    db.session.commit()
+    return len(buckets)
+
+def ensure_rollups():
+    """Build the rollups on first use if flights exist but nothing was rolled up yet"""
+    if KpiRollup.query.first() is None and Flight.query.first() is not None:
+        rebuild_rollups()
+
+def get_admin_statistics(time_filter='all'):
+    """Admin dashboard KPIs read from the rollup table.
+
+    Windows are aligned to whole departure hours. Only the current hour is
+    split into active/completed flights with a direct (indexed) flight count.
+    """
+    ensure_rollups()
+
+    now = datetime.utcnow()
+    current_hour = hour_bucket(now)
+    start, end = time_filter_range(time_filter, now)
+
+    window = []
+    if start is not None:
+        window.append(KpiRollup.bucket >= hour_bucket(start))
+    if end is not None:
+        window.append(KpiRollup.bucket < end)
+
+    total_flights, future_flights, total_passengers, total_revenue = db.session.query(
+        db.func.coalesce(db.func.sum(KpiRollup.flights), 0),
+        db.func.coalesce(db.func.sum(db.case((KpiRollup.bucket > current_hour, KpiRollup.flights), else_=0)), 0),
+        db.func.coalesce(db.func.sum(KpiRollup.paid_tickets), 0),
+        db.func.coalesce(db.func.sum(KpiRollup.revenue), 0.0)
+    ).filter(*window).one()
+
+    # Flights of the current hour that have not departed yet
+    current_hour_active = Flight.query.filter(
+        Flight.depart_time > now,
+        Flight.depart_time < current_hour + timedelta(hours=1)
+    ).count()
+    active_flights = int(future_flights) + current_hour_active
+
+    all_time_flights, all_time_revenue = db.session.query(
+        db.func.coalesce(db.func.sum(KpiRollup.flights), 0),
+        db.func.coalesce(db.func.sum(KpiRollup.revenue), 0.0)
+    ).one()
+
+    return {
+        'total_flights': int(total_flights),
+        'active_flights': active_flights,
+        'completed_flights': int(total_flights) - active_flights,
+        'total_passengers': int(total_passengers),
+        'total_revenue': float(total_revenue),
+        'total_users': User.query.count(),
+        'active_users': User.query.filter_by(is_active=True).count(),
+        'total_companies': Company.query.count(),
+        'active_companies': Company.query.filter_by(is_active=True).count(),
+        'all_time_flights': int(all_time_flights),
+        'all_time_revenue': float(all_time_revenue)
+    }
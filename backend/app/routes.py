@@ -1,19 +1,20 @@
-from flask import Blueprint, render_template, redirect, url_for, request, flash, jsonify, make_response, current_app
+from flask import Blueprint, render_template, redirect, url_for, request, flash, make_response, current_app, abort, stream_with_context, send_from_directory
 from . import db
-from .models import User, Company, Flight, Ticket, Banner, Offer
+from .models import User, Company, Flight, FlightSchedule, Ticket, Banner, Offer, filter_flights
+from . import rollups, airports, suggestions, connections, inventory, holds, seatmaps, cache, listings, importer, schedules, boarding, manifest, images, assets
+from .pagination import FLIGHT_SORTS, order_flights
+from .utils import paginate_query
 from .forms import (LoginForm, RegisterForm, FlightForm, FlightSearchForm, 
                    FlightFilterForm, TicketPurchaseForm, CompanyForm, 
                    UserManagementForm, BannerForm, OfferForm, ConfirmationSearchForm,
-                   ProfileForm, ChangePasswordForm)
+                   ProfileForm, ChangePasswordForm, FlightImportForm, FlightScheduleForm)
 from flask_login import login_user, logout_user, login_required, current_user
 from datetime import datetime, timedelta
-from sqlalchemy import and_, or_
-from werkzeug.utils import secure_filename
+from sqlalchemy.orm import joinedload
+from werkzeug.security import safe_join
 import io
-import base64
-import qrcode
+import mimetypes
 import os
-import uuid
 
 # Helper function for file uploads
 def allowed_file(filename):
@@ -23,23 +24,12 @@ def allowed_file(filename):
            filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
 def save_uploaded_file(file):
-    """Save uploaded file and return URL"""
+    """Store an uploaded image and return the URL of its full-width variant"""
     if file and allowed_file(file.filename):
-        # Generate unique filename
-        filename = secure_filename(file.filename)
-        name, ext = os.path.splitext(filename)
-        unique_filename = f"{name}_{uuid.uuid4().hex[:8]}{ext}"
-        
-        # Create uploads directory if it doesn't exist
-        upload_dir = os.path.join(current_app.static_folder, 'uploads')
-        os.makedirs(upload_dir, exist_ok=True)
-        
-        # Save file
-        file_path = os.path.join(upload_dir, unique_filename)
-        file.save(file_path)
-        
-        # Return URL path
-        return f"/static/uploads/{unique_filename}"
+        try:
+            return images.url(images.store(file))
+        except images.InvalidImage:
+            return None
     return None
 
 bp = Blueprint('main', __name__)
@@ -50,32 +40,42 @@ bp = Blueprint('main', __name__)
 def index():
     """Landing page with search and banners"""
     search_form = FlightSearchForm()
-    banners = Banner.query.filter_by(is_active=True).order_by(Banner.order).all()
-    offers = Offer.query.filter(
-        and_(Offer.is_active == True, 
-             Offer.valid_from <= datetime.utcnow(),
-             or_(Offer.valid_to.is_(None), Offer.valid_to >= datetime.utcnow()))
-    ).limit(3).all()
+    banners = cache.cached('banners', 'active', load_active_banners)
+    # Validity windows are checked per request so a cached list never shows expired offers
+    now = datetime.utcnow()
+    offers = [offer for offer in cache.cached('offers', 'active', load_active_offers)
+              if offer['valid_from'] <= now and (offer['valid_to'] is None or offer['valid_to'] >= now)][:3]
     
     flights = []
-    all_flights = []
     
     # Get search results if search parameters provided
     if request.args.get('origin') or request.args.get('destination') or request.args.get('depart_date'):
         flights = search_flights_query()
     
-    # Always get all available flights for browsing
-    all_flights = Flight.query.filter(
-        Flight.depart_time > datetime.utcnow(),
-        Flight.seats_available > 0
-    ).order_by(Flight.depart_time.asc()).limit(20).all()
-    
+    # Loaded by the template only when its cached fragment is missing
     return render_template('index.html', 
                          search_form=search_form, 
                          banners=banners, 
                          offers=offers, 
                          flights=flights,
-                         all_flights=all_flights)
+                         upcoming_flights=load_upcoming_flights)
+
+def load_upcoming_flights():
+    """Next 20 flights with free seats for the landing page"""
+    return listings.flight_rows(Flight.query.filter(
+        Flight.depart_time > datetime.utcnow(),
+        Flight.seats_available > 0
+    ).order_by(Flight.depart_time.asc()), limit=20)
+
+def load_active_banners():
+    """Active banners as plain dicts for the cache"""
+    return [{column.name: getattr(banner, column.name) for column in Banner.__table__.columns}
+            for banner in Banner.query.filter_by(is_active=True).order_by(Banner.order)]
+
+def load_active_offers():
+    """Active offers as plain dicts for the cache"""
+    return [{column.name: getattr(offer, column.name) for column in Offer.__table__.columns}
+            for offer in Offer.query.filter_by(is_active=True).order_by(Offer.id)]
 
 def search_flights_query():
     """Helper function to search flights based on query parameters"""
@@ -90,40 +90,57 @@ def search_flights_query():
         Flight.seats_available >= passengers
     )
     
-    # Apply search filters
-    if origin:
-        query = query.filter(Flight.origin.ilike(f"%{origin}%"))
-    if destination:
-        query = query.filter(Flight.destination.ilike(f"%{destination}%"))
+    # Apply search filters (resolved to airport IDs once, then indexed lookups)
+    query = airports.filter_by_route(query, origin, destination)
     if depart_date:
         try:
-            date_obj = datetime.strptime(depart_date, '%Y-%m-%d').date()
-            query = query.filter(db.func.date(Flight.depart_time) == date_obj)
+            day_start = datetime.strptime(depart_date, '%Y-%m-%d')
+            query = query.filter(Flight.depart_time >= day_start,
+                                 Flight.depart_time < day_start + timedelta(days=1))
         except ValueError:
             pass
     
-    return query.order_by(Flight.depart_time.asc()).all()
+    return listings.flight_rows(query.order_by(Flight.depart_time.asc()))
 
 @bp.route('/search')
 def search_flights():
-    """Simple flight search - only origin and destination"""
+    """Flight search by origin and destination with filters and pagination"""
     origin = request.args.get('origin', '').strip()
     destination = request.args.get('destination', '').strip()
+    page = request.args.get('page', 1, type=int)
+    
+    # Same price/airline/stops/sort options as /api/flights
+    filter_form = FlightFilterForm(request.args, meta={'csrf': False})
+    if filter_form.sort_by.data not in FLIGHT_SORTS or 'sort_by' not in request.args:
+        filter_form.sort_by.data = 'depart_time'
+    max_stops = request.args.get('max_stops', type=int)
+    
+    # Base query for available flights in the future; company is joined so
+    # rendering a page does not lazy-load it per flight
+    query = Flight.query.options(joinedload(Flight.company)).filter(
+        Flight.depart_time > datetime.utcnow()
+    )
     
-    # Base query for available flights in the future
-    query = Flight.query.filter(Flight.depart_time > datetime.utcnow())
+    # Apply search filters (resolved to airport IDs once, then indexed lookups)
+    query = airports.filter_by_route(query, origin, destination)
+    query = filter_flights(query,
+                           request.args.get('min_price', type=float),
+                           request.args.get('max_price', type=float),
+                           request.args.get('airline', type=int),
+                           max_stops)
+    query = order_flights(query, filter_form.sort_by.data)
     
-    # Apply search filters
-    if origin:
-        query = query.filter(Flight.origin.ilike(f"%{origin}%"))
-    if destination:
-        query = query.filter(Flight.destination.ilike(f"%{destination}%"))
+    pagination = paginate_query(query, page, current_app.config['FLIGHTS_PER_PAGE'])
     
-    # Order by departure time
-    flights = query.order_by(Flight.depart_time.asc()).all()
+    # Query string without the page number, for building page links
+    page_args = request.args.to_dict()
+    page_args.pop('page', None)
     
     return render_template('search_results.html', 
-                         flights=flights, 
+                         flights=pagination.items, 
+                         pagination=pagination,
+                         page_args=page_args,
+                         filter_form=filter_form,
                          search_params=request.args,
                          origin=origin,
                          destination=destination)
@@ -209,20 +226,36 @@ def dashboard():
         flash('Доступ запрещен.', 'danger')
         return redirect(url_for('main.index'))
     
-    # Get user's tickets
-    tickets = Ticket.query.filter_by(user_id=current_user.id).order_by(Ticket.created_at.desc()).all()
+    page = request.args.get('page', 1, type=int)
+    
+    # One page of the user's tickets with their flights loaded in the same query
+    tickets_query = Ticket.query.options(joinedload(Ticket.flight)).filter_by(
+        user_id=current_user.id
+    ).order_by(Ticket.created_at.desc(), Ticket.id.desc())
+    pagination = paginate_query(tickets_query, page, current_app.config['TICKETS_PER_PAGE'])
+    
+    # Totals over the whole ticket history in one aggregate query
+    total, paid, total_price = db.session.query(
+        db.func.count(Ticket.id),
+        db.func.coalesce(db.func.sum(db.case((Ticket.status == 'paid', 1), else_=0)), 0),
+        db.func.coalesce(db.func.sum(Ticket.price), 0.0)
+    ).filter(Ticket.user_id == current_user.id).one()
+    ticket_stats = {'total': total, 'paid': paid, 'total_price': total_price}
     
     # Get upcoming flights for schedule view
-    upcoming_flights = []
-    for ticket in tickets:
-        if ticket.status == 'paid' and ticket.flight.is_upcoming:
-            upcoming_flights.append(ticket.flight)
+    upcoming_flights = Flight.query.join(Ticket, Ticket.flight_id == Flight.id).filter(
+        Ticket.user_id == current_user.id,
+        Ticket.status == 'paid',
+        Flight.depart_time > datetime.utcnow()
+    ).order_by(Flight.depart_time.asc()).all()
     
     search_form = FlightSearchForm()
     filter_form = FlightFilterForm()
     
     return render_template('dashboard.html', 
-                         tickets=tickets, 
+                         tickets=pagination.items, 
+                         pagination=pagination,
+                         ticket_stats=ticket_stats,
                          upcoming_flights=upcoming_flights,
                          search_form=search_form,
                          filter_form=filter_form)
@@ -247,19 +280,20 @@ def buy_ticket(flight_id):
     
     form = TicketPurchaseForm()
     if form.validate_on_submit():
-        # Create ticket
-        ticket = Ticket(
-            user_id=current_user.id,
-            flight_id=flight.id,
-            price=flight.price,
-            passenger_name=form.passenger_name.data,
-            status='pending_payment'  # Изменено на ожидание оплаты
-        )
-        
-        # Update available seats
-        flight.seats_available -= 1
+        # Reserve the seat and create the ticket in one transaction
+        try:
+            ticket = inventory.book_seats(flight, current_user.id, [form.passenger_name.data],
+                                          seat_numbers=[form.seat_number.data or None])[0]
+        except inventory.NotEnoughSeats:
+            db.session.rollback()
+            flash('На этом рейсе нет свободных мест.', 'danger')
+            return redirect(url_for('main.flight_details', flight_id=flight_id))
+        except seatmaps.SeatUnavailable:
+            db.session.rollback()
+            flash('Выбранное место уже занято. Пожалуйста, выберите другое.', 'warning')
+            return redirect(url_for('main.buy_ticket', flight_id=flight_id))
         
-        db.session.add(ticket)
+        rollups.record_ticket_status_change(ticket, None)
         db.session.commit()
         
         # Детальное сообщение об успешном бронировании
@@ -269,7 +303,7 @@ def buy_ticket(flight_id):
 ✈️ Рейс: {flight.flight_number}
 💰 К оплате: {flight.price:.0f} сом
 
-🔔 ВАЖНО: Пожалуйста, произведите оплату через QR-код в течение 24 часов.
+🔔 ВАЖНО: Пожалуйста, произведите оплату через QR-код в течение {holds.hold_ttl_hours(flight.company)} часов, иначе бронь будет снята.
 В комментарии к переводу обязательно укажите номер рейса {flight.flight_number}.
 
 После поступления оплаты ваш билет будет автоматически подтвержден.''', 'success')
@@ -286,10 +320,12 @@ def confirm_payment(ticket_id):
         return redirect(url_for('main.dashboard'))
     
     ticket = Ticket.query.get_or_404(ticket_id)
-    if ticket.status == 'pending_payment':
-        ticket.status = 'paid'
+    if inventory.change_ticket_status(ticket, 'pending_payment', 'paid'):
+        rollups.record_ticket_status_change(ticket, 'pending_payment')
         db.session.commit()
         flash(f'Оплата билета {ticket.confirmation_id} подтверждена.', 'success')
+    elif ticket.status == 'expired':
+        flash(f'Бронь билета {ticket.confirmation_id} истекла, оплату подтвердить нельзя.', 'warning')
     
     return redirect(url_for('main.dashboard'))
 
@@ -303,10 +339,12 @@ def mark_as_paid(ticket_id):
         flash('У вас нет прав для изменения этого билета.', 'error')
         return redirect(url_for('main.dashboard'))
     
-    if ticket.status == 'pending_payment':
-        ticket.status = 'paid'
+    if inventory.change_ticket_status(ticket, 'pending_payment', 'paid'):
+        rollups.record_ticket_status_change(ticket, 'pending_payment')
         db.session.commit()
         flash(f'Билет {ticket.confirmation_id} отмечен как оплаченный. Ожидайте подтверждения администратора.', 'success')
+    elif ticket.status == 'expired':
+        flash('Срок брони истек, места возвращены в продажу. Пожалуйста, забронируйте билет заново.', 'warning')
     else:
         flash('Этот билет уже оплачен или не требует оплаты.', 'info')
     
@@ -328,15 +366,20 @@ def cancel_ticket(ticket_id):
         return redirect(url_for('main.dashboard'))
     
     # Check 24-hour rule
-    if ticket.can_be_refunded:
-        ticket.status = 'refunded'
-        ticket.flight.seats_available += 1
+    refunded = ticket.can_be_refunded
+    if not inventory.change_ticket_status(ticket, 'paid', 'refunded' if refunded else 'canceled',
+                                          canceled_at=datetime.utcnow()):
+        # A concurrent cancel got there first and already released the seat
+        flash('Билет уже отменен или возмещен.', 'warning')
+        return redirect(url_for('main.dashboard'))
+    
+    if refunded:
+        inventory.release_tickets(ticket.flight, [ticket])
         flash(f'Билет возмещен успешно. Сумма: {ticket.price:.2f} сом', 'success')
     else:
-        ticket.status = 'canceled'
         flash('Билет отменен. Возмещение недоступно (менее 24 часов до вылета).', 'warning')
     
-    ticket.canceled_at = datetime.utcnow()
+    rollups.record_ticket_status_change(ticket, 'paid')
     db.session.commit()
     
     return redirect(url_for('main.dashboard'))
@@ -347,6 +390,76 @@ def view_ticket(confirmation_id):
     ticket = Ticket.query.filter_by(confirmation_id=confirmation_id.upper()).first_or_404()
     return render_template('ticket_view.html', ticket=ticket)
 
+@bp.route('/ticket/<int:ticket_id>/boarding-pass/<digest>.<any(png, svg):fmt>')
+@login_required
+def boarding_pass(ticket_id, digest, fmt):
+    """Boarding-pass QR code of a paid ticket, for its passenger and the airline's staff"""
+    ticket = Ticket.query.options(joinedload(Ticket.flight)).get_or_404(ticket_id)
+    if (ticket.user_id != current_user.id and not current_user.is_admin()
+            and not (current_user.is_company_manager() and ticket.flight.company.manager_id == current_user.id)):
+        abort(403)
+    if ticket.status != 'paid':
+        abort(410)  # Canceled, refunded or unpaid tickets have no boarding pass
+    
+    current = boarding.digest(ticket, fmt)
+    if digest != current:
+        # The ticket changed since the link was made; the old image must not be served under the new data
+        return redirect(boarding.url(ticket, fmt))
+    
+    response = current_app.response_class(mimetype=boarding.FORMATS[fmt])
+    response.set_etag(current)
+    # Never changes under this URL; private because it carries the passenger's name
+    response.cache_control.private = True
+    response.cache_control.max_age = 365 * 24 * 60 * 60
+    response.cache_control.immutable = True
+    if request.if_none_match.contains(current):
+        response.status_code = 304
+        return response
+    response.set_data(boarding.image(ticket, fmt)[1])
+    return response
+
+@bp.route('/media/<digest>/<any(thumb, card, hero):variant>.<any(webp, jpg):fmt>')
+def media(digest, variant, fmt):
+    """Resized variant of an uploaded image; the URL is a content hash, so it never changes"""
+    if not images.is_digest(digest):
+        return 'Image not found', 404
+    
+    etag = f'{digest}-{variant}-{fmt}'
+    response = current_app.response_class(mimetype=images.FORMATS[fmt])
+    response.set_etag(etag)
+    response.cache_control.public = True
+    response.cache_control.max_age = 365 * 24 * 60 * 60
+    response.cache_control.immutable = True
+    if request.if_none_match.contains(etag):
+        response.status_code = 304
+        return response
+    data = images.variant(digest, variant, fmt)
+    if data is None:
+        return 'Image not found', 404
+    response.set_data(data)
+    return response
+
+@bp.route('/assets/<path:filename>')
+def asset(filename):
+    """Fingerprinted static asset, precompressed with brotli or gzip when the client accepts it"""
+    if filename == assets.MANIFEST:
+        return 'Not found', 404
+    
+    directory = assets.build_dir(current_app)
+    # The name changes with the content, so browsers and proxies never need to revalidate
+    max_age = 365 * 24 * 60 * 60
+    mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    for encoding, suffix in assets.ENCODINGS:
+        if request.accept_encodings[encoding] and os.path.isfile(safe_join(directory, filename + suffix) or ''):
+            response = send_from_directory(directory, filename + suffix, mimetype=mimetype, max_age=max_age)
+            response.content_encoding = encoding
+            break
+    else:
+        response = send_from_directory(directory, filename, max_age=max_age)
+    response.vary.add('Accept-Encoding')
+    response.cache_control.immutable = True
+    return response
+
 @bp.route('/search_ticket', methods=['GET', 'POST'])
 def search_ticket():
     """Search for ticket by confirmation ID"""
@@ -452,12 +565,117 @@ def company_new_flight():
                 aircraft_type=form.aircraft_type.data
             )
             db.session.add(flight)
+            rollups.record_flight_added(flight)
             db.session.commit()
+            suggestions.invalidate()
+            connections.flight_changed(flight.id)
             flash('Flight created successfully!', 'success')
             return redirect(url_for('main.company_dashboard'))
     
     return render_template('flight_form.html', form=form, title='Create New Flight')
 
+@bp.route('/company/flights/import', methods=['GET', 'POST'])
+@login_required
+def company_import_flights():
+    """Bulk-import a flight schedule from an uploaded CSV/JSON file"""
+    if not current_user.is_company_manager():
+        flash('Access denied.', 'danger')
+        return redirect(url_for('main.index'))
+    
+    company = Company.query.filter_by(manager_id=current_user.id).first()
+    if not company:
+        flash('No company assigned.', 'warning')
+        return redirect(url_for('main.index'))
+    
+    form = FlightImportForm()
+    report = None
+    
+    if form.validate_on_submit():
+        upload = form.schedule.data
+        # Decoded as it is read, so the file is never held as one string
+        stream = io.TextIOWrapper(upload.stream, encoding='utf-8-sig', newline='')
+        report = importer.import_flights(company, importer.iter_records(stream, upload.filename),
+                                         dry_run=form.dry_run.data)
+        if report.dry_run:
+            flash(f'Проверка: можно импортировать {report.imported} из {report.rows} рейсов.', 'info')
+        elif report.imported:
+            flash(f'Импортировано рейсов: {report.imported} из {report.rows}.', 'success')
+        if report.errors:
+            flash(f'Отклонено строк: {len(report.errors)}.', 'warning')
+    
+    return render_template('flight_import.html', form=form, report=report,
+                           fields=importer.REQUIRED_FIELDS + ('stops', 'aircraft_type'))
+
+@bp.route('/company/schedules')
+@login_required
+def company_schedules():
+    """Recurring schedules of the manager's company"""
+    if not current_user.is_company_manager():
+        flash('Access denied.', 'danger')
+        return redirect(url_for('main.index'))
+    
+    company = Company.query.filter_by(manager_id=current_user.id).first()
+    if not company:
+        flash('No company assigned.', 'warning')
+        return redirect(url_for('main.index'))
+    
+    company_schedules = FlightSchedule.query.filter_by(company_id=company.id) \
+        .order_by(FlightSchedule.flight_number, FlightSchedule.valid_from).all()
+    return render_template('company_schedules.html', company=company, schedules=company_schedules)
+
+def _schedule_form(company, schedule):
+    """Shared create/edit handling: save through schedules.save_schedule so instances follow the edit"""
+    form = FlightScheduleForm(obj=schedule)
+    if request.method == 'GET' and schedule.days_of_week:
+        form.days_of_week.data = list(schedule.days_of_week)
+    
+    if form.validate_on_submit():
+        if form.origin.data.strip().lower() == form.destination.data.strip().lower():
+            flash('Origin and destination must differ.', 'danger')
+        else:
+            form.populate_obj(schedule)
+            schedule.company_id = company.id
+            schedule.flight_number = schedule.flight_number.upper()
+            schedule.days_of_week = ''.join(sorted(form.days_of_week.data))
+            schedule.aircraft_type = schedule.aircraft_type or None
+            created = schedules.save_schedule(schedule)
+            flash(f'Расписание сохранено, создано рейсов: {created}.', 'success')
+            return redirect(url_for('main.company_schedules'))
+    
+    return render_template('schedule_form.html', form=form, schedule=schedule,
+                           title='Редактирование расписания' if schedule.id else 'Новое расписание')
+
+@bp.route('/company/schedule/new', methods=['GET', 'POST'])
+@login_required
+def company_new_schedule():
+    """Create a recurring schedule and materialize its flights"""
+    if not current_user.is_company_manager():
+        flash('Access denied.', 'danger')
+        return redirect(url_for('main.index'))
+    
+    company = Company.query.filter_by(manager_id=current_user.id).first()
+    if not company:
+        flash('No company assigned.', 'warning')
+        return redirect(url_for('main.index'))
+    
+    return _schedule_form(company, FlightSchedule(company_id=company.id))
+
+@bp.route('/company/schedule/<int:schedule_id>/edit', methods=['GET', 'POST'])
+@login_required
+def company_edit_schedule(schedule_id):
+    """Edit a schedule; its future unbooked flights are updated or regenerated"""
+    if not current_user.is_company_manager():
+        flash('Access denied.', 'danger')
+        return redirect(url_for('main.index'))
+    
+    company = Company.query.filter_by(manager_id=current_user.id).first()
+    if not company:
+        flash('No company assigned.', 'warning')
+        return redirect(url_for('main.index'))
+    
+    schedule = FlightSchedule.query.filter_by(id=schedule_id, company_id=company.id).first_or_404()
+    return _schedule_form(company, schedule)
+
 @bp.route('/company/flight/<int:flight_id>/edit', methods=['GET', 'POST'])
 @login_required
 def company_edit_flight(flight_id):
@@ -511,17 +729,23 @@ def company_edit_flight(flight_id):
                 flash(error, 'danger')
         else:
             # Update flight object
+            old_depart_time = flight.depart_time
             flight.flight_number = form.flight_number.data
             flight.origin = form.origin.data
             flight.destination = form.destination.data
             flight.depart_time = depart_time
             flight.arrive_time = arrive_time
             flight.price = form.price.data
+            if (flight.seats_total, flight.aircraft_type) != (form.seats_total.data, form.aircraft_type.data):
+                seatmaps.reset(flight)
             flight.seats_total = form.seats_total.data
             flight.stops = form.stops.data
             flight.aircraft_type = form.aircraft_type.data
+            rollups.record_flight_moved(flight, old_depart_time)
             
             db.session.commit()
+            suggestions.invalidate()
+            connections.flight_changed(flight.id)
             flash('Flight updated successfully!', 'success')
             return redirect(url_for('main.company_dashboard'))
     
@@ -547,8 +771,11 @@ def company_delete_flight(flight_id):
         flash('Cannot delete flight with existing bookings.', 'danger')
         return redirect(url_for('main.company_dashboard'))
     
+    rollups.record_flight_removed(flight)
     db.session.delete(flight)
     db.session.commit()
+    suggestions.invalidate()
+    connections.flight_removed(flight_id)
     flash('Flight deleted successfully!', 'success')
     return redirect(url_for('main.company_dashboard'))
 
@@ -566,9 +793,36 @@ def company_flight_passengers(flight_id):
         return redirect(url_for('main.index'))
     
     flight = Flight.query.filter_by(id=flight_id, company_id=company.id).first_or_404()
-    passengers = flight.get_passengers()
+    sort = request.args.get('sort', 'seat')
+    if sort not in manifest.PASSENGER_SORTS:
+        sort = 'seat'
+    page = request.args.get('page', 1, type=int)
+    pagination = manifest.passengers(flight.id, sort, page, current_app.config['PASSENGERS_PER_PAGE'])
+    _, revenue = manifest.summary(flight.id)
+    
+    return render_template('flight_passengers.html', flight=flight, passengers=pagination.items,
+                           pagination=pagination, sort=sort, revenue=revenue)
+
+@bp.route('/company/flight/<int:flight_id>/passengers.<any(csv, xlsx, json):fmt>')
+@login_required
+def company_flight_manifest(flight_id, fmt):
+    """Download the passenger manifest, streamed row by row from one query"""
+    if not current_user.is_company_manager():
+        flash('Access denied.', 'danger')
+        return redirect(url_for('main.index'))
     
-    return render_template('flight_passengers.html', flight=flight, passengers=passengers)
+    company = Company.query.filter_by(manager_id=current_user.id).first()
+    if not company:
+        flash('No company assigned.', 'warning')
+        return redirect(url_for('main.index'))
+    
+    flight = Flight.query.filter_by(id=flight_id, company_id=company.id).first_or_404()
+    filename = f'flight_{flight.flight_number}_{flight.depart_time:%Y%m%d}_passengers.{fmt}'
+    response = current_app.response_class(stream_with_context(manifest.export(flight.id, fmt)),
+                                          mimetype=manifest.FORMATS[fmt])
+    response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+    response.cache_control.no_store = True
+    return response
 
 # ============== PROFILE ==============
 
@@ -613,28 +867,21 @@ def edit_profile():
             
             # Обработка загрузки аватара
             if form.avatar.data:
-                import os
-                import uuid
-                from werkzeug.utils import secure_filename
-                
-                # Создаем папку для загрузок если не существует
-                upload_folder = os.path.join(current_app.root_path, 'static', 'uploads', 'avatars')
-                os.makedirs(upload_folder, exist_ok=True)
+                try:
+                    digest = images.store(form.avatar.data)
+                except images.InvalidImage:
+                    flash('Файл не является изображением.', 'danger')
+                    return render_template('edit_profile.html', form=form)
                 
-                # Генерируем уникальное имя файла
-                filename = secure_filename(form.avatar.data.filename)
-                unique_filename = f"{uuid.uuid4().hex}_{filename}"
-                filepath = os.path.join(upload_folder, unique_filename)
-                
-                # Удаляем старый аватар если есть
-                if current_user.avatar_filename:
-                    old_filepath = os.path.join(upload_folder, current_user.avatar_filename)
+                # Старые аватары лежали в static/uploads/avatars; хранилище изображений
+                # общее для всех пользователей, поэтому из него ничего не удаляем
+                old_filename = current_user.avatar_filename
+                if old_filename and not images.is_digest(old_filename):
+                    old_filepath = os.path.join(current_app.static_folder, 'uploads', 'avatars', old_filename)
                     if os.path.exists(old_filepath):
                         os.remove(old_filepath)
                 
-                # Сохраняем новый аватар
-                form.avatar.data.save(filepath)
-                current_user.avatar_filename = unique_filename
+                current_user.avatar_filename = digest
             
             db.session.commit()
             flash('Профиль успешно обновлен!', 'success')
@@ -687,58 +934,11 @@ def admin_panel():
     # Get time filter
     time_filter = request.args.get('filter', 'all')
     
-    # Base queries
-    users = User.query.all()
-    companies = Company.query.all()
-    
-    # Apply time filter to flights
-    flight_query = Flight.query
-    now = datetime.utcnow()
+    # KPIs come from the pre-aggregated rollup table
+    stats = rollups.get_admin_statistics(time_filter)
     
-    if time_filter == 'today':
-        today = now.date()
-        flight_query = flight_query.filter(db.func.date(Flight.depart_time) == today)
-    elif time_filter == 'week':
-        week_ago = now - timedelta(days=7)
-        flight_query = flight_query.filter(Flight.depart_time >= week_ago)
-    elif time_filter == 'month':
-        month_ago = now - timedelta(days=30)
-        flight_query = flight_query.filter(Flight.depart_time >= month_ago)
-    
-    flights = flight_query.all()
-    
-    # Calculate filtered statistics
-    total_flights = len(flights)
-    active_flights = len([f for f in flights if f.depart_time > now])
-    completed_flights = len([f for f in flights if f.depart_time <= now])
-    
-    # Calculate passengers and revenue for filtered flights
-    total_passengers = 0
-    total_revenue = 0.0
-    
-    for flight in flights:
-        paid_tickets = [t for t in flight.tickets if t.status == 'paid']
-        total_passengers += len(paid_tickets)
-        total_revenue += sum(t.price for t in paid_tickets)
-    
-    # Additional statistics (always show all-time data)
-    all_flights = Flight.query.all()
-    active_users = User.query.filter_by(is_active=True).count()
-    active_companies = Company.query.filter_by(is_active=True).count()
-    
-    stats = {
-        'total_flights': total_flights,
-        'active_flights': active_flights,
-        'completed_flights': completed_flights,
-        'total_passengers': total_passengers,
-        'total_revenue': total_revenue,
-        'total_users': len(users),
-        'active_users': active_users,
-        'total_companies': len(companies),
-        'active_companies': active_companies,
-        'all_time_flights': len(all_flights),
-        'all_time_revenue': sum(sum(t.price for t in f.tickets if t.status == 'paid') for f in all_flights)
-    }
+    users = User.query.order_by(User.created_at.desc()).limit(5).all()
+    companies = Company.query.all()
     
     return render_template('admin.html', 
                          users=users, 
@@ -864,7 +1064,8 @@ def admin_new_company():
     if form.validate_on_submit():
         company = Company(
             name=form.name.data,
-            code=form.code.data.upper()
+            code=form.code.data.upper(),
+            hold_ttl_hours=form.hold_ttl_hours.data
         )
         if form.manager_id.data and form.manager_id.data != 0:
             company.manager_id = form.manager_id.data
@@ -1070,24 +1271,6 @@ def admin_new_offer():
     
     return render_template('offer_form.html', form=form, title='Create New Offer')
 
-# ============== API ENDPOINTS ==============
-
-@bp.route('/api/flights')
-def api_flights():
-    """API endpoint for flight search"""
-    flights = Flight.query.filter(Flight.depart_time > datetime.utcnow()).all()
-    return jsonify([{
-        'id': f.id,
-        'flight_number': f.flight_number,
-        'origin': f.origin,
-        'destination': f.destination,
-        'depart_time': f.depart_time.isoformat(),
-        'arrive_time': f.arrive_time.isoformat(),
-        'price': f.price,
-        'seats_available': f.seats_available,
-        'company': f.company.name if f.company else None
-    } for f in flights])
-
 # ============== ERROR HANDLERS ==============
 
 @bp.errorhandler(404)
@@ -0,0 +1,188 @@
+from . import db, importer, rollups, suggestions, connections, cache, versions
+from .models import Flight, FlightSchedule, Ticket
+from flask import current_app
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
+
+# Edits that only change what each instance carries: one UPDATE of the future instances
+INSTANCE_FIELDS = ('flight_number', 'price', 'seats_total', 'stops', 'aircraft_type')
+# Edits that move instances in time or space: future instances are regenerated
+TIMING_FIELDS = ('origin', 'destination', 'days_of_week', 'depart_local', 'arrive_local', 'arrive_day_offset',
+                 'depart_timezone', 'arrive_timezone', 'valid_from', 'valid_to', 'is_active')
+
+def _to_utc(day, local_time, zone):
+    """Naive UTC datetime for a wall-clock time on a day in an IANA zone (DST-aware)"""
+    return datetime.combine(day, local_time, tzinfo=ZoneInfo(zone)).astimezone(timezone.utc).replace(tzinfo=None)
+
+def instance_times(schedule, day):
+    """(depart_time, arrive_time) in UTC of the instance departing on local date `day`"""
+    return (_to_utc(day, schedule.depart_local, schedule.depart_timezone),
+            _to_utc(day + timedelta(days=schedule.arrive_day_offset), schedule.arrive_local, schedule.arrive_timezone))
+
+def operating_days(schedule, start, end):
+    """Local departure dates from start to end (inclusive) on the schedule's weekdays"""
+    weekdays = {int(day) for day in schedule.days_of_week}
+    day = start
+    while day <= end:
+        if day.isoweekday() in weekdays:
+            yield day
+        day += timedelta(days=1)
+
+def _unbooked_instances(schedule, now):
+    """Criteria for the schedule's future instances that have no tickets of any status.
+
+    The NOT EXISTS alone is not enough on PostgreSQL: a booking that commits
+    while the UPDATE/DELETE waits for the flight's row lock is re-checked
+    against the new row version only, not the subquery. Every booking takes
+    its seats from that row first, so untouched seat counts rule it out.
+    """
+    return (
+        Flight.schedule_id == schedule.id,
+        Flight.depart_time > now,
+        Flight.seats_available == Flight.seats_total,
+        ~db.exists().where(Ticket.flight_id == Flight.id)
+    )
+
+def materialize_schedule(schedule, horizon_days, now=None):
+    """Create the schedule's missing Flight rows up to `horizon_days` ahead and commit.
+
+    Incremental: only days after materialized_until are generated. The
+    watermark is advanced with a conditional UPDATE first, so when two runs
+    race only the one that moved it inserts. Departures that already exist
+    (booked instances kept through an edit) are skipped.
+    Returns the number of flights created.
+    """
+    now = now or datetime.utcnow()
+    today = now.date()
+    start = max(schedule.valid_from, today)
+    if schedule.materialized_until is not None:
+        start = max(start, schedule.materialized_until + timedelta(days=1))
+    end = today + timedelta(days=horizon_days)
+    if schedule.valid_to is not None:
+        end = min(end, schedule.valid_to)
+    if not schedule.is_active or start > end:
+        return 0
+
+    claimed = db.session.execute(
+        db.update(FlightSchedule).where(
+            FlightSchedule.id == schedule.id,
+            FlightSchedule.materialized_until.is_(None) if schedule.materialized_until is None
+            else FlightSchedule.materialized_until == schedule.materialized_until
+        ).values(materialized_until=end).execution_options(synchronize_session=False)
+    ).rowcount
+    if not claimed:
+        db.session.rollback()
+        return 0
+
+    existing = {depart_time for (depart_time,) in db.session.query(Flight.depart_time).filter(
+        Flight.schedule_id == schedule.id,
+        Flight.depart_time >= _to_utc(start, schedule.depart_local, schedule.depart_timezone)
+    )}
+    rows = []
+    for day in operating_days(schedule, start, end):
+        depart_time, arrive_time = instance_times(schedule, day)
+        if depart_time <= now or depart_time in existing:
+            continue
+        rows.append({
+            'schedule_id': schedule.id,
+            'flight_number': schedule.flight_number,
+            'origin': schedule.origin,
+            'destination': schedule.destination,
+            'depart_time': depart_time,
+            'arrive_time': arrive_time,
+            'price': schedule.price,
+            'seats_total': schedule.seats_total,
+            'stops': schedule.stops,
+            'aircraft_type': schedule.aircraft_type,
+        })
+    if rows:
+        importer.insert_flights(schedule.company_id, rows, now)
+    db.session.commit()
+    db.session.expire(schedule, ['materialized_until'])
+    return len(rows)
+
+def materialize(horizon_days=None, now=None, schedules=None):
+    """Materialize every active schedule (or the given ones) up to the horizon.
+
+    Each schedule is its own transaction. Returns the number of flights created.
+    """
+    horizon_days = horizon_days or current_app.config.get('SCHEDULE_HORIZON_DAYS', 90)
+    now = now or datetime.utcnow()
+    if schedules is None:
+        horizon_end = now.date() + timedelta(days=horizon_days)
+        schedules = FlightSchedule.query.filter(
+            FlightSchedule.is_active.is_(True),
+            db.or_(FlightSchedule.materialized_until.is_(None), FlightSchedule.materialized_until < horizon_end)
+        ).all()
+    created = sum(materialize_schedule(schedule, horizon_days, now) for schedule in schedules)
+    if created:
+        suggestions.invalidate()
+        connections.invalidate()
+    return created
+
+def _changed(schedule, fields):
+    state = db.inspect(schedule)
+    return [field for field in fields if state.attrs[field].history.has_changes()]
+
+def _update_instances(schedule, now):
+    """Copy the instance fields onto future unbooked instances in one UPDATE"""
+    db.session.execute(
+        db.update(Flight).where(*_unbooked_instances(schedule, now)).values(
+            flight_number=schedule.flight_number,
+            price=schedule.price,
+            seats_total=schedule.seats_total,
+            seats_available=schedule.seats_total,
+            stops=schedule.stops,
+            aircraft_type=schedule.aircraft_type,
+            # Nothing is booked, so the seat map is simply rebuilt for the new layout
+            seat_map=None,
+            seat_map_version=Flight.seat_map_version + 1
+        ).execution_options(synchronize_session=False)
+    )
+
+def _delete_instances(schedule, now):
+    """Delete future unbooked instances in one DELETE and uncount them from the rollups"""
+    delete = db.delete(Flight).where(*_unbooked_instances(schedule, now)).execution_options(
+        synchronize_session=False
+    )
+    if db.engine.dialect.delete_returning:
+        depart_times = db.session.execute(delete.returning(Flight.depart_time)).scalars().all()
+    else:
+        depart_times = db.session.execute(
+            db.select(Flight.depart_time).where(*_unbooked_instances(schedule, now))
+        ).scalars().all()
+        db.session.execute(delete)
+    rollups.record_flights_removed(schedule.company_id, depart_times)
+
+def save_schedule(schedule, now=None):
+    """Commit a new or edited schedule and bring its future instances in line.
+
+    Instance-only edits (fare, seats, aircraft, flight number) are applied to
+    every future unbooked instance with one UPDATE. Timing or route edits
+    delete those instances with one DELETE and regenerate them. Instances
+    that already have tickets are never touched.
+    """
+    now = now or datetime.utcnow()
+    # An autoflush while expired attributes load would consume the edit's history
+    with db.session.no_autoflush:
+        is_new = schedule.id is None
+        timing_changed = not is_new and _changed(schedule, TIMING_FIELDS)
+        instances_changed = not is_new and _changed(schedule, INSTANCE_FIELDS)
+    db.session.add(schedule)
+    db.session.flush()
+
+    if timing_changed:
+        _delete_instances(schedule, now)
+        schedule.materialized_until = None
+    elif instances_changed:
+        _update_instances(schedule, now)
+    if timing_changed or instances_changed:
+        # Core statements bypass the model events that bump versions and drop caches
+        versions.touch('flights')
+        cache.invalidate_after_commit('flight')
+        cache.invalidate_after_commit('stats')
+    db.session.commit()
+    if timing_changed or instances_changed:
+        connections.invalidate()
+        suggestions.invalidate()
+    return materialize(now=now, schedules=[schedule])
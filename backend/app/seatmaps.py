@@ -0,0 +1,183 @@
+from . import db
+from .models import Flight, Ticket
+import base64
+
+# Cabin layout per aircraft family: seat letters in a row, spaces mark aisles.
+# Matched against the lowercased aircraft_type in order; DEFAULT_LAYOUT otherwise.
+LAYOUTS = [
+    ('a380', 'ABC DEFG HJK'),
+    ('747', 'ABC DEFG HJK'),
+    ('777', 'ABC DEFG HJK'),
+    ('787', 'ABC DEF GHK'),
+    ('a350', 'ABC DEF GHK'),
+    ('a330', 'AB CDEF GH'),
+    ('crj', 'AB CD'),
+    ('e-jet', 'AB CD'),
+    ('embraer', 'AB CD'),
+]
+DEFAULT_LAYOUT = 'ABC DEF'
+
+# Seats stay assigned to tickets in these statuses
+SEATED_STATUSES = ('pending_payment', 'paid')
+
+CAS_RETRIES = 5
+
+class SeatUnavailable(Exception):
+    """Raised when a requested seat is taken or does not exist on the flight"""
+
+def layout_for(aircraft_type):
+    """Seat letters (with aisle gaps) for an aircraft type"""
+    aircraft = (aircraft_type or '').lower()
+    for keyword, layout in LAYOUTS:
+        if keyword in aircraft:
+            return layout
+    return DEFAULT_LAYOUT
+
+class SeatMap:
+    """Bitmap of taken seats for one flight, one bit per seat in row-major order.
+
+    Seat `i` is row i // width + 1 and letter i % width, so a 180-seat flight
+    fits in 23 bytes and a seat is taken or freed by flipping one bit.
+    """
+
+    def __init__(self, layout, seats_total, bitmap=None):
+        self.layout = layout
+        self.letters = layout.replace(' ', '')
+        self.width = len(self.letters)
+        self.seats_total = seats_total
+        self.rows = -(-seats_total // self.width)
+        size = (seats_total + 7) // 8
+        self.bits = bytearray((bitmap or b'')[:size].ljust(size, b'\0'))
+
+    def label(self, index):
+        return f'{index // self.width + 1}{self.letters[index % self.width]}'
+
+    def index(self, label):
+        """Seat index for a label like "12C", or None if it is not on this flight"""
+        label = (label or '').strip().upper()
+        if len(label) < 2 or not label[:-1].isdigit() or label[-1] not in self.letters:
+            return None
+        index = (int(label[:-1]) - 1) * self.width + self.letters.index(label[-1])
+        return index if 0 <= index < self.seats_total else None
+
+    def is_taken(self, index):
+        return bool(self.bits[index >> 3] & (1 << (index & 7)))
+
+    def take(self, index):
+        self.bits[index >> 3] |= 1 << (index & 7)
+
+    def free(self, index):
+        self.bits[index >> 3] &= ~(1 << (index & 7)) & 0xFF
+
+    def next_free(self):
+        """Lowest free seat index, or None; skips full bytes eight seats at a time"""
+        for position, byte in enumerate(self.bits):
+            if byte != 0xFF:
+                index = position * 8 + ((~byte & (byte + 1)).bit_length() - 1)
+                return index if index < self.seats_total else None
+        return None
+
+    def to_bytes(self):
+        return bytes(self.bits)
+
+def _load(flight_id):
+    """Current SeatMap and version for a flight, built from its tickets on first use"""
+    bitmap, version, seats_total, aircraft_type = db.session.execute(
+        db.select(Flight.seat_map, Flight.seat_map_version, Flight.seats_total, Flight.aircraft_type)
+        .where(Flight.id == flight_id)
+    ).one()
+    seat_map = SeatMap(layout_for(aircraft_type), seats_total or 0, bitmap)
+    if bitmap is None:
+        # Flights created before seat maps (or after a layout change) are rebuilt from ticket seats
+        for (label,) in db.session.execute(
+            db.select(Ticket.seat_number).where(
+                Ticket.flight_id == flight_id,
+                Ticket.status.in_(SEATED_STATUSES),
+                Ticket.seat_number.isnot(None)
+            )
+        ):
+            index = seat_map.index(label)
+            if index is not None:
+                seat_map.take(index)
+    return seat_map, version or 0
+
+def _modify(flight_id, change):
+    """Apply `change(seat_map)` and write the map back with a compare-and-swap on its version.
+
+    If another transaction wrote the map in between, the UPDATE matches no row
+    and the change is retried against the fresh map. Returns change's result.
+    """
+    for _ in range(CAS_RETRIES):
+        seat_map, version = _load(flight_id)
+        result = change(seat_map)
+        updated = db.session.execute(
+            db.update(Flight).where(Flight.id == flight_id, Flight.seat_map_version == version)
+            .values(seat_map=seat_map.to_bytes(), seat_map_version=version + 1)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        if updated:
+            return result
+    raise SeatUnavailable('Seat map is busy, please try again')
+
+def assign_seats(flight, tickets, requested=None):
+    """Give each ticket its requested seat (or the next free one) in the current transaction.
+
+    `requested` is a list of seat labels aligned with `tickets`; None entries
+    get the lowest free seat. Raises SeatUnavailable if a requested seat is
+    taken or does not exist.
+    """
+    requested = list(requested or []) + [None] * (len(tickets) - len(requested or []))
+
+    def allocate(seat_map):
+        labels = []
+        for label in requested:
+            if label:
+                index = seat_map.index(label)
+                if index is None:
+                    raise SeatUnavailable(f'Seat {label} does not exist on this flight')
+                if seat_map.is_taken(index):
+                    raise SeatUnavailable(f'Seat {seat_map.label(index)} is already taken')
+            else:
+                index = seat_map.next_free()
+                if index is None:
+                    # Legacy tickets without seat numbers can leave the map short; book without a seat
+                    labels.append(None)
+                    continue
+            seat_map.take(index)
+            labels.append(seat_map.label(index))
+        return labels
+
+    for ticket, label in zip(tickets, _modify(flight.id, allocate)):
+        ticket.seat_number = label
+
+def release_seats(flight_id, labels):
+    """Free the given seat labels on a flight"""
+    labels = [label for label in labels if label]
+    if not labels:
+        return
+
+    def free(seat_map):
+        for label in labels:
+            index = seat_map.index(label)
+            if index is not None:
+                seat_map.free(index)
+
+    _modify(flight_id, free)
+
+def reset(flight):
+    """Drop a flight's map so it is rebuilt from tickets, e.g. after a layout change"""
+    flight.seat_map = None
+    flight.seat_map_version = Flight.seat_map_version + 1
+
+def seat_map_payload(flight):
+    """Compact JSON-ready seat map: layout, size and the taken-seat bitmap as base64"""
+    seat_map, version = _load(flight.id)
+    return {
+        'flight_id': flight.id,
+        'layout': seat_map.layout,
+        'rows': seat_map.rows,
+        'seats_total': seat_map.seats_total,
+        'seats_available': flight.seats_available,
+        'taken': base64.b64encode(seat_map.to_bytes()).decode(),
+        'version': version
+    }
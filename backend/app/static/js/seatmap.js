@@ -0,0 +1,83 @@
+// Seat picker: renders the /api/flights/<id>/seats payload as a grid of seats.
+// Containers opt in with data-seat-map and data-seats-url; with data-seat-input
+// (the id of a hidden input) free seats become selectable.
+document.addEventListener('DOMContentLoaded', function() {
+    document.querySelectorAll('[data-seat-map]').forEach(loadSeatMap);
+});
+
+function loadSeatMap(container) {
+    fetch(container.dataset.seatsUrl)
+        .then(function(response) { return response.json(); })
+        .then(function(data) { renderSeatMap(container, data.seats); })
+        .catch(function() {
+            container.innerHTML = '<p class="text-muted small mb-0">Схема мест недоступна</p>';
+        });
+}
+
+function decodeBitmap(encoded) {
+    const raw = atob(encoded);
+    const bytes = new Uint8Array(raw.length);
+    for (let i = 0; i < raw.length; i++) {
+        bytes[i] = raw.charCodeAt(i);
+    }
+    return bytes;
+}
+
+function renderSeatMap(container, seats) {
+    const taken = decodeBitmap(seats.taken);
+    const letters = seats.layout.replace(/ /g, '');
+    const input = container.dataset.seatInput ? document.getElementById(container.dataset.seatInput) : null;
+    const label = container.parentElement.querySelector('[data-seat-label]');
+
+    const grid = document.createElement('div');
+    grid.className = 'seat-map';
+
+    for (let row = 0; row < seats.rows; row++) {
+        const rowEl = document.createElement('div');
+        rowEl.className = 'seat-row';
+
+        const number = document.createElement('span');
+        number.className = 'seat-row-number';
+        number.textContent = row + 1;
+        rowEl.appendChild(number);
+
+        let letterIndex = 0;
+        for (const ch of seats.layout) {
+            if (ch === ' ') {
+                const aisle = document.createElement('span');
+                aisle.className = 'seat-aisle';
+                rowEl.appendChild(aisle);
+                continue;
+            }
+            const index = row * letters.length + letterIndex++;
+            if (index >= seats.seats_total) {
+                continue;
+            }
+            const isTaken = (taken[index >> 3] >> (index & 7)) & 1;
+            const seat = document.createElement('button');
+            seat.type = 'button';
+            seat.className = 'seat ' + (isTaken ? 'seat-taken' : 'seat-free');
+            seat.textContent = ch;
+            seat.title = (row + 1) + ch;
+            seat.disabled = isTaken || !input;
+
+            if (input && !isTaken) {
+                seat.addEventListener('click', function() {
+                    grid.querySelectorAll('.seat-selected').forEach(function(el) {
+                        el.classList.remove('seat-selected');
+                    });
+                    seat.classList.add('seat-selected');
+                    input.value = seat.title;
+                    if (label) {
+                        label.textContent = seat.title;
+                    }
+                });
+            }
+            rowEl.appendChild(seat);
+        }
+        grid.appendChild(rowEl);
+    }
+
+    container.innerHTML = '';
+    container.appendChild(grid);
+}
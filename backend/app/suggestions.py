@@ -0,0 +1,100 @@
+from . import db
+from .models import Flight, Ticket
+from flask import current_app
+import threading
+import time
+
+class SuggestionIndex:
+    """In-memory n-gram index of origin/destination labels for autocomplete.
+
+    Each label is split into lowercase bigrams and trigrams. A query is
+    answered by intersecting the posting lists of its n-grams, confirming the
+    substring match and ranking by popularity (flight count + paid tickets),
+    without touching the database.
+    """
+
+    def __init__(self, popularity):
+        # popularity: {label: {'origin': score, 'destination': score}}
+        self.labels = sorted(popularity)
+        self.scores = [popularity[label] for label in self.labels]
+        self.lowered = [label.lower() for label in self.labels]
+        self.postings = {}
+        for entry_id, text in enumerate(self.lowered):
+            for size in (2, 3):
+                for start in range(len(text) - size + 1):
+                    self.postings.setdefault(text[start:start + size], set()).add(entry_id)
+        self.built_at = time.monotonic()
+
+    def _candidates(self, text):
+        size = 3 if len(text) >= 3 else 2
+        grams = {text[start:start + size] for start in range(len(text) - size + 1)}
+        # Intersect the rarest posting lists first
+        postings = sorted((self.postings.get(gram, set()) for gram in grams), key=len)
+        if not postings or not postings[0]:
+            return set()
+        candidates = set(postings[0])
+        for posting in postings[1:]:
+            candidates &= posting
+            if not candidates:
+                break
+        return candidates
+
+    def search(self, query, type_filter='all', limit=10):
+        """Labels containing `query`, most popular first"""
+        text = query.lower()
+        roles = ('origin', 'destination') if type_filter == 'all' else (type_filter,)
+
+        matches = []
+        for entry_id in self._candidates(text):
+            if text not in self.lowered[entry_id]:
+                continue
+            score = sum(self.scores[entry_id].get(role, 0) for role in roles)
+            if score > 0:
+                matches.append((-score, self.labels[entry_id]))
+        matches.sort()
+        return [label for _, label in matches[:limit]]
+
+def build_index():
+    """Load label popularity from the database and build a fresh index"""
+    popularity = {}
+    for role, column in (('origin', Flight.origin), ('destination', Flight.destination)):
+        flight_counts = db.session.query(column, db.func.count(Flight.id)).group_by(column).all()
+        ticket_counts = db.session.query(column, db.func.count(Ticket.id)).join(
+            Ticket, Ticket.flight_id == Flight.id
+        ).filter(Ticket.status == 'paid').group_by(column).all()
+
+        for label, count in flight_counts + ticket_counts:
+            scores = popularity.setdefault(label, {})
+            scores[role] = scores.get(role, 0) + count
+    return SuggestionIndex(popularity)
+
+_index = None
+_stale = True
+_lock = threading.Lock()
+
+def get_index():
+    """Return the current index, rebuilding it if it was invalidated or expired.
+
+    Each worker holds its own copy; SUGGESTIONS_TTL bounds how long a worker
+    can miss flight changes made through another worker.
+    """
+    global _index, _stale
+    ttl = current_app.config.get('SUGGESTIONS_TTL', 300)
+    index = _index
+    if index is not None and not _stale and time.monotonic() - index.built_at < ttl:
+        return index
+
+    with _lock:
+        if _index is None or _stale or time.monotonic() - _index.built_at >= ttl:
+            _stale = False
+            _index = build_index()
+        return _index
+
+def invalidate():
+    """Mark the index stale after flights were created, edited or deleted"""
+    global _stale
+    _stale = True
+
+def suggest(query, type_filter='all', limit=10):
+    """Autocomplete suggestions for airports/cities"""
+    return get_index().search(query, type_filter, limit)
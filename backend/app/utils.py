@@ -1,7 +1,62 @@
 from datetime import datetime, timedelta
 from flask import flash
+from . import db
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
 import re
 
+def upsert(bind, table, keys, rows, add=(), replace=()):
+    """Insert `rows`, merging each one into the existing row with the same `keys`.
+
+    On a conflict the `add` columns are added to the stored values and the
+    `replace` columns overwritten; with neither the existing row is kept.
+    SQLite, PostgreSQL and MySQL do this in one atomic statement; other
+    databases get a guarded UPDATE, then an INSERT in a savepoint that falls
+    back to the UPDATE if a concurrent writer inserted the row first.
+    `bind` is a Session or Connection; the caller commits.
+    """
+    dialect = bind.get_bind().dialect.name if hasattr(bind, 'get_bind') else bind.dialect.name
+    if dialect in ('sqlite', 'postgresql'):
+        insert = (sqlite.insert if dialect == 'sqlite' else postgresql.insert)(table)
+        index_elements = [table.c[key] for key in keys]
+        if add or replace:
+            statement = insert.on_conflict_do_update(index_elements=index_elements, set_={
+                **{column: table.c[column] + insert.excluded[column] for column in add},
+                **{column: insert.excluded[column] for column in replace}
+            })
+        else:
+            statement = insert.on_conflict_do_nothing(index_elements=index_elements)
+        bind.execute(statement, rows)
+    elif dialect in ('mysql', 'mariadb'):
+        insert = mysql.insert(table)
+        bind.execute(insert.on_duplicate_key_update({
+            **{column: table.c[column] + insert.inserted[column] for column in add},
+            **{column: insert.inserted[column] for column in replace},
+            # Assigning a key to itself keeps the existing row unchanged
+            **({} if add or replace else {keys[0]: table.c[keys[0]]})
+        }), rows)
+    else:
+        for row in rows:
+            _merge_row(bind, table, keys, row, add, replace)
+
+def _merge_row(bind, table, keys, row, add, replace):
+    where = [table.c[key] == row[key] for key in keys]
+    update = table.update().where(*where).values(
+        {**{column: table.c[column] + row[column] for column in add},
+         **{column: row[column] for column in replace}})
+    if add or replace:
+        if bind.execute(update).rowcount:
+            return
+    elif bind.execute(db.select(table.c[keys[0]]).where(*where)).first() is not None:
+        return
+    try:
+        with bind.begin_nested():
+            bind.execute(table.insert().values(row))
+    except IntegrityError:
+        # Inserted concurrently since the UPDATE: merge into that row instead
+        if add or replace:
+            bind.execute(update)
+
 def format_currency(amount):
     """Format currency for display"""
     return f"${amount:.2f}"
@@ -50,13 +105,6 @@ def calculate_refund_amount(ticket):
     else:
         return 0  # No refund
 
-def generate_seat_number():
-    """Generate a random seat number"""
-    import random
-    row = random.randint(1, 30)
-    seat = random.choice(['A', 'B', 'C', 'D', 'E', 'F'])
-    return f"{row}{seat}"
-
 def flash_errors(form):
     """Flash form errors"""
     for field, errors in form.errors.items():
@@ -0,0 +1,134 @@
+from . import db
+from .models import Airport, Company, Flight, Ticket, Banner, Offer, CollectionVersion
+from .utils import upsert
+from flask import request, current_app
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from datetime import datetime, timedelta, timezone
+import hashlib
+
+# Every collection counter; seeded at startup so the upsert never races on a first INSERT
+COLLECTIONS = ('airlines', 'banners', 'flights', 'offers')
+
+def seed():
+    """Create the missing counter rows at version 0"""
+    with db.engine.begin() as conn:
+        upsert(conn, CollectionVersion.__table__, ['name'], [{'name': name, 'version': 0} for name in COLLECTIONS])
+
+def _collections_for(obj):
+    """Collection counters a changed model instance bumps"""
+    if isinstance(obj, (Flight, Airport)):
+        return ['flights']
+    if isinstance(obj, Company):
+        # Airline names are embedded in every serialized flight and ticket
+        return ['airlines']
+    if isinstance(obj, Banner):
+        return ['banners']
+    if isinstance(obj, Offer):
+        return ['offers']
+    return []
+
+def touch(name):
+    """Bump a collection counter once the current transaction commits, e.g. after a Core UPDATE"""
+    db.session.info.setdefault('version_bumps', set()).add(name)
+
+@event.listens_for(Session, 'after_flush')
+def collect_bumps(session, flush_context):
+    pending = session.info.setdefault('version_bumps', set())
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        pending.update(_collections_for(obj))
+
+def _bump(conn, names):
+    """Increment the named counters in one upsert, creating any that are missing"""
+    now = datetime.utcnow()
+    upsert(conn, CollectionVersion.__table__, ['name'],
+           [{'name': name, 'version': 1, 'updated_at': now} for name in sorted(names)],
+           add=['version'], replace=['updated_at'])
+
+@event.listens_for(Session, 'after_commit')
+def apply_bumps(session):
+    """Bump the counters once the transaction has committed.
+
+    The bump is its own short statement, so a booking never holds the
+    counter row lock while its transaction runs; readers may see the new
+    data under the old version for that instant, which only delays a
+    client's refetch until its next revalidation.
+    """
+    names = session.info.pop('version_bumps', None)
+    if names:
+        with db.engine.begin() as conn:
+            _bump(conn, names)
+
+@event.listens_for(Session, 'after_rollback')
+def discard_bumps(session):
+    session.info.pop('version_bumps', None)
+
+def current(*names):
+    """(version, updated_at) per collection name in one query; (0, None) before its first change"""
+    rows = db.session.query(CollectionVersion.name, CollectionVersion.version, CollectionVersion.updated_at) \
+        .filter(CollectionVersion.name.in_(names)).all()
+    found = {name: (version, updated_at) for name, version, updated_at in rows}
+    return [found.get(name, (0, None)) for name in names]
+
+def last_departure(now):
+    """Latest departure up to `now`: the upcoming-flights set only changes when it does"""
+    return db.session.query(db.func.max(Flight.depart_time)).filter(Flight.depart_time <= now).scalar()
+
+def ticket_list_version(user_id, now):
+    """Row versions of a user's tickets and their flights in one aggregate query.
+
+    Besides the newest updated_at values it returns the latest departure and
+    the latest closed refund window, which move whenever is_upcoming or
+    can_be_refunded flips for one of the tickets.
+    """
+    refund_cutoff = now + timedelta(hours=24)
+    count, tickets_updated, flights_updated, departed, refund_closed = db.session.query(
+        db.func.count(Ticket.id),
+        db.func.max(Ticket.updated_at),
+        db.func.max(Flight.updated_at),
+        db.func.max(db.case((Flight.depart_time <= now, Flight.depart_time))),
+        db.func.max(db.case(((Ticket.status == 'paid') & (Flight.depart_time <= refund_cutoff), Flight.depart_time)))
+    ).join(Flight, Ticket.flight_id == Flight.id).filter(Ticket.user_id == user_id).one()
+    if refund_closed is not None:
+        refund_closed -= timedelta(hours=24)
+    return (count, tickets_updated, flights_updated, departed, refund_closed)
+
+def latest(*times):
+    """Newest of the given timestamps, ignoring missing ones"""
+    times = [t for t in times if t is not None]
+    return max(times) if times else None
+
+def make_etag(*parts):
+    """Strong ETag value (unquoted) derived from the version parts of a response"""
+    return hashlib.sha1(repr(parts).encode()).hexdigest()
+
+def is_fresh(etag, last_modified=None):
+    """Whether the client's cached copy is current.
+
+    If-None-Match wins when present; If-Modified-Since is only consulted
+    without it and has one-second resolution.
+    """
+    if request.if_none_match:
+        return request.if_none_match.contains(etag)
+    if last_modified is not None and request.if_modified_since is not None:
+        return last_modified.replace(microsecond=0, tzinfo=timezone.utc) <= request.if_modified_since
+    return False
+
+def _set_validators(response, etag, last_modified, private):
+    response.set_etag(etag)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    response.cache_control.no_cache = True
+    if private:
+        response.cache_control.private = True
+    return response
+
+def tag(response, etag, last_modified=None, private=False):
+    """Add validators to a successful response so clients can revalidate it"""
+    if response.status_code != 200:
+        return response
+    return _set_validators(response, etag, last_modified, private)
+
+def not_modified(etag, last_modified=None, private=False):
+    """Empty 304 carrying the same validators as the full response"""
+    return _set_validators(current_app.response_class(status=304), etag, last_modified, private)
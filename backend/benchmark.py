@@ -0,0 +1,286 @@
+#!/usr/bin/env python3
+"""
+Performance benchmarks for the flight search paths.
+
+Each benchmark seeds a large synthetic dataset into the database given by
+--database-url (SQLite or PostgreSQL) and reports p50/p99 latency.
+
+    search       EXPLAIN plans and latency per endpoint, without and with the search indexes
+    suggestions  autocomplete via ILIKE queries vs the in-memory n-gram index
+    itineraries  one/two-stop connection search over the in-memory flight graph
+    listings     flight listing serialization: ORM objects vs column projection
+
+    python benchmark.py search --database-url sqlite:///bench.db
+    python benchmark.py search --database-url postgresql://localhost/bench --flights 1000000 --tickets 10000000
+"""
+
+import sys
+import os
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+
+# Add the backend directory to the path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+def make_app(database_url):
+    """Create the app against the benchmark database"""
+    os.environ['DATABASE_URL'] = database_url
+    from app import create_app
+    return create_app('testing')
+
+def percentile(samples, pct):
+    """Nearest-rank percentile of a list of samples"""
+    ordered = sorted(samples)
+    index = max(0, min(len(ordered) - 1, int(round(pct / 100.0 * len(ordered))) - 1))
+    return ordered[index]
+
+def seed_dataset(num_flights, num_tickets, num_users=10000, num_companies=20, seed=42):
+    """Seed the reproducible app.datagen dataset (same as `flask gen-data`)"""
+    from app.datagen import generate
+    from app.models import Flight
+
+    if Flight.query.count() >= num_flights:
+        print(f"Dataset already present ({Flight.query.count()} flights), skipping seeding")
+        return
+
+    print(f"Seeding {num_users} users, {num_companies} companies, "
+          f"{num_flights} flights, ~{num_tickets} tickets...")
+    started = time.perf_counter()
+    generate(num_users, num_flights, num_tickets, companies=num_companies, seed=seed, log=lambda message: None)
+    print(f"Seeded in {time.perf_counter() - started:.1f}s")
+
+def explain(stmt):
+    """Return the database's query plan for a statement as text lines"""
+    from app import db
+
+    compiled = stmt.compile(dialect=db.engine.dialect, compile_kwargs={"render_postcompile": True})
+    if compiled.positional:
+        params = tuple(compiled.params[name] for name in compiled.positiontup)
+    else:
+        params = compiled.params
+    prefix = 'EXPLAIN QUERY PLAN ' if db.engine.dialect.name == 'sqlite' else 'EXPLAIN '
+
+    with db.engine.connect() as conn:
+        rows = conn.exec_driver_sql(prefix + str(compiled), params).fetchall()
+    return [' | '.join(str(col) for col in row) for row in rows]
+
+def search_cases():
+    """(name, url, statement) for each search path; statements mirror the endpoint queries"""
+    from app import db
+    from app.models import Flight, Ticket
+    from app.airports import filter_by_route
+
+    now = datetime.utcnow()
+    upcoming = [Flight.depart_time > now, Flight.seats_available >= 1]
+    user_id = 1
+    flight_id = 1
+
+    return [
+        ('index() browse', '/',
+         db.select(Flight).where(Flight.depart_time > now, Flight.seats_available > 0)
+         .order_by(Flight.depart_time.asc()).limit(20)),
+        ('search_flights_query', '/?origin=Chicago&destination=Miami',
+         filter_by_route(db.select(Flight).where(*upcoming), 'Chicago', 'Miami')
+         .order_by(Flight.depart_time.asc())),
+        ('/search', '/search?origin=Bishkek&destination=Osh',
+         filter_by_route(db.select(Flight).where(Flight.depart_time > now), 'Bishkek', 'Osh')
+         .order_by(Flight.depart_time.asc())),
+        ('/api/flights by price', '/api/flights?sort_by=price_asc',
+         db.select(Flight).where(*upcoming).order_by(Flight.price.asc()).limit(50)),
+        ('/api/flights by airline', '/api/flights?airline_id=3&sort_by=depart_time',
+         db.select(Flight).where(*upcoming, Flight.company_id == 3)
+         .order_by(Flight.depart_time.asc()).limit(50)),
+        ('user tickets', None,
+         db.select(Ticket).where(Ticket.user_id == user_id).order_by(Ticket.created_at.desc())),
+        ('flight paid tickets', None,
+         db.select(Ticket).where(Ticket.flight_id == flight_id, Ticket.status == 'paid')),
+        ('paid tickets count', None,
+         db.select(db.func.count(Ticket.id)).where(Ticket.status == 'paid')),
+    ]
+
+def measure(client, url, stmt, iterations):
+    """Latency samples in milliseconds for an endpoint (or the bare statement)"""
+    from app import db
+
+    samples = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        if url:
+            response = client.get(url)
+            assert response.status_code == 200, f'{url} returned {response.status_code}'
+        else:
+            db.session.execute(stmt).all()
+        samples.append((time.perf_counter() - started) * 1000)
+    db.session.rollback()
+    return samples
+
+def run_search_phase(app, label, iterations):
+    print(f"\n===== {label} =====")
+    client = app.test_client()
+    results = {}
+    for name, url, stmt in search_cases():
+        print(f"\n--- {name}{' (' + url + ')' if url else ''}")
+        for line in explain(stmt):
+            print(f"    {line}")
+        samples = measure(client, url, stmt, iterations)
+        results[name] = (percentile(samples, 50), percentile(samples, 99))
+        print(f"    p50 {results[name][0]:.2f} ms   p99 {results[name][1]:.2f} ms")
+    return results
+
+def bench_search(args):
+    """EXPLAIN plans and latency for the search paths before and after indexing"""
+    from add_search_indexes import add_search_indexes, drop_search_indexes
+
+    app = make_app(args.database_url)
+    with app.app_context():
+        seed_dataset(args.flights, args.tickets, seed=args.seed)
+
+        drop_search_indexes()
+        before = run_search_phase(app, 'BEFORE (no search indexes)', args.iterations)
+
+        add_search_indexes()
+        after = run_search_phase(app, 'AFTER (search indexes)', args.iterations)
+
+    print(f"\n{'endpoint':<28}{'p50 before':>12}{'p50 after':>12}{'p99 before':>12}{'p99 after':>12}")
+    for name in before:
+        print(f"{name:<28}{before[name][0]:>10.2f}ms{after[name][0]:>10.2f}ms"
+              f"{before[name][1]:>10.2f}ms{after[name][1]:>10.2f}ms")
+
+def bench_suggestions(args):
+    """Autocomplete: the old ILIKE query path against the in-memory index"""
+    from app import db
+    from app.models import Flight
+    from app.suggestions import build_index
+
+    def sql_suggest(query):
+        found = set()
+        for column in (Flight.origin, Flight.destination):
+            rows = db.session.query(column).filter(column.ilike(f'%{query}%')).distinct().limit(10).all()
+            found.update(row[0] for row in rows)
+        return sorted(found)[:10]
+
+    app = make_app(args.database_url)
+    with app.app_context():
+        seed_dataset(args.flights, args.tickets, seed=args.seed)
+
+        started = time.perf_counter()
+        index = build_index()
+        print(f"Index built in {(time.perf_counter() - started) * 1000:.1f} ms "
+              f"({len(index.labels)} labels, {len(index.postings)} n-grams)")
+
+        queries = ['ch', 'new', 'york', 'bish', 'osh', 'an', 'dxb', 'zz']
+        print(f"\n{'query':<10}{'sql p50':>12}{'sql p99':>12}{'index p50':>12}{'index p99':>12}")
+        for query in queries:
+            sql_samples, index_samples = [], []
+            for _ in range(args.iterations):
+                started = time.perf_counter()
+                sql_suggest(query)
+                sql_samples.append((time.perf_counter() - started) * 1e6)
+                started = time.perf_counter()
+                index.search(query)
+                index_samples.append((time.perf_counter() - started) * 1e6)
+            print(f"{query:<10}{percentile(sql_samples, 50):>10.0f}us{percentile(sql_samples, 99):>10.0f}us"
+                  f"{percentile(index_samples, 50):>10.1f}us{percentile(index_samples, 99):>10.1f}us")
+
+def bench_itineraries(args):
+    """Connection search latency over the in-memory index of upcoming flights"""
+    from app.airports import resolve_airport_ids
+    from app.connections import ConnectionIndex, load_legs
+    from app.datagen import AIRPORTS
+
+    app = make_app(args.database_url)
+    with app.app_context():
+        seed_dataset(args.flights, args.tickets, seed=args.seed)
+
+        started = time.perf_counter()
+        index = ConnectionIndex(load_legs())
+        print(f"Index built in {(time.perf_counter() - started) * 1000:.0f} ms ({len(index.legs)} upcoming flights)")
+
+        rng = random.Random(args.seed)
+        day = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=7)
+        for sort_by in ('price', 'duration'):
+            samples, found = [], 0
+            for _ in range(args.iterations):
+                (origin, _), (destination, _) = rng.sample(AIRPORTS, 2)
+                origin_ids, destination_ids = resolve_airport_ids(origin), resolve_airport_ids(destination)
+                started = time.perf_counter()
+                found += len(index.search(origin_ids, destination_ids, day, day + timedelta(days=1),
+                                          sort_by=sort_by))
+                samples.append((time.perf_counter() - started) * 1000)
+            print(f"sort_by={sort_by:<9} p50 {percentile(samples, 50):.2f} ms   "
+                  f"p99 {percentile(samples, 99):.2f} ms   ({found / args.iterations:.1f} itineraries/query)")
+
+def bench_listings(args):
+    """Rows/sec and peak memory per 10k flights: ORM + serialize_flight vs FlightRow projection"""
+    import tracemalloc
+    from flask import jsonify
+    from app import db
+    from app.api import serialize_flight
+    from app.listings import flight_rows, json_response
+    from app.models import Flight
+
+    app = make_app(args.database_url)
+    with app.app_context(), app.test_request_context():
+        seed_dataset(args.flights, args.tickets, seed=args.seed)
+        query = Flight.query.order_by(Flight.id)
+        rows = min(args.rows, query.count())
+
+        def orm_path():
+            return jsonify([serialize_flight(flight) for flight in query.limit(args.rows)])
+
+        def projection_path():
+            now = datetime.utcnow()
+            return json_response([flight.to_dict(now) for flight in flight_rows(query, limit=args.rows)])
+
+        print(f"{'path':<14}{'rows/sec':>12}{'p50':>12}{'peak MB / 10k rows':>22}")
+        for name, path in (('ORM', orm_path), ('projection', projection_path)):
+            samples = []
+            for _ in range(args.iterations):
+                db.session.expunge_all()  # Fresh identity map, as in a new request
+                started = time.perf_counter()
+                path()
+                samples.append(time.perf_counter() - started)
+            db.session.expunge_all()
+            tracemalloc.start()
+            path()
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            p50 = percentile(samples, 50)
+            print(f"{name:<14}{rows / p50:>12.0f}{p50 * 1000:>10.1f}ms"
+                  f"{peak / 2**20 * 10000 / rows:>22.1f}")
+
+def add_dataset_arguments(parser, flights, tickets):
+    parser.add_argument('--database-url', default='sqlite:///benchmark.db')
+    parser.add_argument('--flights', type=int, default=flights)
+    parser.add_argument('--tickets', type=int, default=tickets)
+    parser.add_argument('--iterations', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=42)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest='benchmark', required=True)
+
+    search = subparsers.add_parser('search', help='flight search paths before/after indexes')
+    add_dataset_arguments(search, flights=1000000, tickets=10000000)
+    search.set_defaults(func=bench_search)
+
+    autocomplete = subparsers.add_parser('suggestions', help='autocomplete SQL path vs in-memory index')
+    add_dataset_arguments(autocomplete, flights=1000000, tickets=1000000)
+    autocomplete.set_defaults(func=bench_suggestions)
+
+    itineraries = subparsers.add_parser('itineraries', help='one/two-stop connection search')
+    add_dataset_arguments(itineraries, flights=125000, tickets=100000)
+    itineraries.set_defaults(func=bench_itineraries)
+
+    listings = subparsers.add_parser('listings', help='flight listing serialization paths')
+    add_dataset_arguments(listings, flights=100000, tickets=0)
+    listings.add_argument('--rows', type=int, default=10000)
+    listings.set_defaults(func=bench_listings)
+
+    args = parser.parse_args()
+    args.func(args)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Cross-worker check for the cached current_user identity.
+
+Builds two app instances on one database and one shared cache file, as two
+workers would be, logs a user in on both and changes the user through the
+first one. The second must see a deactivation and a role downgrade on its
+very next request. Also checks that the identity cache refuses to start
+without the shared tier.
+
+    python check_identity_cache.py
+"""
+
+import sys
+import os
+import tempfile
+
+# Add the backend directory to the path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+WORKDIR = tempfile.mkdtemp(prefix='identity-check-')
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(WORKDIR, 'app.db')
+os.environ['CACHE_SHARED_PATH'] = os.path.join(WORKDIR, 'cache.sqlite')
+os.environ['USER_CACHE_TTL'] = '60'
+
+def login(app, email, password):
+    client = app.test_client()
+    client.post('/login', data={'email': email, 'password': password})
+    return client
+
+def check_identity_cache():
+    """Return the number of failed checks"""
+    from app import create_app, db
+    from app.models import User, Company
+
+    worker_a = create_app('testing')
+    worker_b = create_app('testing')
+    with worker_a.app_context():
+        admin = User(name='Admin', email='admin@example.com', role='admin')
+        admin.set_password('admin123')
+        manager = User(name='Manager', email='manager@example.com', role='company_manager')
+        manager.set_password('manager123')
+        flyer = User(name='Flyer', email='flyer@example.com', role='user')
+        flyer.set_password('flyer123')
+        db.session.add_all([admin, manager, flyer])
+        db.session.flush()
+        db.session.add(Company(name='Check Air', code='CK', manager_id=manager.id))
+        db.session.commit()
+        flyer_id, manager_id = flyer.id, manager.id
+
+    admin_a = login(worker_a, 'admin@example.com', 'admin123')
+    flyer_b = login(worker_b, 'flyer@example.com', 'flyer123')
+    manager_b = login(worker_b, 'manager@example.com', 'manager123')
+
+    checks = []
+    # Warm both identities into the cache through worker B
+    checks.append(('flyer logged in on B', flyer_b.get('/dashboard').status_code == 200))
+    checks.append(('manager dashboard on B', manager_b.get('/company/dashboard').status_code == 200))
+
+    admin_a.get(f'/admin/user/{flyer_id}/toggle_status')
+    checks.append(('deactivation applies on B', flyer_b.get('/dashboard').status_code == 302))
+
+    with worker_a.app_context():
+        db.session.get(User, manager_id).role = 'user'
+        db.session.commit()
+    response = manager_b.get('/company/dashboard')
+    checks.append(('role downgrade applies on B',
+                   response.status_code == 302 and '/company' not in response.headers.get('Location', '')))
+
+    os.environ.pop('CACHE_SHARED_PATH')
+    import config
+    config.Config.CACHE_SHARED_PATH = None
+    try:
+        create_app('testing')
+        refused = False
+    except RuntimeError:
+        refused = True
+    checks.append(('refuses to start without the shared tier', refused))
+
+    for label, ok in checks:
+        print(f"{label:<45} {'OK' if ok else 'FAIL'}")
+    return sum(not ok for _, ok in checks)
+
+if __name__ == '__main__':
+    failures = check_identity_cache()
+    if failures:
+        print(f"\n{failures} identity check(s) failed")
+        sys.exit(1)
+    print("\nIdentity changes reach every worker immediately")
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Query budget check for the busiest pages and API endpoints.
+
+Seeds an in-memory database with a frequent flyer (hundreds of tickets),
+requests each route and counts the SQL statements it runs. Exits with a
+non-zero status if any route goes over its budget, so an N+1 regression
+(one query per ticket or per flight) fails CI. Runs with a fresh shared
+cache file and the user identity cache on, as a multi-worker deployment does.
+
+    python check_query_budgets.py
+"""
+
+import sys
+import os
+import tempfile
+from datetime import datetime, timedelta
+
+# Add the backend directory to the path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import event
+
+os.environ['CACHE_SHARED_PATH'] = os.path.join(tempfile.mkdtemp(prefix='query-budgets-'), 'cache.sqlite')
+os.environ.setdefault('USER_CACHE_TTL', '60')
+
+TICKETS = 300
+FLIGHTS = 60
+
+# (label, role, url, max queries)
+BUDGETS = [
+    ('dashboard', 'user', '/dashboard', 7),
+    ('dashboard page 3', 'user', '/dashboard?page=3', 7),
+    ('api tickets', 'user', '/api/tickets', 4),
+    ('search', 'user', '/search?origin=Bishkek&destination=Osh', 5),
+    ('api flights', 'user', '/api/flights?origin=Bishkek&destination=Osh', 6),
+    ('admin panel', 'admin', '/admin', 11),
+    ('landing page', 'user', '/', 2),
+    ('flight details', 'user', '/flight/1', 3),
+    ('flight passengers', 'manager', '/company/flight/1/passengers?sort=name', 6),
+]
+
+USERS = {
+    'user': ('flyer@example.com', 'flyer123', 'user'),
+    'admin': ('budget-admin@example.com', 'admin123', 'admin'),
+    'manager': ('budget-manager@example.com', 'manager123', 'company_manager'),
+}
+
+def seed(db):
+    """Create users, two airlines, flights and a frequent flyer's ticket history"""
+    from app.models import User, Company, Flight, Ticket
+
+    users = {}
+    for key, (email, password, role) in USERS.items():
+        user = User(name=key.title(), email=email, role=role)
+        user.set_password(password)
+        db.session.add(user)
+        users[key] = user
+
+    db.session.flush()
+
+    companies = [Company(name='Budget Air', code='BA', manager_id=users['manager'].id),
+                 Company(name='Check Airlines', code='CA')]
+    db.session.add_all(companies)
+    db.session.flush()
+
+    now = datetime.utcnow()
+    routes = [('Bishkek (FRU)', 'Osh (OSS)'), ('Osh (OSS)', 'Bishkek (FRU)'), ('Bishkek (FRU)', 'Almaty (ALA)')]
+    flights = []
+    for i in range(FLIGHTS):
+        origin, destination = routes[i % len(routes)]
+        depart = now + timedelta(days=i - FLIGHTS // 2, hours=i % 24)
+        flights.append(Flight(
+            flight_number=f'BQ{i:03d}', company_id=companies[i % 2].id,
+            origin=origin, destination=destination,
+            depart_time=depart, arrive_time=depart + timedelta(hours=1),
+            price=5000 + i * 10, seats_total=200, seats_available=200
+        ))
+    db.session.add_all(flights)
+    db.session.flush()
+
+    statuses = ['paid', 'paid', 'pending_payment', 'canceled', 'refunded']
+    for i in range(TICKETS):
+        flight = flights[i % FLIGHTS]
+        db.session.add(Ticket(
+            user_id=users['user'].id, flight_id=flight.id, status=statuses[i % len(statuses)],
+            price=flight.price, passenger_name='Frequent Flyer', created_at=now - timedelta(hours=i)
+        ))
+    db.session.commit()
+
+def check_query_budgets():
+    """Run every route against its budget and return the number of failures"""
+    from app import create_app, db
+
+    app = create_app('testing')
+    with app.app_context():
+        seed(db)
+        engine = db.engine
+
+    counter = {'queries': 0}
+
+    def count_query(conn, cursor, statement, parameters, context, executemany):
+        counter['queries'] += 1
+
+    # Requests run outside a shared app context so each one loads its own user
+    clients = {}
+    for key, (email, password, _) in USERS.items():
+        client = app.test_client()
+        client.post('/login', data={'email': email, 'password': password})
+        clients[key] = client
+
+    event.listen(engine, 'before_cursor_execute', count_query)
+    failures = 0
+    print(f"{'route':<20} {'queries':>8} {'budget':>8}")
+    for label, role, url, budget in BUDGETS:
+        # Warm-up request so one-off work (rollup rebuilds, in-memory indexes) is not counted
+        clients[role].get(url)
+
+        counter['queries'] = 0
+        response = clients[role].get(url)
+        used = counter['queries']
+
+        if response.status_code != 200:
+            status = f'FAIL (HTTP {response.status_code})'
+        elif used > budget:
+            status = 'FAIL'
+        else:
+            status = 'OK'
+        if status != 'OK':
+            failures += 1
+        print(f"{label:<20} {used:>8} {budget:>8}  {status}")
+
+    event.remove(engine, 'before_cursor_execute', count_query)
+    return failures
+
+if __name__ == '__main__':
+    failures = check_query_budgets()
+    if failures:
+        print(f"\n{failures} route(s) over their query budget")
+        sys.exit(1)
+    print("\nAll routes within their query budgets")
@@ -16,8 +16,55 @@ class Config:
     # Pagination
     FLIGHTS_PER_PAGE = 20
     TICKETS_PER_PAGE = 10
+    PASSENGERS_PER_PAGE = 50
     
-    # File upload settings (for future image uploads)
+    # Autocomplete index refresh interval (seconds) for changes made by other workers
+    SUGGESTIONS_TTL = 300
+    
+    # Connection search: layover bounds (minutes) and index refresh interval (seconds)
+    CONNECTION_MIN_LAYOVER = 45
+    CONNECTION_MAX_LAYOVER = 360
+    CONNECTIONS_TTL = 300
+    
+    # Largest number of seats one booking may reserve
+    MAX_SEATS_PER_BOOKING = 9
+    
+    # Unpaid bookings release their seats after this many hours (per-company override on Company)
+    HOLD_TTL_HOURS = 24
+    
+    # Recurring schedules are materialized into flights this many days ahead
+    SCHEDULE_HORIZON_DAYS = 90
+    
+    # Cache for airlines, stats, flight details and landing page content.
+    # CACHE_SHARED_PATH adds a SQLite file shared by all workers on the host.
+    CACHE_TTL = 300
+    CACHE_MAX_ENTRIES = 1024
+    CACHE_SHARED_PATH = os.environ.get('CACHE_SHARED_PATH')
+    CACHE_PURGE_INTERVAL = 60  # Seconds between sweeps of expired shared-tier entries, per worker
+    # Seconds the logged-in user's identity (id, name, role, is_active) is kept
+    # in the shared tier instead of querying the user per request; 0 disables.
+    # Requires CACHE_SHARED_PATH so a committed change reaches every worker.
+    USER_CACHE_TTL = int(os.environ.get('USER_CACHE_TTL', 0))
+    # {% cache %} template fragments (landing page, flight details) in the same cache
+    FRAGMENT_CACHE = True
+    
+    # Rendered boarding-pass QR codes: files keyed by content hash (default
+    # instance/qr) with an in-process LRU of this many images in front
+    QR_CACHE_DIR = os.environ.get('QR_CACHE_DIR')
+    QR_CACHE_ENTRIES = 512
+    
+    # Uploaded images (banners, avatars): originals and resized WebP/JPEG variants
+    # keyed by content hash. IMAGE_STORAGE is 'local' (default instance/media) or
+    # 'shared' for a directory mounted on every node (IMAGE_STORAGE_DIR required).
+    IMAGE_STORAGE = os.environ.get('IMAGE_STORAGE', 'local')
+    IMAGE_STORAGE_DIR = os.environ.get('IMAGE_STORAGE_DIR')
+    IMAGE_WORKERS = int(os.environ.get('IMAGE_WORKERS', 2))
+    
+    # Static assets: asset_url() links the content-hashed copies made by
+    # `flask build-assets`. Off in development so edited files show up at once.
+    ASSET_FINGERPRINTS = True
+    
+    # File upload settings
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max file size
     UPLOAD_FOLDER = 'app/static/uploads'
     ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
@@ -32,6 +79,7 @@ class DevelopmentConfig(Config):
     SQLALCHEMY_DATABASE_URI = os.environ.get('DEV_DATABASE_URL') or \
         'sqlite:///flight_service_dev.db'
     SQLALCHEMY_ECHO = False  # Set to True to see SQL queries
+    ASSET_FINGERPRINTS = False
 
 class ProductionConfig(Config):
     """Production configuration"""
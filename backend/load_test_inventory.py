@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+"""
+Concurrency load test for seat inventory.
+
+Fires thousands of parallel purchases at a single flight and checks that it
+is never oversold: every seat taken has exactly one ticket, seats_available
+never goes negative, the number of successful bookings matches the tickets
+in the database and no seat on the seat map is given to two tickets.
+
+    single  one-seat purchases through the /buy/<flight_id> page
+    multi   1-4 seat bookings through inventory.book_seats
+
+Use a database that several threads can share (a SQLite file or PostgreSQL):
+
+    python load_test_inventory.py --database-url sqlite:///load_test.db
+    python load_test_inventory.py --database-url postgresql://localhost/load_test --requests 5000 --workers 64
+"""
+
+import sys
+import os
+import argparse
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+# Add the backend directory to the path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+PASSWORD = 'loadtest123'
+
+def make_app(database_url):
+    """Create the app against the load test database"""
+    os.environ['DATABASE_URL'] = database_url
+    from app import create_app
+    return create_app('testing')
+
+def seed(db, num_users, seats):
+    """Fresh schema with one buyer per worker and two flights of `seats` seats"""
+    from app.models import User, Company, Flight
+
+    db.drop_all()
+    db.create_all()
+
+    users = []
+    for i in range(num_users):
+        user = User(name=f'Buyer {i}', email=f'buyer{i}@loadtest.example.com', role='user')
+        user.set_password(PASSWORD)
+        users.append(user)
+    db.session.add_all(users)
+
+    company = Company(name='Load Test Air', code='LT')
+    db.session.add(company)
+    db.session.flush()
+
+    depart = datetime.utcnow() + timedelta(days=7)
+    flights = [
+        Flight(flight_number=f'LT{i}', company_id=company.id, origin='Bishkek (FRU)', destination='Osh (OSS)',
+               depart_time=depart, arrive_time=depart + timedelta(hours=1), price=4500,
+               seats_total=seats, seats_available=seats)
+        for i in (1, 2)
+    ]
+    db.session.add_all(flights)
+    db.session.commit()
+    return [user.email for user in users], [flight.id for flight in flights]
+
+def run_single(app, flight_id, emails, requests, workers):
+    """One-seat purchases through the purchase page from `workers` logged-in clients"""
+    clients = threading.local()
+    outcomes = {'booked': 0, 'sold_out': 0, 'error': 0}
+    lock = threading.Lock()
+    logins = iter(range(requests))
+
+    def purchase(attempt):
+        if not hasattr(clients, 'client'):
+            clients.client = app.test_client()
+            with lock:
+                email = emails[next(logins) % len(emails)]
+            clients.client.post('/login', data={'email': email, 'password': PASSWORD})
+        response = clients.client.post(f'/buy/{flight_id}', data={'passenger_name': f'Passenger {attempt}'})
+        location = response.headers.get('Location', '')
+        if response.status_code == 302 and location.endswith('/dashboard'):
+            outcome = 'booked'
+        elif response.status_code == 302 and location.endswith(f'/flight/{flight_id}'):
+            outcome = 'sold_out'
+        else:
+            outcome = 'error'
+        with lock:
+            outcomes[outcome] += 1
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        list(pool.map(purchase, range(requests)))
+    return outcomes, outcomes['booked']
+
+def run_multi(app, flight_id, user_ids, requests, workers, seed=42):
+    """Multi-seat bookings straight through the inventory subsystem"""
+    from app import db, inventory
+    from app.models import Flight
+
+    rng = random.Random(seed)
+    sizes = [rng.randint(1, 4) for _ in range(requests)]
+    outcomes = {'booked': 0, 'sold_out': 0, 'error': 0}
+    seats_booked = [0]
+    lock = threading.Lock()
+
+    def book(attempt):
+        size = sizes[attempt]
+        with app.app_context():
+            try:
+                flight = db.session.get(Flight, flight_id)
+                inventory.book_seats(flight, user_ids[attempt % len(user_ids)],
+                                     [f'Passenger {attempt}-{n}' for n in range(size)])
+                db.session.commit()
+                outcome = 'booked'
+            except inventory.NotEnoughSeats:
+                db.session.rollback()
+                outcome = 'sold_out'
+            except Exception:
+                db.session.rollback()
+                outcome = 'error'
+        with lock:
+            outcomes[outcome] += 1
+            if outcome == 'booked':
+                seats_booked[0] += size
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        list(pool.map(book, range(requests)))
+    return outcomes, seats_booked[0]
+
+def verify(app, flight_id, seats_booked):
+    """Check the flight row and its tickets agree; return a list of problems"""
+    from app import db
+    from app.models import Flight, Ticket
+
+    with app.app_context():
+        flight = db.session.get(Flight, flight_id)
+        tickets = Ticket.query.filter_by(flight_id=flight_id).count()
+        seat_numbers = [row[0] for row in db.session.query(Ticket.seat_number).filter_by(flight_id=flight_id)]
+        problems = []
+        if flight.seats_available < 0:
+            problems.append(f'seats_available went negative ({flight.seats_available})')
+        if tickets > flight.seats_total:
+            problems.append(f'oversold: {tickets} tickets for {flight.seats_total} seats')
+        if tickets != flight.seats_total - flight.seats_available:
+            problems.append(f'{tickets} tickets but {flight.seats_total - flight.seats_available} seats taken')
+        if tickets != seats_booked:
+            problems.append(f'{tickets} tickets but {seats_booked} seats reported booked')
+        if None in seat_numbers:
+            problems.append(f'{seat_numbers.count(None)} tickets without a seat number')
+        assigned = [seat for seat in seat_numbers if seat]
+        if len(set(assigned)) != len(assigned):
+            problems.append(f'{len(assigned) - len(set(assigned))} seats assigned to more than one ticket')
+        return flight, tickets, problems
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database-url', default='sqlite:///inventory_load_test.db')
+    parser.add_argument('--seats', type=int, default=150, help='seats on each flight')
+    parser.add_argument('--requests', type=int, default=2000, help='purchase attempts per phase')
+    parser.add_argument('--workers', type=int, default=32, help='parallel threads')
+    parser.add_argument('--phase', choices=['single', 'multi', 'all'], default='all')
+    args = parser.parse_args()
+
+    app = make_app(args.database_url)
+    from app import db
+    from app.models import User
+    with app.app_context():
+        emails, flight_ids = seed(db, args.workers, args.seats)
+        user_ids = [row[0] for row in db.session.query(User.id).filter(User.email.in_(emails))]
+
+    phases = []
+    if args.phase in ('single', 'all'):
+        phases.append(('single', flight_ids[0], lambda: run_single(app, flight_ids[0], emails, args.requests, args.workers)))
+    if args.phase in ('multi', 'all'):
+        phases.append(('multi', flight_ids[1], lambda: run_multi(app, flight_ids[1], user_ids, args.requests, args.workers)))
+
+    failed = False
+    for name, flight_id, run in phases:
+        started = time.perf_counter()
+        outcomes, seats_booked = run()
+        elapsed = time.perf_counter() - started
+        flight, tickets, problems = verify(app, flight_id, seats_booked)
+
+        print(f"\n{name}: {args.requests} attempts from {args.workers} workers in {elapsed:.1f}s")
+        print(f"  booked {outcomes['booked']}, sold out {outcomes['sold_out']}, errors {outcomes['error']}")
+        print(f"  tickets {tickets}, seats {flight.seats_total}, seats_available {flight.seats_available}")
+        for problem in problems:
+            print(f"  FAIL: {problem}")
+        if not problems:
+            print("  OK: no oversell")
+        failed = failed or bool(problems)
+
+    sys.exit(1 if failed else 0)
+
+if __name__ == '__main__':
+    main()